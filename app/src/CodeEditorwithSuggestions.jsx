@@ -11,6 +11,11 @@ const CodeEditorWithSuggestions = () => {
     const [cursorPosition, setCursorPosition] = useState({ line: 0, column: 0 });
     const [displayInfo, setDisplayInfo] = useState([]);
     const editorRef = useRef();
+    // identifies this editor's buffer to the server, which keeps its analysis state between requests
+    const documentId = useRef(crypto.randomUUID());
+    // numbers the requests for this buffer, so that the server can cancel the work for older ones
+    const sequenceNumber = useRef(0);
+    const inFlightRequest = useRef(null);
 
     const handleOutsideClick = () => {
         setSuggestions([]);
@@ -46,24 +51,62 @@ const CodeEditorWithSuggestions = () => {
           console.log("== Running inference on the following code ==")
           console.log(code);
 
-          const response = await fetch('http://127.0.0.1:5000/suggest', {
+          // a newer buffer supersedes the previous request
+          if (inFlightRequest.current) {
+              inFlightRequest.current.abort();
+          }
+          const controller = new AbortController();
+          inFlightRequest.current = controller;
+          sequenceNumber.current += 1;
+
+          try {
+            const response = await fetch('http://127.0.0.1:5000/suggest_stream', {
                 method: 'POST',
                 headers: {
                 'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({'code_context': code}),
+                body: JSON.stringify({
+                    'code_context': code,
+                    'document_id': documentId.current,
+                    'sequence_number': sequenceNumber.current
+                }),
+                signal: controller.signal,
             });
 
             if(response.ok){
-                const data = await response.json();  // Parse the JSON response
                 console.log("response 200 OK")
-                console.log(data)
-                setSuggestions(data.suggestions);
-                console.log(data.message);  // Access JSON fields
-                console.log(data.suggestions);
+                // one JSON object per line: "lexical" suggestions right away, then "refined" ones after type inference
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffered = "";
+                while (true) {
+                    const { done, value } = await reader.read();
+                    if (done) break;
+                    buffered += decoder.decode(value, { stream: true });
+                    const lines = buffered.split('\n');
+                    buffered = lines.pop();  // incomplete last line
+                    for (const line of lines) {
+                        if (!line.trim()) continue;
+                        const data = JSON.parse(line);  // Parse the JSON message
+                        console.log(data.phase, data.message);  // Access JSON fields
+                        console.log(data.suggestions);
+                        if (data.suggestions) {
+                            setSuggestions(data.suggestions);
+                        }
+                    }
+                }
             } else {
                 console.error('Error:', response.status, response.statusText);
             }
+          } catch (error) {
+            if (error.name !== 'AbortError') {
+                throw error;
+            }
+          } finally {
+            if (inFlightRequest.current === controller) {
+                inFlightRequest.current = null;
+            }
+          }
         }
       };
 
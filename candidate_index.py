@@ -0,0 +1,81 @@
+import builtins
+import heapq
+import itertools
+import re
+
+
+def get_builtin_class(type_name):
+    value = getattr(builtins, type_name, None)
+    return value if isinstance(value, type) else None
+
+
+def get_builtin_classes_in_type_param(type_param):
+    # e.g., 'int or float', '(float, float)', ['int', 'str', 'Figure', 'SubFigure']
+    type_names = type_param if isinstance(type_param, list) else re.findall(r'\w+', type_param)
+    builtin_classes = []
+    for type_name in type_names:
+        builtin_class = get_builtin_class(type_name)
+        if builtin_class is not None:
+            builtin_classes.append(builtin_class)
+    return builtin_classes
+
+
+def is_compatible(type_name, type_param, builtin_classes_in_type_param):
+    # as named in the params DB -- a substring of a description like 'int or float', or one of a list of types
+    if type_name in type_param:
+        return True
+    # subtypes of the builtin types in the params DB, e.g., bool for int
+    builtin_class = get_builtin_class(type_name)
+    return builtin_class is not None and any(
+        issubclass(builtin_class, builtin_class_in_type_param) for builtin_class_in_type_param in builtin_classes_in_type_param
+    )
+
+
+class CandidateIndex:
+    """
+    The symbols of a document (global variables and functions), indexed by their (return) type names, to find the
+    candidates for a parameter type without testing every symbol. Candidates are ranked by scope (variables and functions
+    are ranked separately) and recency (later definitions first), as make_suggestions did.
+    """
+
+    def __init__(self, resolved_global_variables, global_functions):
+        # scope -> type name -> [(position, symbol)], in definition order
+        self.scope_to_type_name_to_symbols = {
+            'variables': self.index_symbols(resolved_global_variables),
+            'functions': self.index_symbols(global_functions)
+        }
+        # repr of a parameter type -> compatible type names, per scope
+        self.compatible_type_names_cache = {}
+
+    @staticmethod
+    def index_symbols(symbol_to_types):
+        type_name_to_symbols = {}
+        for position, (symbol, types) in enumerate(symbol_to_types.items()):
+            # functions with several return types are candidates for each of them
+            type_names = types if isinstance(types, list) else [types]
+            for type_name in dict.fromkeys(type_names):
+                type_name_to_symbols.setdefault(type_name, []).append((position, symbol))
+        return type_name_to_symbols
+
+    def get_compatible_type_names(self, scope, type_param):
+        key = (scope, repr(type_param))
+        compatible_type_names = self.compatible_type_names_cache.get(key)
+        if compatible_type_names is None:
+            builtin_classes_in_type_param = get_builtin_classes_in_type_param(type_param)
+            compatible_type_names = [
+                type_name for type_name in self.scope_to_type_name_to_symbols[scope]
+                if is_compatible(type_name, type_param, builtin_classes_in_type_param)
+            ]
+            self.compatible_type_names_cache[key] = compatible_type_names
+        return compatible_type_names
+
+    def get_candidates(self, scope, type_param, k):
+        """The k most recently defined symbols in `scope` that are compatible with `type_param`, in definition order."""
+        type_name_to_symbols = self.scope_to_type_name_to_symbols[scope]
+        # only the last k symbols of each type can make it into the top k.
+        # a symbol with several compatible (return) types is listed under each of them, with the same position
+        position_to_symbol = dict(itertools.chain.from_iterable(
+            type_name_to_symbols[type_name][-k:] for type_name in self.get_compatible_type_names(scope, type_param)
+        ))
+        top_k = heapq.nlargest(k, position_to_symbol.items())
+        return [symbol for _, symbol in reversed(top_k)]
@@ -0,0 +1,251 @@
+import logging
+import multiprocessing
+import multiprocessing.forkserver
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from main import type_inference
+from inference_session import InferenceSession
+from document_analysis import DocumentAnalysis, TypeInferenceCancelled
+from stage_metrics import get_peak_memory_bytes
+
+
+class InferenceWorkerPoolFull(Exception):
+    """Raised when a worker already has as many pending requests as it may queue."""
+
+
+CANCELLATION_CHECK_INTERVAL = 0.01      # seconds between looking up the latest sequence number of a document
+
+
+# state of a worker process -- each worker has its own session, documents and module namespace (sys.modules)
+worker_inference_session = None
+worker_document_analyses = OrderedDict()
+# analyses of transient documents (e.g., of batches) are kept apart, so that they never evict those of other documents
+worker_transient_document_analyses = OrderedDict()
+worker_max_documents = 64
+# document id -> sequence number of the latest request for it, shared by the server and all workers
+worker_latest_sequence_numbers = None
+
+
+def initialize_worker(max_documents, latest_sequence_numbers, cache_directory):
+    global worker_inference_session, worker_max_documents, worker_latest_sequence_numbers
+    worker_max_documents = max_documents
+    worker_latest_sequence_numbers = latest_sequence_numbers
+    worker_inference_session = InferenceSession(cache_directory)
+
+
+def warm_up_worker():
+    return os.getpid()
+
+
+def get_worker_document_analysis(document_id, static_only, transient=False):
+    # static-only and regular analyses of a document are kept apart
+    key = (document_id, static_only)
+    document_analyses = worker_transient_document_analyses if transient else worker_document_analyses
+    document_analysis = document_analyses.get(key)
+    if document_analysis is None:
+        # module name stays 'temp' -- parse_quac_output looks up the predictions under it
+        document_analysis = DocumentAnalysis('temp', worker_inference_session, static_only)
+        document_analyses[key] = document_analysis
+        if len(document_analyses) > worker_max_documents:
+            _, evicted_document_analysis = document_analyses.popitem(last=False)
+            evicted_document_analysis.close()
+    else:
+        document_analyses.move_to_end(key)
+    return document_analysis
+
+
+def close_transient_document_analyses_in_worker(document_ids):
+    document_ids = set(document_ids)
+    for key in [key for key in worker_transient_document_analyses if key[0] in document_ids]:
+        worker_transient_document_analyses.pop(key).close()
+    return len(worker_transient_document_analyses)
+
+
+def get_is_superseded(document_id, sequence_number):
+    # the latest sequence number lives in another process, so only look it up every CANCELLATION_CHECK_INTERVAL
+    last_check_time = None
+    superseded = False
+
+    def is_superseded():
+        nonlocal last_check_time, superseded
+        if not superseded:
+            now = time.monotonic()
+            if last_check_time is None or now - last_check_time >= CANCELLATION_CHECK_INTERVAL:
+                last_check_time = now
+                superseded = worker_latest_sequence_numbers.get(document_id, sequence_number) > sequence_number
+        return superseded
+
+    return is_superseded
+
+
+def run_type_inference_in_worker(document_id, code, static_only, sequence_number, transient=False):
+    is_cancelled = None
+    if sequence_number is not None:
+        is_cancelled = get_is_superseded(document_id, sequence_number)
+
+    document_analysis = get_worker_document_analysis(document_id, static_only, transient)
+    output_dict = type_inference(
+        code,
+        worker_inference_session,
+        document_analysis=document_analysis,
+        is_cancelled=is_cancelled
+    )
+    return output_dict, document_analysis.stage_durations, get_peak_memory_bytes()
+
+
+class InferenceWorkerPool:
+    """
+    Worker processes that each keep a warm InferenceSession and the analysis state of their documents.
+    Requests for the same document always go to the same worker, so they reuse its incremental analysis.
+    Each worker queues at most `max_pending_per_worker` requests; beyond that `submit` raises InferenceWorkerPoolFull,
+    so that overload is reported to clients instead of piling up.
+    Requests may carry a per-document sequence number. Once a request with a higher sequence number for the same document
+    is submitted, older ones raise TypeInferenceCancelled (at the next stage of type inference, or right away if not started yet),
+    so that workers only spend time on the latest version of each document.
+    If `stage_metrics` (a StageMetrics) is given, the time each request spent in each stage of type inference
+    and the peak memory of each worker are recorded in it.
+    Transient documents (e.g., of batches) are analyzed apart from the others, so that they do not evict them,
+    and should be closed with `close_transient_documents` once done with.
+    If `cache_directory` is given, workers load the static class query database from there instead of building it
+    (the first worker to start saves it).
+    """
+
+    def __init__(self, num_workers=None, max_pending_per_worker=4, max_documents_per_worker=64, stage_metrics=None, cache_directory=None):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.max_documents_per_worker = max_documents_per_worker
+        self.stage_metrics = stage_metrics
+        self.cache_directory = cache_directory
+
+        # workers are forked, so create the pool before starting any threads (e.g., before app.run)
+        self.mp_context = multiprocessing.get_context('fork')
+        # workers replacing crashed ones are started once threads are running (e.g., by flask and the executors),
+        # so they are forked from a fork server instead, which starts single-threaded with this module imported.
+        # they import the main module again (as __mp_main__), which must not create a pool then
+        self.replacement_mp_context = multiprocessing.get_context('forkserver')
+        self.replacement_mp_context.set_forkserver_preload([__name__])
+        multiprocessing.forkserver.ensure_running()
+        self.lock = threading.Lock()
+
+        self.manager = self.mp_context.Manager()
+        self.latest_sequence_numbers = self.manager.dict()
+
+        self.executors = [self.create_executor() for _ in range(self.num_workers)]
+        self.pending = [threading.BoundedSemaphore(max_pending_per_worker) for _ in range(self.num_workers)]
+
+        # start all workers and wait until their sessions are warm
+        warm_up_futures = [executor.submit(warm_up_worker) for executor in self.executors]
+        for warm_up_future in warm_up_futures:
+            warm_up_future.result()
+
+    def create_executor(self, mp_context=None):
+        # one process per executor, so that each document sticks to one worker
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=mp_context or self.mp_context,
+            initializer=initialize_worker,
+            initargs=(self.max_documents_per_worker, self.latest_sequence_numbers, self.cache_directory)
+        )
+
+    def get_worker_index(self, document_id):
+        return zlib.crc32(document_id.encode('utf-8')) % self.num_workers
+
+    def replace_broken_executor(self, index, executor):
+        with self.lock:
+            if self.executors[index] is executor:
+                logging.error('Inference worker %s died, starting a new one', index)
+                executor.shutdown(wait=False)
+                self.executors[index] = self.create_executor(self.replacement_mp_context)
+            return self.executors[index]
+
+    def supersede(self, document_id, sequence_number):
+        with self.lock:
+            latest_sequence_number = self.latest_sequence_numbers.get(document_id)
+            if latest_sequence_number is not None and latest_sequence_number > sequence_number:
+                return False
+            self.latest_sequence_numbers[document_id] = sequence_number
+            return True
+
+    def forget_document(self, document_id):
+        self.latest_sequence_numbers.pop(document_id, None)
+
+    def close_transient_documents(self, document_ids):
+        # runs after the requests already submitted for the documents, as each worker runs its requests in order
+        worker_index_to_document_ids = {}
+        for document_id in document_ids:
+            worker_index_to_document_ids.setdefault(self.get_worker_index(document_id), []).append(document_id)
+
+        futures = []
+        for index, document_ids_in_worker in worker_index_to_document_ids.items():
+            try:
+                futures.append(self.executors[index].submit(close_transient_document_analyses_in_worker, document_ids_in_worker))
+            except RuntimeError:
+                # the worker died (BrokenProcessPool) with the analyses, or the pool is shut down
+                pass
+        return futures
+
+    def submit(self, document_id, code, static_only=False, sequence_number=None, blocking=False, transient=False):
+        # blocking: wait for the worker to have room instead of raising InferenceWorkerPoolFull (e.g., for batches)
+        if sequence_number is not None and not self.supersede(document_id, sequence_number):
+            # a newer request for the document has already arrived
+            raise TypeInferenceCancelled
+
+        index = self.get_worker_index(document_id)
+
+        pending = self.pending[index]
+        if not pending.acquire(blocking=blocking):
+            raise InferenceWorkerPoolFull(f'inference worker {index} is busy')
+
+        executor = self.executors[index]
+        try:
+            future = executor.submit(run_type_inference_in_worker, document_id, code, static_only, sequence_number, transient)
+        except BrokenProcessPool:
+            executor = self.replace_broken_executor(index, executor)
+            try:
+                future = executor.submit(run_type_inference_in_worker, document_id, code, static_only, sequence_number, transient)
+            except BaseException:
+                pending.release()
+                raise
+        except BaseException:
+            pending.release()
+            raise
+
+        # resolves to the output dict of type inference
+        output_dict_future = Future()
+        output_dict_future.set_running_or_notify_cancel()
+
+        def on_done(future_):
+            pending.release()
+            if future_.cancelled():
+                output_dict_future.set_exception(TypeInferenceCancelled())
+                return
+
+            exception = future_.exception()
+            if exception is not None:
+                if isinstance(exception, BrokenProcessPool):
+                    self.replace_broken_executor(index, executor)
+                output_dict_future.set_exception(exception)
+                return
+
+            output_dict, stage_durations, peak_memory_bytes = future_.result()
+            if self.stage_metrics is not None:
+                self.stage_metrics.observe_stage_durations(stage_durations)
+                self.stage_metrics.set_peak_memory(f'worker_{index}', peak_memory_bytes)
+            output_dict_future.set_result(output_dict)
+
+        future.add_done_callback(on_done)
+        return output_dict_future
+
+    def type_inference(self, document_id, code, static_only=False, sequence_number=None):
+        return self.submit(document_id, code, static_only, sequence_number).result()
+
+    def shutdown(self):
+        with self.lock:
+            for executor in self.executors:
+                executor.shutdown(wait=True, cancel_futures=True)
+        self.manager.shutdown()
@@ -0,0 +1,225 @@
+"""
+Replay recorded suggestion requests against the server, in this process (Flask test client, no network),
+and report latency percentiles, throughput and error rate per stage. Run from the repository root, e.g.:
+
+    python load_test.py demo/example*.py --repeat 20 --concurrency 4
+    python load_test.py recorded_requests.jsonl --rate 10 --endpoint suggest --json
+
+Inputs are read like in suggest_batch.py: a .jsonl file has one request per line (like the body of /suggest),
+any other file is one code context.
+Client-side stages are the phases of /suggest_stream ("lexical", "refined") or the whole of /suggest ("suggest").
+Their latencies include waiting for a free client thread, measured from when each request was due to be sent.
+Server-side stages (parsing, type inference stages in the workers, ranking, ...) are estimated from the
+server's latency histograms, like histogram_quantile in Prometheus.
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from suggest_batch import read_suggestion_request_datas
+
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def get_percentile(sorted_values, quantile):
+    # nearest rank
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(quantile * len(sorted_values)) - 1)]
+
+
+def estimate_quantile(buckets, bucket_counts, quantile):
+    # bucket_counts are not cumulative, the last one is for +Inf; linear interpolation within a bucket
+    count = sum(bucket_counts)
+    if count == 0:
+        return None
+
+    rank = quantile * count
+    cumulative_count = 0
+    lower_bound = 0.0
+    for upper_bound, bucket_count in zip(buckets, bucket_counts):
+        if bucket_count and cumulative_count + bucket_count >= rank:
+            return lower_bound + (upper_bound - lower_bound) * (rank - cumulative_count) / bucket_count
+        cumulative_count += bucket_count
+        lower_bound = upper_bound
+    # in the +Inf bucket
+    return buckets[-1]
+
+
+class StageSamples:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # stage -> latencies (seconds) of successful requests, number of failed requests
+        self.stage_to_latencies = {}
+        self.stage_to_errors = {}
+
+    def add(self, stage, latency, ok):
+        with self.lock:
+            self.stage_to_latencies.setdefault(stage, [])
+            self.stage_to_errors.setdefault(stage, 0)
+            if ok:
+                self.stage_to_latencies[stage].append(latency)
+            else:
+                self.stage_to_errors[stage] += 1
+
+
+def replay_request(client, endpoint, data, scheduled_time, samples):
+    stage = 'suggest' if endpoint == 'suggest' else 'lexical'
+    try:
+        if endpoint == 'suggest':
+            response = client.post('/suggest', json=data)
+            samples.add(stage, time.perf_counter() - scheduled_time, response.status_code == 200 and response.json['message'] == 'OK')
+            return
+
+        response = client.post('/suggest_stream', json=data, buffered=False)
+        try:
+            if response.status_code != 200:
+                samples.add(stage, time.perf_counter() - scheduled_time, False)
+                return
+            # one line per phase, as soon as the phase is done
+            for chunk in response.response:
+                for line in chunk.splitlines():
+                    message = json.loads(line)
+                    stage = message['phase']
+                    samples.add(stage, time.perf_counter() - scheduled_time, message['message'] == 'OK')
+                    stage = 'refined'
+        finally:
+            response.close()
+    except Exception:
+        samples.add(stage, time.perf_counter() - scheduled_time, False)
+
+
+def get_replayed_requests(suggestion_request_datas, repeat):
+    # every round replays the documents under new ids, so that sequence numbers of one round do not supersede the next
+    replayed_requests = []
+    for round_ in range(repeat):
+        for data in suggestion_request_datas:
+            replayed_requests.append({**data, 'document_id': f'replay_{round_}/{data.get("document_id", "default")}'})
+    return replayed_requests
+
+
+def replay(app, replayed_requests, endpoint='suggest_stream', concurrency=1, rate=None, seed=0):
+    """
+    Send `replayed_requests` to `app` from `concurrency` threads.
+    Without a `rate`, each thread sends its next request as soon as the previous one is answered (closed loop).
+    With a `rate` (requests per second), requests arrive at random (Poisson) times regardless of how fast
+    they are answered (open loop). Returns the samples per stage and the elapsed time.
+    """
+    samples = StageSamples()
+    thread_local = threading.local()
+
+    def send(data, scheduled_time):
+        if not hasattr(thread_local, 'client'):
+            thread_local.client = app.test_client()
+        replay_request(thread_local.client, endpoint, data, scheduled_time if scheduled_time is not None else time.perf_counter(), samples)
+
+    random_ = random.Random(seed)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        scheduled_time = start
+        for data in replayed_requests:
+            if rate:
+                scheduled_time += random_.expovariate(rate)
+                time.sleep(max(0.0, scheduled_time - time.perf_counter()))
+                executor.submit(send, data, scheduled_time)
+            else:
+                executor.submit(send, data, None)
+    elapsed = time.perf_counter() - start
+
+    return samples, elapsed
+
+
+def get_report(samples, elapsed, buckets, server_stage_snapshot_before, server_stage_snapshot_after):
+    report = {'elapsed_seconds': elapsed, 'client_stages': {}, 'server_stages': {}}
+
+    for stage, latencies in samples.stage_to_latencies.items():
+        latencies = sorted(latencies)
+        errors = samples.stage_to_errors[stage]
+        total = len(latencies) + errors
+        report['client_stages'][stage] = {
+            'requests': total,
+            'throughput_per_second': len(latencies) / elapsed if elapsed else None,
+            'error_rate': errors / total if total else None,
+            **{f'p{round(quantile * 100)}_seconds': get_percentile(latencies, quantile) for quantile in QUANTILES}
+        }
+
+    for stage, (bucket_counts, sum_, count) in server_stage_snapshot_after.items():
+        bucket_counts_before, sum_before, count_before = server_stage_snapshot_before.get(stage, ([0] * len(bucket_counts), 0.0, 0))
+        count -= count_before
+        if count == 0:
+            continue
+        bucket_counts = [bucket_count - bucket_count_before for bucket_count, bucket_count_before in zip(bucket_counts, bucket_counts_before)]
+        report['server_stages'][stage] = {
+            'observations': count,
+            'mean_seconds': (sum_ - sum_before) / count,
+            **{f'p{round(quantile * 100)}_seconds': estimate_quantile(buckets, bucket_counts, quantile) for quantile in QUANTILES}
+        }
+
+    return report
+
+
+def format_seconds(seconds):
+    return '-' if seconds is None else f'{seconds * 1000:.1f}ms'
+
+
+def print_report(report):
+    print(f'elapsed: {report["elapsed_seconds"]:.2f}s')
+    print(f'{"client stage":<28}{"requests":>10}{"req/s":>10}{"errors":>10}{"p50":>12}{"p95":>12}{"p99":>12}')
+    for stage, stage_report in report['client_stages'].items():
+        print(
+            f'{stage:<28}{stage_report["requests"]:>10}{stage_report["throughput_per_second"]:>10.1f}{stage_report["error_rate"]:>10.1%}'
+            f'{format_seconds(stage_report["p50_seconds"]):>12}{format_seconds(stage_report["p95_seconds"]):>12}{format_seconds(stage_report["p99_seconds"]):>12}'
+        )
+    print(f'{"server stage (estimated)":<28}{"count":>10}{"mean":>10}{"":>10}{"p50":>12}{"p95":>12}{"p99":>12}')
+    for stage, stage_report in sorted(report['server_stages'].items()):
+        print(
+            f'{stage:<28}{stage_report["observations"]:>10}{format_seconds(stage_report["mean_seconds"]):>10}{"":>10}'
+            f'{format_seconds(stage_report["p50_seconds"]):>12}{format_seconds(stage_report["p95_seconds"]):>12}{format_seconds(stage_report["p99_seconds"]):>12}'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='+', help='.py files (one code context each) or .jsonl files (one request per line)')
+    parser.add_argument('--endpoint', choices=('suggest_stream', 'suggest'), default='suggest_stream')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads')
+    parser.add_argument('--rate', type=float, default=None, help='arrival rate in requests per second (default: closed loop)')
+    parser.add_argument('--repeat', type=int, default=1, help='how many times to replay the requests')
+    parser.add_argument('--no-cache', action='store_true', help='do not answer repeated code contexts from the type inference cache')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    # requests that are not suggestion requests (e.g., without a code context) are skipped
+    suggestion_request_datas = [data for data in read_suggestion_request_datas(args.paths) if 'code_context' in data]
+
+    # starts the worker pool
+    import server
+
+    if args.no_cache:
+        server.type_inference_cache.max_entries = 0
+
+    try:
+        server_stage_snapshot_before = server.stage_metrics.get_snapshot()
+        samples, elapsed = replay(
+            server.app,
+            get_replayed_requests(suggestion_request_datas, args.repeat),
+            args.endpoint,
+            args.concurrency,
+            args.rate,
+            args.seed
+        )
+        report = get_report(samples, elapsed, server.stage_metrics.buckets, server_stage_snapshot_before, server.stage_metrics.get_snapshot())
+    finally:
+        server.inference_worker_pool.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print_report(report)
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import threading
+import typing
+
+
+class ParameterMetadata(typing.NamedTuple):
+    version: int                # mtime of the file it was loaded from
+    library_to_function_to_parameters: dict[str, dict[str, list[dict]]]
+    # reverse index: function name -> [(library, parameters)], in file order
+    function_to_libraries_and_parameters: dict[str, list[tuple[str, list[dict]]]]
+
+
+def load_parameter_metadata(path):
+    version = os.stat(path).st_mtime_ns
+    with open(path, 'r') as fp:
+        library_to_function_to_parameters = json.load(fp)
+
+    function_to_libraries_and_parameters = {}
+    for library, function_to_parameters in library_to_function_to_parameters.items():
+        for function, parameters in function_to_parameters.items():
+            function_to_libraries_and_parameters.setdefault(function, []).append((library, parameters))
+
+    return ParameterMetadata(version, library_to_function_to_parameters, function_to_libraries_and_parameters)
+
+
+class ParameterMetadataStore:
+    """
+    params_db.json ({library: {function: [parameter, ...]}}) loaded once and indexed by function name.
+    The file is loaded again when its mtime changes. Readers always see a complete snapshot,
+    as a reload builds a new snapshot and swaps it in. Snapshots must not be mutated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.metadata = load_parameter_metadata(path)
+
+    @property
+    def version(self):
+        return self.metadata.version
+
+    def reload_if_changed(self):
+        try:
+            version = os.stat(self.path).st_mtime_ns
+        except OSError:
+            logging.exception('Cannot stat %s, keeping the loaded parameter metadata', self.path)
+            return
+
+        if version == self.metadata.version:
+            return
+
+        with self.lock:
+            if version == self.metadata.version:
+                return
+            try:
+                self.metadata = load_parameter_metadata(self.path)
+            except (OSError, ValueError):
+                # e.g., the file is being written
+                logging.exception('Cannot load %s, keeping the loaded parameter metadata', self.path)
+
+    def get_parameters(self, library, function):
+        return self.metadata.library_to_function_to_parameters.get(library, {}).get(function)
+
+    def get_signatures(self, function):
+        return self.metadata.function_to_libraries_and_parameters.get(function, [])
+
+    def lookup(self, module, function, global_imports):
+        """
+        Find the parameters of `function`, called as `module.function` (or just `function` if `module` is None).
+        `module` may be an alias from `global_imports` (imported module -> alias).
+        Falls back to the first library that has a function with this name.
+        """
+        metadata = self.metadata
+
+        if module is not None:
+            for imported, alias in global_imports.items():
+                if alias == module:
+                    parameters = metadata.library_to_function_to_parameters.get(imported, {}).get(function)
+                    if parameters is not None:
+                        return parameters
+
+            parameters = metadata.library_to_function_to_parameters.get(module, {}).get(function)
+            if parameters is not None:
+                return parameters
+
+        signatures = metadata.function_to_libraries_and_parameters.get(function)
+        if signatures:
+            library, parameters = signatures[0]
+            return parameters
+
+        return None
+
+
+class ParameterMetadataOverlay:
+    """
+    The signatures of the functions defined in one document, layered over the shared store.
+    The store is never written to. Local functions shadow library functions with the same name
+    when called without a module, like they would at runtime.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # replaced as a whole, never mutated in place
+        self.function_to_parameters = {}
+
+    def set_local_functions(self, function_to_parameters):
+        self.function_to_parameters = dict(function_to_parameters)
+
+    def lookup(self, module, function, global_imports):
+        if module is None:
+            parameters = self.function_to_parameters.get(function)
+            if parameters is not None:
+                return parameters
+        return self.store.lookup(module, function, global_imports)
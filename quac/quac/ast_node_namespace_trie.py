@@ -155,3 +155,60 @@ def search_ast_node_namespace_trie(
                     return frozenset(containing_namespace_trie_root.value[name_])
 
     return frozenset()
+
+
+def get_ast_node_namespace_trie_for_top_level_statement(
+    module_name: str,
+    module_node: ast.Module,
+    top_level_statement: ast.stmt,
+    function_definitions_to_parameters_name_parameter_mappings_and_return_values: typing.Mapping[
+        ast.AST,
+        tuple[typing.Sequence[ast.AST], typing.Mapping[str, ast.AST], ast.AST]
+    ]
+) -> TrieNode[str, dict[str, set[ast.AST]]]:
+    """
+    Build the namespace trie of a single top-level statement.
+    The returned trie node corresponds to the namespace of the module.
+    """
+    module_level_namespace_trie_node: TrieNode[str, dict[str, set[ast.AST]]] = TrieNode()
+
+    ModuleLevelASTNodeNamespaceTrieBuilder(
+        module_level_namespace_trie_node,
+        module_name,
+        module_node,
+        function_definitions_to_parameters_name_parameter_mappings_and_return_values
+    ).visit(top_level_statement)
+
+    return module_level_namespace_trie_node
+
+
+def search_ast_node_namespace_tries_of_top_level_statements(
+    module_level_namespace_trie_nodes_: typing.Sequence[TrieNode[str, dict[str, set[ast.AST]]]],
+    components_: typing.Sequence[str]
+) -> frozenset[ast.AST]:
+    """
+    Equivalent to calling `search_ast_node_namespace_trie` on the namespace trie of the whole module,
+    with `components_` not including the module name.
+    Names accessed in the namespace of the module are collected from all top-level statements,
+    while a nested namespace (e.g., of a function or a class) comes from the last top-level statement defining it.
+    """
+    if len(components_) == 1:
+        name_ = components_[0]
+
+        nodes: set[ast.AST] = set()
+        for module_level_namespace_trie_node in module_level_namespace_trie_nodes_:
+            if module_level_namespace_trie_node.value is not None and name_ in module_level_namespace_trie_node.value:
+                nodes.update(module_level_namespace_trie_node.value[name_])
+
+        return frozenset(nodes)
+    elif len(components_) > 1:
+        first_component = components_[0]
+
+        for module_level_namespace_trie_node in reversed(module_level_namespace_trie_nodes_):
+            if first_component in module_level_namespace_trie_node.children:
+                return search_ast_node_namespace_trie(
+                    module_level_namespace_trie_node.children[first_component],
+                    components_[1:]
+                )
+
+    return frozenset()
@@ -0,0 +1,310 @@
+import ast
+import builtins
+import inspect
+import keyword
+import logging
+import sys
+import types
+import typing
+
+
+# A global of function skeletons, always true, guarding their bodies
+SKELETON_GUARD_NAME = '__skeleton__'
+
+# Functions and methods whose first argument is an attribute name, as found by `get_attributes_accessed_on_self_in_method`
+ATTRIBUTE_FUNCTION_NAMES = frozenset(('setattr', 'getattr', 'delattr', 'hasattr'))
+ATTRIBUTE_METHOD_NAMES = frozenset(('__setattr__', '__getattr__', '__delattr__', '__hasattr__'))
+
+
+def resolve_name_or_attribute_statically(
+    node: ast.expr,
+    namespace: typing.Mapping[str, object]
+) -> typing.Optional[object]:
+    """
+    Resolve a name (e.g., `Base`) or an attribute chain (e.g., `module.Base`) without running any code:
+    attributes are only looked up statically on modules and classes.
+    """
+    if isinstance(node, ast.Name):
+        if node.id in namespace:
+            return namespace[node.id]
+        return builtins.__dict__.get(node.id)
+    elif isinstance(node, ast.Attribute):
+        value = resolve_name_or_attribute_statically(node.value, namespace)
+        if isinstance(value, (types.ModuleType, type)):
+            try:
+                return inspect.getattr_static(value, node.attr)
+            except AttributeError:
+                if isinstance(value, types.ModuleType):
+                    return sys.modules.get(f'{value.__name__}.{node.attr}')
+    return None
+
+
+def get_builtin_method_decorator(
+    decorator: ast.expr,
+    namespace: typing.Mapping[str, object]
+) -> typing.Optional[type]:
+    if isinstance(decorator, ast.Name) and decorator.id in ('staticmethod', 'classmethod', 'property'):
+        value = resolve_name_or_attribute_statically(decorator, namespace)
+        if value is getattr(builtins, decorator.id):
+            return value
+    return None
+
+
+def get_first_parameter_name(function_definition: typing.Union[ast.FunctionDef, ast.AsyncFunctionDef]) -> typing.Optional[str]:
+    # The first local variable (`LOAD_FAST 0`), in the order of `co_varnames`
+    arguments = function_definition.args
+    for parameter in (*arguments.posonlyargs, *arguments.args, *arguments.kwonlyargs, arguments.vararg, arguments.kwarg):
+        if parameter is not None:
+            return parameter.arg
+    return None
+
+
+def get_attributes_accessed_on_first_parameter(
+    function_definition: typing.Union[ast.FunctionDef, ast.AsyncFunctionDef],
+    class_name: typing.Optional[str] = None
+) -> list[str]:
+    """
+    Find the attributes a function accesses on its first parameter (`self` in methods), like
+    `get_attributes_accessed_on_self_in_method` does on its bytecode: `self.x` (but method calls such as `self.f()`),
+    `setattr(self, 'x', ...)`, `self.__setattr__('x', ...)`, `super().__setattr__('x', ...)` and `object.__setattr__(self, 'x', ...)`.
+    Private names are mangled with `class_name`, as in the bytecode of methods.
+    """
+    first_parameter_name = get_first_parameter_name(function_definition)
+    if first_parameter_name is None:
+        return []
+
+    def is_first_parameter(node: ast.expr) -> bool:
+        return isinstance(node, ast.Name) and node.id == first_parameter_name
+
+    def get_string_constant(nodes: list[ast.expr], index: int) -> typing.Optional[str]:
+        if index < len(nodes) and isinstance(nodes[index], ast.Constant) and isinstance(nodes[index].value, str):
+            return nodes[index].value
+        return None
+
+    def mangle(attribute: str) -> str:
+        if class_name is not None and attribute.startswith('__') and not attribute.endswith('__') and class_name.lstrip('_'):
+            return f'_{class_name.lstrip("_")}{attribute}'
+        return attribute
+
+    attributes: dict[str, None] = {}
+    called_nodes: set[ast.expr] = set()
+
+    def visit(node: ast.AST):
+        # Nested functions, classes and comprehensions are compiled to code of their own
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+            return
+
+        if isinstance(node, ast.Call):
+            called_nodes.add(node.func)
+            attribute = None
+            if isinstance(node.func, ast.Name) and node.func.id in ATTRIBUTE_FUNCTION_NAMES and node.args and is_first_parameter(node.args[0]):
+                attribute = get_string_constant(node.args, 1)
+            elif isinstance(node.func, ast.Attribute) and node.func.attr in ATTRIBUTE_METHOD_NAMES:
+                value = node.func.value
+                if is_first_parameter(value) or (isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id == 'super'):
+                    attribute = get_string_constant(node.args, 0)
+                elif isinstance(value, ast.Name) and value.id == 'object' and node.args and is_first_parameter(node.args[0]):
+                    attribute = get_string_constant(node.args, 1)
+            if attribute is not None:
+                attributes[attribute] = None
+        elif isinstance(node, ast.Attribute) and is_first_parameter(node.value) and node not in called_nodes:
+            attributes[mangle(node.attr)] = None
+
+        for child_node in ast.iter_child_nodes(node):
+            visit(child_node)
+
+    for statement in function_definition.body:
+        visit(statement)
+
+    return list(attributes)
+
+
+def create_function_skeleton(
+    function_definition: typing.Union[ast.FunctionDef, ast.AsyncFunctionDef],
+    module_name: str,
+    pseudo_file_name: str,
+    qualname: str,
+    class_name: typing.Optional[str] = None
+) -> types.FunctionType:
+    """
+    Create a function with the name and parameters of `function_definition`, but without its body, decorators,
+    annotations and default values, which could all run arbitrary code.
+    The skeletons of methods (of class `class_name`) set the attributes the method accesses on `self` instead,
+    as these are found in the bytecode of constructors (e.g., `__init__`), behind a guard that always returns first,
+    so that calling them (e.g., by metaclasses or `__init_subclass__` of bases while creating the class) runs nothing.
+    """
+    arguments = function_definition.args
+
+    def strip_arg(arg: typing.Optional[ast.arg]) -> typing.Optional[ast.arg]:
+        if arg is None:
+            return None
+        return ast.copy_location(ast.arg(arg=arg.arg, annotation=None), arg)
+
+    skeleton_arguments = ast.arguments(
+        posonlyargs=[strip_arg(arg) for arg in arguments.posonlyargs],
+        args=[strip_arg(arg) for arg in arguments.args],
+        vararg=strip_arg(arguments.vararg),
+        kwonlyargs=[strip_arg(arg) for arg in arguments.kwonlyargs],
+        kw_defaults=[None if kw_default is None else ast.Constant(value=None) for kw_default in arguments.kw_defaults],
+        kwarg=strip_arg(arguments.kwarg),
+        defaults=[ast.Constant(value=None) for _ in arguments.defaults]
+    )
+
+    body: list[ast.stmt] = [ast.Pass()]
+    if class_name is not None:
+        # if __skeleton__: return
+        body = [ast.If(test=ast.Name(id=SKELETON_GUARD_NAME, ctx=ast.Load()), body=[ast.Return(value=None)], orelse=[])]
+
+        for attribute in get_attributes_accessed_on_first_parameter(function_definition, class_name):
+            first_parameter_name = ast.Name(id=get_first_parameter_name(function_definition), ctx=ast.Load())
+            if attribute.isidentifier() and not keyword.iskeyword(attribute):
+                # self.attribute = None
+                body.append(ast.Assign(
+                    targets=[ast.Attribute(value=first_parameter_name, attr=attribute, ctx=ast.Store())],
+                    value=ast.Constant(value=None)
+                ))
+            else:
+                # setattr(self, 'attribute', None)
+                body.append(ast.Expr(value=ast.Call(
+                    func=ast.Name(id='setattr', ctx=ast.Load()),
+                    args=[first_parameter_name, ast.Constant(value=attribute), ast.Constant(value=None)],
+                    keywords=[]
+                )))
+
+    skeleton = type(function_definition)(
+        name=function_definition.name,
+        args=skeleton_arguments,
+        body=body,
+        decorator_list=[],
+        returns=None,
+        type_comment=None
+    )
+    ast.copy_location(skeleton, function_definition)
+
+    module_node = ast.Module(body=[skeleton], type_ignores=[])
+    ast.fix_missing_locations(module_node)
+
+    namespace = {'__name__': module_name, SKELETON_GUARD_NAME: True}
+    exec(compile(module_node, pseudo_file_name, 'exec', dont_inherit=True), namespace)
+
+    function = namespace[function_definition.name]
+    function.__qualname__ = qualname
+    return function
+
+
+def create_class_skeleton(
+    class_definition: ast.ClassDef,
+    namespace: typing.Mapping[str, object],
+    module_name: str,
+    pseudo_file_name: str,
+    qualname: str
+) -> type:
+    """
+    Create a class with the name, statically resolvable bases, methods, nested classes and class attribute names of `class_definition`.
+    Methods are function skeletons, and class attributes are bound to their values if these are literals, or `...` otherwise.
+    """
+    bases = []
+    for base in class_definition.bases:
+        value = resolve_name_or_attribute_statically(base, namespace)
+        if isinstance(value, type):
+            bases.append(value)
+        else:
+            logging.info('Cannot resolve base %s of class %s statically', ast.unparse(base), qualname)
+
+    def exec_body(class_namespace: dict[str, object]):
+        class_namespace['__module__'] = module_name
+        class_namespace['__qualname__'] = qualname
+
+        for statement in class_definition.body:
+            if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                method = create_function_skeleton(statement, module_name, pseudo_file_name, f'{qualname}.{statement.name}', class_definition.name)
+                for decorator in reversed(statement.decorator_list):
+                    builtin_method_decorator = get_builtin_method_decorator(decorator, namespace)
+                    if builtin_method_decorator is not None:
+                        method = builtin_method_decorator(method)
+                class_namespace[statement.name] = method
+            elif isinstance(statement, ast.ClassDef):
+                class_namespace[statement.name] = create_class_skeleton(statement, namespace, module_name, pseudo_file_name, f'{qualname}.{statement.name}')
+            elif isinstance(statement, (ast.Assign, ast.AnnAssign)):
+                # Literals (e.g., `__slots__`) can be evaluated safely
+                value = ...
+                if statement.value is not None:
+                    try:
+                        value = ast.literal_eval(statement.value)
+                    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+                        pass
+
+                targets = statement.targets if isinstance(statement, ast.Assign) else [statement.target]
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        class_namespace[target.id] = value
+
+    try:
+        return types.new_class(class_definition.name, tuple(bases), exec_body=exec_body)
+    except Exception:
+        # e.g., metaclass conflicts, or third-party metaclasses expecting more than a skeleton
+        logging.exception('Cannot create class %s with bases %s, creating it without bases', qualname, bases)
+        return types.new_class(class_definition.name, (), exec_body=exec_body)
+
+
+def bind_top_level_statement_statically(
+    top_level_statement: ast.stmt,
+    module: types.ModuleType,
+    pseudo_file_name: str
+):
+    """
+    Bind the names a top-level statement would bind in `module`, without running any code from the statement:
+
+    - Imports are bound only to modules that are already in `sys.modules`, and never import anything.
+    - Functions and classes are bound to skeletons (see `create_function_skeleton` and `create_class_skeleton`).
+    - Imports and definitions in the bodies of `if` and `try` statements are bound as well, as in `try: import x ...`.
+    - Other statements (e.g., assignments) bind nothing.
+    """
+    namespace = module.__dict__
+    module_name = module.__name__
+
+    if isinstance(top_level_statement, ast.Import):
+        for alias in top_level_statement.names:
+            if alias.asname is not None:
+                imported_module = sys.modules.get(alias.name)
+                if imported_module is not None:
+                    namespace[alias.asname] = imported_module
+            else:
+                top_level_module_name = alias.name.split('.')[0]
+                imported_module = sys.modules.get(top_level_module_name)
+                if imported_module is not None:
+                    namespace[top_level_module_name] = imported_module
+    elif isinstance(top_level_statement, ast.ImportFrom):
+        # Relative imports have no meaning for a document
+        if top_level_statement.level == 0 and top_level_statement.module in sys.modules:
+            import_from_module = sys.modules[top_level_statement.module]
+            import_from_module_dict = import_from_module.__dict__
+
+            for alias in top_level_statement.names:
+                if alias.name == '*':
+                    if '__all__' in import_from_module_dict:
+                        names = [name for name in import_from_module_dict['__all__'] if isinstance(name, str)]
+                    else:
+                        names = [name for name in import_from_module_dict if not name.startswith('_')]
+
+                    for name in names:
+                        if name in import_from_module_dict:
+                            namespace[name] = import_from_module_dict[name]
+                else:
+                    if alias.name in import_from_module_dict:
+                        value = import_from_module_dict[alias.name]
+                    else:
+                        value = sys.modules.get(f'{top_level_statement.module}.{alias.name}')
+
+                    if value is not None:
+                        namespace[alias.asname or alias.name] = value
+    elif isinstance(top_level_statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        namespace[top_level_statement.name] = create_function_skeleton(top_level_statement, module_name, pseudo_file_name, top_level_statement.name)
+    elif isinstance(top_level_statement, ast.ClassDef):
+        namespace[top_level_statement.name] = create_class_skeleton(top_level_statement, namespace, module_name, pseudo_file_name, top_level_statement.name)
+    elif isinstance(top_level_statement, ast.If):
+        for statement in top_level_statement.body + top_level_statement.orelse:
+            bind_top_level_statement_statically(statement, module, pseudo_file_name)
+    elif isinstance(top_level_statement, ast.Try):
+        for statement in top_level_statement.body + top_level_statement.orelse + top_level_statement.finalbody:
+            bind_top_level_statement_statically(statement, module, pseudo_file_name)
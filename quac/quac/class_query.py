@@ -1,18 +1,13 @@
-import collections.abc
-import contextlib
+import collections
 import logging
-import numbers
-import types
 import typing
 
 import numpy as np
-import pandas as pd
+import scipy.sparse
 
 from get_attributes_in_runtime_class import get_attributes_in_runtime_class
-from get_attributes_in_typeshed_class_definition import get_attributes_in_typeshed_class_definition
-from ignored_attributes import IGNORED_ATTRIBUTES
 from iterate_inheritance_graph_layers import iterate_inheritance_graph_layers
-from set_trie import SetTrieNode, add, contains
+from static_class_query_database import StaticClassQueryDatabase, build_static_class_query_database
 from type_definitions import RuntimeClass
 from typeshed_client_ex.client import Client
 from typeshed_client_ex.type_definitions import TypeshedClass, from_runtime_class
@@ -30,99 +25,43 @@ EXCLUDED_MODULE_NAMES = {
 }
 
 
-def initialize_class_query_database(
+class ClassAttributeMatrix(typing.NamedTuple):
+    """
+    Which classes have which attributes, with attributes interned to integer ids.
+    Row i of `matrix` is the class `class_ndarray[i]`, and column j is the attribute `attribute_list[j]`.
+    `matrix` is a CSR matrix with a 1 for each attribute of each class, so its size scales with the number of non-zeros.
+    """
+    class_ndarray: np.ndarray
+    attribute_list: list[str]
+    attribute_to_attribute_id: dict[str, int]
+    matrix: scipy.sparse.csr_matrix
+    # The number of attributes of each class (the row sums of `matrix`)
+    num_attributes_in_classes: np.ndarray
+    # `matrix` in CSC format, i.e., an inverted index: the row indices of column j are the ids of the classes with attribute j
+    inverted_index: scipy.sparse.csc_matrix
+
+    def get_attribute_ids(self, attributes: typing.Iterable[str]) -> np.ndarray:
+        # Attributes that were never added are left out
+        # Sorted, so that scores are summed in the same order whether they are computed for one query or in bulk
+        attribute_to_attribute_id = self.attribute_to_attribute_id
+        return np.sort(np.fromiter(
+            (attribute_to_attribute_id[attribute] for attribute in attributes if attribute in attribute_to_attribute_id),
+            dtype=np.int64
+        ))
+
+
+def get_runtime_typeshed_class_to_attribute_set_dict(
         runtime_classes: typing.AbstractSet[RuntimeClass],
-        typeshed_client: Client
-):
-    attribute_set_trie_root: SetTrieNode[str] = SetTrieNode()
-    typeshed_class_to_attribute_set_dict: dict[TypeshedClass, set[str]] = {}
-
-    # Special handling for classes in `_typeshed` (Typeshed only)
-    for typeshed_class in (
-            TypeshedClass('_typeshed', 'SupportsItemAccess'),
-            TypeshedClass('_typeshed', 'SupportsGetItem'),
-            TypeshedClass('_typeshed', 'HasFileno'),
-            TypeshedClass('_typeshed', 'SupportsRead'),
-            TypeshedClass('_typeshed', 'SupportsReadline'),
-            TypeshedClass('_typeshed', 'SupportsNoArgReadline'),
-            TypeshedClass('_typeshed', 'SupportsWrite'),
-            TypeshedClass('_typeshed', 'SupportsAdd'),
-            TypeshedClass('_typeshed', 'SupportsRAdd'),
-            TypeshedClass('_typeshed', 'SupportsSub'),
-            TypeshedClass('_typeshed', 'SupportsRSub'),
-            TypeshedClass('_typeshed', 'SupportsDivMod'),
-            TypeshedClass('_typeshed', 'SupportsRDivMod'),
-            TypeshedClass('_typeshed', 'SupportsTrunc'),
-    ):
-        typeshed_class_definition = typeshed_client.get_class_definition(typeshed_class)
-        attributes_in_typeshed_class = get_attributes_in_typeshed_class_definition(typeshed_class_definition) - IGNORED_ATTRIBUTES
-        add(attribute_set_trie_root, attributes_in_typeshed_class)
-        typeshed_class_to_attribute_set_dict[typeshed_class] = attributes_in_typeshed_class
-
-    # Special handling for byte sequences
-    bytestring_typeshed_class = TypeshedClass('typing', 'ByteString')
-    bytestring_attributes = get_attributes_in_runtime_class(bytes) | get_attributes_in_runtime_class(bytearray)
-    add(attribute_set_trie_root, bytestring_attributes)
-    typeshed_class_to_attribute_set_dict[bytestring_typeshed_class] = bytestring_attributes
-
-    # Special handling for built-in types and abstract base types
-    for runtime_class in (
-            object,
-            int,
-            float,
-            complex,
-            list,
-            str,
-            set,
-            frozenset,
-            dict,
-            tuple,
-            range,
-            slice,
-            type,
-            types.CellType,
-            types.TracebackType,
-            types.FrameType,
-            types.CodeType,
-            typing.SupportsIndex,
-            typing.SupportsBytes,
-            typing.SupportsComplex,
-            typing.SupportsFloat,
-            typing.SupportsInt,
-            typing.SupportsRound,
-            typing.SupportsAbs,
-            typing.TextIO,
-            typing.IO,
-            collections.abc.Iterable,
-            collections.abc.Collection,
-            collections.abc.Iterator,
-            collections.abc.Reversible,
-            collections.abc.Generator,
-            collections.abc.AsyncIterable,
-            collections.abc.AsyncIterator,
-            collections.abc.AsyncGenerator,
-            collections.abc.Awaitable,
-            collections.abc.Coroutine,
-            collections.abc.Sequence,
-            collections.abc.MutableSequence,
-            collections.abc.Mapping,
-            collections.abc.MutableMapping,
-            collections.abc.Set,
-            collections.abc.MutableSet,
-            collections.abc.Callable,
-            numbers.Complex,
-            numbers.Real,
-            numbers.Rational,
-            numbers.Integral,
-            contextlib.AbstractContextManager,
-            contextlib.AbstractAsyncContextManager
-    ):
-        attributes_in_runtime_class = get_attributes_in_runtime_class(runtime_class)
-        add(attribute_set_trie_root, attributes_in_runtime_class)
-        typeshed_class = from_runtime_class(runtime_class)
-        typeshed_class_to_attribute_set_dict[typeshed_class] = attributes_in_runtime_class
-
-    # Handle classes from user-defined and third-party modules
+        existing_attribute_sets: typing.Container[frozenset[str]]
+) -> dict[TypeshedClass, set[str]]:
+    """
+    Select the classes from user-defined and third-party modules to add to the class query database, and get their attribute sets.
+    Classes are visited from base classes to derived classes, and a class is left out
+    if an existing class (or a class in an earlier layer of the inheritance graph) has the same attribute set.
+    """
+    runtime_typeshed_class_to_attribute_set_dict: dict[TypeshedClass, set[str]] = {}
+    added_attribute_sets: set[frozenset[str]] = set()
+
     for inheritance_graph_layer in iterate_inheritance_graph_layers(runtime_classes):
         logging.warning('%s', inheritance_graph_layer)
 
@@ -133,102 +72,364 @@ def initialize_class_query_database(
             if not isinstance(module_name, str) or module_name in EXCLUDED_MODULE_NAMES or module_name.startswith('_'):
                 logging.warning('Excluded runtime class %s', runtime_class)
             else:
-                attributes_in_runtime_class = get_attributes_in_runtime_class(runtime_class)
+                attributes_in_runtime_class = frozenset(get_attributes_in_runtime_class(runtime_class))
 
-                if contains(attribute_set_trie_root, attributes_in_runtime_class):
+                if attributes_in_runtime_class in existing_attribute_sets or attributes_in_runtime_class in added_attribute_sets:
                     logging.warning('Excluded runtime class %s from class query database as an existing class its attribute set', runtime_class)
                 else:
                     logging.warning('Adding runtime class %s', runtime_class)
                     included_runtime_classes_in_inheritance_graph_layer.add(runtime_class)
-        
+
         for included_runtime_class in included_runtime_classes_in_inheritance_graph_layer:
             attributes_in_runtime_class = get_attributes_in_runtime_class(included_runtime_class)
-            add(attribute_set_trie_root, attributes_in_runtime_class)
+            added_attribute_sets.add(frozenset(attributes_in_runtime_class))
             typeshed_class = from_runtime_class(included_runtime_class)
-            typeshed_class_to_attribute_set_dict[typeshed_class] = attributes_in_runtime_class
-
-    # Finish adding all classes
-    candidate_class_list = list(typeshed_class_to_attribute_set_dict.keys())
-
-    attribute_set = set.union(*typeshed_class_to_attribute_set_dict.values())
-    attribute_list = list(attribute_set)
-
-    class_attribute_matrix = pd.DataFrame(
-        [
-            [
-                (attribute in typeshed_class_to_attribute_set_dict.get(candidate_class, set()))
-                for attribute in attribute_list
-            ]
-            for candidate_class in candidate_class_list
-        ],
-        index=candidate_class_list,
-        columns=attribute_list
-    )
+            runtime_typeshed_class_to_attribute_set_dict[typeshed_class] = attributes_in_runtime_class
 
-    # Count non-zero values in each column (Document Frequency)
-    doc_frequency: pd.Series = class_attribute_matrix.apply(
-        lambda attribute_column: (attribute_column != 0).sum()
-    )
+    return runtime_typeshed_class_to_attribute_set_dict
 
-    # Calculate IDFs for each attribute
-    idfs: pd.Series = np.log((len(candidate_class_list) - doc_frequency + 0.5) / (doc_frequency + 0.5) + 1)
 
-    # Calculate the average number of attributes in all classes
-    average_num_attributes_in_classes: float = (class_attribute_matrix != 0).sum(axis=1).mean()
+class ClassQueryDatabase:
+    """
+    The classes in the class query database and their attributes, updatable one class at a time.
+    The number of classes with each attribute (document frequencies) and the total number of attributes in all classes are
+    kept up to date, so that adding or removing a class takes time proportional to its number of attributes.
+    The ClassAttributeMatrix, IDFs and average number of attributes that queries use are only recomputed when requested after a change.
+    """
 
-    return (
-        class_attribute_matrix,
-        idfs,
-        average_num_attributes_in_classes
-    )
+    def __init__(self, static_class_query_database: StaticClassQueryDatabase):
+        # Attributes are interned to ids in the order they are first added, and keep their ids after their classes are removed
+        self.attribute_list: list[str] = list(static_class_query_database.attribute_list)
+        self.attribute_to_attribute_id: dict[str, int] = {
+            attribute: attribute_id
+            for attribute_id, attribute in enumerate(self.attribute_list)
+        }
+        # Indexed by attribute id, with room for more attributes
+        self.document_frequencies: np.ndarray = np.zeros(max(16, 2 * len(self.attribute_list)), dtype=np.int64)
+        self.total_num_attributes_in_classes: int = 0
 
+        # Classes in the order they are added, to the (sorted) ids of their attributes
+        self.typeshed_class_to_attribute_ids: dict[TypeshedClass, np.ndarray] = {}
+        # How many classes have each attribute set
+        self.attribute_set_to_num_classes: collections.Counter[frozenset[str]] = collections.Counter()
 
-def get_score_function(
-    attributes: typing.Iterable[str],
-    idfs: typing.Mapping[str, float],
-    average_num_attributes_in_classes: float
+        # The classes added by `set_runtime_classes`, to their attribute sets
+        self.runtime_typeshed_class_to_attribute_set_dict: dict[TypeshedClass, set[str]] = {}
+
+        self.query_database: typing.Optional[tuple[ClassAttributeMatrix, np.ndarray, float]] = None
+
+        # The static classes keep their rows of the (memory-mapped, if loaded) static database, which are sorted, as they are
+        static_attribute_ids = static_class_query_database.attribute_ids
+        self.document_frequencies[:len(self.attribute_list)] = np.bincount(static_attribute_ids, minlength=len(self.attribute_list))
+        self.total_num_attributes_in_classes = len(static_attribute_ids)
+
+        for typeshed_class, row_start, row_end in zip(
+            static_class_query_database.typeshed_class_list,
+            static_class_query_database.row_offsets[:-1].tolist(),
+            static_class_query_database.row_offsets[1:].tolist()
+        ):
+            attribute_ids = static_attribute_ids[row_start:row_end]
+            self.typeshed_class_to_attribute_ids[typeshed_class] = attribute_ids
+            # Only the attribute sets are materialized, to tell runtime classes with the same attribute set
+            self.attribute_set_to_num_classes[frozenset(self.attribute_list[attribute_id] for attribute_id in attribute_ids.tolist())] += 1
+
+    def __contains__(self, typeshed_class: TypeshedClass) -> bool:
+        return typeshed_class in self.typeshed_class_to_attribute_ids
+
+    def __len__(self) -> int:
+        return len(self.typeshed_class_to_attribute_ids)
+
+    def intern_attributes(self, attribute_set: typing.AbstractSet[str]) -> np.ndarray:
+        attribute_to_attribute_id = self.attribute_to_attribute_id
+        for attribute in attribute_set:
+            if attribute not in attribute_to_attribute_id:
+                attribute_to_attribute_id[attribute] = len(self.attribute_list)
+                self.attribute_list.append(attribute)
+
+        if len(self.attribute_list) > len(self.document_frequencies):
+            self.document_frequencies = np.concatenate((
+                self.document_frequencies,
+                np.zeros(max(len(self.attribute_list), len(self.document_frequencies)), dtype=np.int64)
+            ))
+
+        return np.sort(np.fromiter(
+            (attribute_to_attribute_id[attribute] for attribute in attribute_set),
+            dtype=np.int32,
+            count=len(attribute_set)
+        ))
+
+    def add_attribute_ids(self, typeshed_class: TypeshedClass, attribute_ids: np.ndarray):
+        self.typeshed_class_to_attribute_ids[typeshed_class] = attribute_ids
+        # Each class has each attribute at most once
+        self.document_frequencies[attribute_ids] += 1
+        self.total_num_attributes_in_classes += len(attribute_ids)
+        self.query_database = None
+
+    def add_class(self, typeshed_class: TypeshedClass, attribute_set: typing.AbstractSet[str]):
+        """Add a class (replacing it if it was already added)."""
+        if typeshed_class in self.typeshed_class_to_attribute_ids:
+            self.remove_class(typeshed_class)
+
+        self.add_attribute_ids(typeshed_class, self.intern_attributes(attribute_set))
+        self.attribute_set_to_num_classes[frozenset(attribute_set)] += 1
+
+    def remove_class(self, typeshed_class: TypeshedClass):
+        attribute_ids = self.typeshed_class_to_attribute_ids.pop(typeshed_class)
+        self.document_frequencies[attribute_ids] -= 1
+        self.total_num_attributes_in_classes -= len(attribute_ids)
+        self.query_database = None
+
+        attribute_set = frozenset(self.attribute_list[attribute_id] for attribute_id in attribute_ids.tolist())
+        self.attribute_set_to_num_classes[attribute_set] -= 1
+        if not self.attribute_set_to_num_classes[attribute_set]:
+            del self.attribute_set_to_num_classes[attribute_set]
+
+    def set_runtime_classes(self, runtime_classes: typing.AbstractSet[RuntimeClass]):
+        """
+        Make the classes from user-defined and third-party modules in the database those selected from `runtime_classes`,
+        only adding and removing the classes that differ from those selected from the runtime classes previously set.
+        """
+        previous_runtime_typeshed_class_to_attribute_set_dict = self.runtime_typeshed_class_to_attribute_set_dict
+
+        # The attribute sets of the classes that are not from the previous runtime classes
+        previous_runtime_attribute_set_to_num_classes = collections.Counter(
+            frozenset(attribute_set) for attribute_set in previous_runtime_typeshed_class_to_attribute_set_dict.values()
+        )
+        existing_attribute_sets = {
+            attribute_set
+            for attribute_set, num_classes in self.attribute_set_to_num_classes.items()
+            if num_classes > previous_runtime_attribute_set_to_num_classes[attribute_set]
+        }
+
+        runtime_typeshed_class_to_attribute_set_dict = get_runtime_typeshed_class_to_attribute_set_dict(runtime_classes, existing_attribute_sets)
+
+        for typeshed_class, attribute_set in previous_runtime_typeshed_class_to_attribute_set_dict.items():
+            if runtime_typeshed_class_to_attribute_set_dict.get(typeshed_class) != attribute_set:
+                self.remove_class(typeshed_class)
+
+        for typeshed_class, attribute_set in runtime_typeshed_class_to_attribute_set_dict.items():
+            if previous_runtime_typeshed_class_to_attribute_set_dict.get(typeshed_class) != attribute_set:
+                self.add_class(typeshed_class, attribute_set)
+
+        self.runtime_typeshed_class_to_attribute_set_dict = runtime_typeshed_class_to_attribute_set_dict
+
+    def get_query_database(self) -> tuple[ClassAttributeMatrix, np.ndarray, float]:
+        """The ClassAttributeMatrix, the IDF of each attribute id, and the average number of attributes in classes."""
+        if self.query_database is None:
+            self.query_database = self.compute_query_database()
+        return self.query_database
+
+    def compute_query_database(self) -> tuple[ClassAttributeMatrix, np.ndarray, float]:
+        num_classes = len(self.typeshed_class_to_attribute_ids)
+        num_attributes = len(self.attribute_list)
+
+        class_ndarray = np.empty(num_classes, dtype=object)
+        class_ndarray[:] = list(self.typeshed_class_to_attribute_ids)
+
+        attribute_ids_list = list(self.typeshed_class_to_attribute_ids.values())
+        num_attributes_in_classes = np.fromiter(map(len, attribute_ids_list), dtype=np.int64, count=num_classes)
+        row_offsets = np.concatenate(([0], np.cumsum(num_attributes_in_classes)))
+
+        # Attribute ids of each class are sorted
+        matrix = scipy.sparse.csr_matrix(
+            (
+                np.ones(self.total_num_attributes_in_classes, dtype=np.int8),
+                np.concatenate(attribute_ids_list) if attribute_ids_list else np.zeros(0, dtype=np.int32),
+                row_offsets
+            ),
+            shape=(num_classes, num_attributes)
+        )
+
+        class_attribute_matrix = ClassAttributeMatrix(
+            class_ndarray,
+            list(self.attribute_list),
+            dict(self.attribute_to_attribute_id),
+            matrix,
+            num_attributes_in_classes,
+            matrix.tocsc()
+        )
+
+        # Calculate IDFs for each attribute id from the number of classes with it (Document Frequency)
+        doc_frequency = self.document_frequencies[:num_attributes]
+        idfs: np.ndarray = np.log((num_classes - doc_frequency + 0.5) / (doc_frequency + 0.5) + 1)
+
+        # Calculate the average number of attributes in all classes
+        average_num_attributes_in_classes: float = self.total_num_attributes_in_classes / num_classes if num_classes else 0.
+
+        return (
+            class_attribute_matrix,
+            idfs,
+            average_num_attributes_in_classes
+        )
+
+
+def initialize_class_query_database(
+        runtime_classes: typing.AbstractSet[RuntimeClass],
+        typeshed_client: Client,
+        static_class_query_database: typing.Optional[StaticClassQueryDatabase] = None
 ):
+    # The static part of the class query database can be computed once (or loaded from disk) and reused across calls
+    if static_class_query_database is None:
+        static_class_query_database = build_static_class_query_database(typeshed_client)
+
+    class_query_database = ClassQueryDatabase(static_class_query_database)
+    class_query_database.set_runtime_classes(runtime_classes)
+
+    return class_query_database.get_query_database()
+
+
+def get_length_normalizations(
+    class_ids: np.ndarray,
+    class_attribute_matrix: ClassAttributeMatrix,
+    average_num_attributes_in_classes: float
+) -> np.ndarray:
     k_1 = 1.5
     b = 0.75
 
-    def score_function(class_row: pd.Series):
-        num_attributes_in_class = (class_row != 0).sum()
-        
-        def attribute_score(attribute: str):
-            attribute_idf = idfs.get(attribute, 0)
-            attribute_frequency = class_row.get(attribute, 0)
-            return attribute_idf * (attribute_frequency * (k_1 + 1)) / (attribute_frequency + k_1 * (1 - b + b * (num_attributes_in_class) / average_num_attributes_in_classes))
-
-        return sum(
-            map(attribute_score, attributes),
-            0
-        )
-    
-    return score_function
+    return (k_1 + 1) / (1 + k_1 * (1 - b + b * class_attribute_matrix.num_attributes_in_classes[class_ids] / average_num_attributes_in_classes))
 
 
-# Query TypeshedClass's given an attribute set.
-def query(
-    attribute_set: typing.AbstractSet[str],
-    class_attribute_matrix: pd.DataFrame,
-    idfs: typing.Mapping[str, float],
+def get_candidate_class_ids_and_scores(
+    attribute_ids: np.ndarray,
+    class_attribute_matrix: ClassAttributeMatrix,
+    idfs: np.ndarray,
     average_num_attributes_in_classes: float
 ) -> tuple[np.ndarray, np.ndarray]:
-    if attribute_set:
-        score_function = get_score_function(attribute_set, idfs, average_num_attributes_in_classes)
-        result_series = class_attribute_matrix.apply(score_function, axis=1)
+    """
+    BM25 scores of the classes that have any of the attributes `attribute_ids`, the only classes with non-zero scores.
+    Only the posting lists of these attributes in the inverted index are read, so the time taken scales with the number of matches.
+    As each class has each attribute at most once, the score of a class is the sum of the IDFs of the attributes it has,
+    times a factor that only depends on its number of attributes.
+    """
+    inverted_index = class_attribute_matrix.inverted_index
+    posting_list_starts = inverted_index.indptr[attribute_ids]
+    posting_list_ends = inverted_index.indptr[attribute_ids + 1]
 
-        # Use numpy.argsort() on the Series values
-        indices = np.argsort(result_series.values)[::-1]
+    posting_class_ids = np.concatenate([
+        inverted_index.indices[posting_list_start:posting_list_end]
+        for posting_list_start, posting_list_end in zip(posting_list_starts, posting_list_ends)
+    ])
+    posting_idfs = np.repeat(idfs[attribute_ids], posting_list_ends - posting_list_starts)
 
-        class_ndarray = class_attribute_matrix.index.values[indices]
-        similarity_ndarray = result_series.values[indices]
+    candidate_class_ids, posting_candidate_indices = np.unique(posting_class_ids, return_inverse=True)
+    idf_sums = np.bincount(posting_candidate_indices, weights=posting_idfs, minlength=len(candidate_class_ids))
 
-        if (max_similarity := similarity_ndarray[0]) > 0.:
-            return class_ndarray, similarity_ndarray
+    return candidate_class_ids, idf_sums * get_length_normalizations(candidate_class_ids, class_attribute_matrix, average_num_attributes_in_classes)
 
-    # Either an empty attribute set, or no non-zero similarities calculated
+
+def select_top_k(
+    candidate_class_ids: np.ndarray,
+    result_ndarray: np.ndarray,
+    class_attribute_matrix: ClassAttributeMatrix,
+    k: typing.Optional[int] = None,
+    threshold: float = 0.
+) -> tuple[np.ndarray, np.ndarray]:
+    above_threshold = result_ndarray > threshold
+    candidate_class_ids = candidate_class_ids[above_threshold]
+    result_ndarray = result_ndarray[above_threshold]
+
+    if k is not None and k < len(result_ndarray):
+        # Keep every class tied with the k-th highest score, so that ties are broken the same way as in a full sort
+        kth_highest_score = -np.partition(-result_ndarray, k - 1)[k - 1]
+        top_scores = result_ndarray >= kth_highest_score
+        candidate_class_ids = candidate_class_ids[top_scores]
+        result_ndarray = result_ndarray[top_scores]
+
+    # Sort by score, then by class id, both descending
+    indices = np.lexsort((-candidate_class_ids, -result_ndarray))[:k]
+
+    class_ndarray = class_attribute_matrix.class_ndarray[candidate_class_ids[indices]]
+    similarity_ndarray = result_ndarray[indices]
+
+    return class_ndarray, similarity_ndarray
+
+
+def get_empty_query_result() -> tuple[np.ndarray, np.ndarray]:
     class_ndarray = np.zeros(0, dtype=object)
     similarity_ndarray = np.zeros(0)
 
     return class_ndarray, similarity_ndarray
+
+
+def query_top_k(
+    attribute_set: typing.AbstractSet[str],
+    class_attribute_matrix: ClassAttributeMatrix,
+    idfs: np.ndarray,
+    average_num_attributes_in_classes: float,
+    k: typing.Optional[int] = None,
+    threshold: float = 0.
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The (at most) `k` classes with the highest scores above `threshold`, highest first (all of them if `k` is None).
+    Ties are broken in favor of classes added to the class query database later.
+    Only the top `k` scores are sorted; they are selected with a partial sort.
+    """
+    # Attributes that no class has do not contribute to any score
+    attribute_ids = class_attribute_matrix.get_attribute_ids(attribute_set)
+
+    if len(attribute_ids) and (k is None or k > 0):
+        candidate_class_ids, result_ndarray = get_candidate_class_ids_and_scores(attribute_ids, class_attribute_matrix, idfs, average_num_attributes_in_classes)
+
+        return select_top_k(candidate_class_ids, result_ndarray, class_attribute_matrix, k, threshold)
+
+    # Either an empty attribute set, or no non-zero similarities calculated
+    return get_empty_query_result()
+
+
+def query_top_k_in_bulk(
+    attribute_sets: typing.Sequence[typing.AbstractSet[str]],
+    class_attribute_matrix: ClassAttributeMatrix,
+    idfs: np.ndarray,
+    average_num_attributes_in_classes: float,
+    k: typing.Optional[int] = None,
+    threshold: float = 0.
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    `query_top_k` for each of `attribute_sets`, with the scores of all queries computed in one sparse matrix product
+    (queries x attributes, weighted by IDF, times attributes x classes), instead of one posting list walk per query.
+    The results are the same as those of `query_top_k`.
+    """
+    if not attribute_sets or (k is not None and k <= 0):
+        return [get_empty_query_result() for _ in attribute_sets]
+
+    attribute_ids_list = [class_attribute_matrix.get_attribute_ids(attribute_set) for attribute_set in attribute_sets]
+
+    query_attribute_ids = np.concatenate(attribute_ids_list)
+    query_matrix = scipy.sparse.csr_matrix(
+        (
+            idfs[query_attribute_ids],
+            query_attribute_ids,
+            np.concatenate(([0], np.cumsum([len(attribute_ids) for attribute_ids in attribute_ids_list])))
+        ),
+        shape=(len(attribute_sets), len(class_attribute_matrix.attribute_list))
+    )
+
+    # Row i holds the IDF sums of the classes sharing an attribute with query i
+    score_matrix = (query_matrix @ class_attribute_matrix.inverted_index.T).tocsr()
+    score_matrix.data *= get_length_normalizations(score_matrix.indices, class_attribute_matrix, average_num_attributes_in_classes)
+
+    results = []
+    for row_start, row_end in zip(score_matrix.indptr[:-1], score_matrix.indptr[1:]):
+        if row_start == row_end:
+            results.append(get_empty_query_result())
+        else:
+            results.append(select_top_k(
+                score_matrix.indices[row_start:row_end],
+                score_matrix.data[row_start:row_end],
+                class_attribute_matrix,
+                k,
+                threshold
+            ))
+
+    return results
+
+
+# Query TypeshedClass's given an attribute set.
+# Returns the classes with non-zero scores, highest first.
+def query(
+    attribute_set: typing.AbstractSet[str],
+    class_attribute_matrix: ClassAttributeMatrix,
+    idfs: np.ndarray,
+    average_num_attributes_in_classes: float
+) -> tuple[np.ndarray, np.ndarray]:
+    return query_top_k(attribute_set, class_attribute_matrix, idfs, average_num_attributes_in_classes)
@@ -0,0 +1,659 @@
+"""
+Incremental analysis of a document (e.g., an editor buffer) that is analyzed again and again as it is edited.
+
+The document is analyzed one top-level statement at a time, in order.
+This is equivalent to analyzing the whole module at once,
+as names are resolved in evaluation order and typing constraints are syntax-directed.
+All changes made while analyzing a top-level statement are recorded,
+so that when the document changes, the analyses of the changed top-level statements (and all that follow) can be rolled back,
+and only these top-level statements have to be analyzed again.
+Typing slots are only inferred again if their nodes are affected by changed typing constraints.
+"""
+
+import __future__
+import ast
+import contextlib
+import itertools
+import linecache
+import logging
+import sys
+import time
+import types
+import typing
+
+from ast_node_namespace_trie import get_ast_node_namespace_trie_for_top_level_statement, search_ast_node_namespace_tries_of_top_level_statements
+from bind_top_level_statement_statically import bind_top_level_statement_statically
+from class_query import ClassQueryDatabase
+from get_attributes_in_runtime_class import flush_runtime_class_attribute_set_cache
+from get_definitions_to_runtime_terms_mappings import get_definitions_to_runtime_terms_mappings
+from get_function_definitions_to_parameters_name_parameter_mappings_and_return_values import get_function_definitions_to_parameters_name_parameter_mappings_and_return_values
+from get_module_names_to_imported_names_to_runtime_objects import get_module_names_to_imported_names_to_runtime_objects
+from get_types_in_module import get_types_in_module
+from get_typing_slots_in_query_dict import get_typing_slots_in_query_dict
+from get_use_define_mapping import get_use_define_mapping
+from handle_local_syntax_directed_typing_constraints import handle_local_syntax_directed_typing_constraints
+from inference_session import InferenceSession
+from query_result_dict import QueryDict, generate_query_dict
+from static_import_analysis import analyze_ast_module
+from type_definitions import *
+from type_inference import get_type_inference_function
+from typeshed_client_ex.type_definitions import TypeshedClass
+from typing_constraints import TypingConstraints
+from unwrap import unwrap
+
+
+MISSING = object()
+
+
+class TypeInferenceCancelled(Exception):
+    """
+    Raised between stages of an update when its `is_cancelled` callback returns True,
+    e.g., because a newer version of the document has arrived.
+    The analysis state stays consistent, so the next update still only re-analyzes what changed.
+    """
+
+UndoLog = list[tuple[dict, typing.Any, typing.Any]]
+
+
+def set_item_with_undo_log(dict_: dict, key: typing.Any, value: typing.Any, undo_log: UndoLog):
+    undo_log.append((dict_, key, dict_.get(key, MISSING)))
+    dict_[key] = value
+
+
+def record_changes_in_undo_log(dict_: dict, dict_copy_before_changes: dict, undo_log: UndoLog):
+    """
+    Record the changes made to `dict_` since `dict_copy_before_changes` was copied from it.
+    """
+    for key, value in dict_.items():
+        previous_value = dict_copy_before_changes.get(key, MISSING)
+        if previous_value is not value:
+            undo_log.append((dict_, key, previous_value))
+
+    for key, previous_value in dict_copy_before_changes.items():
+        if key not in dict_:
+            undo_log.append((dict_, key, previous_value))
+
+
+def undo(undo_log: UndoLog):
+    for dict_, key, previous_value in reversed(undo_log):
+        if previous_value is MISSING:
+            dict_.pop(key, None)
+        else:
+            dict_[key] = previous_value
+
+
+def get_top_level_statement_source_segments(
+    source: str,
+    top_level_statements: typing.Sequence[ast.stmt]
+) -> list[bytes]:
+    """
+    Get the source code of each top-level statement (including decorators).
+    Column offsets in AST nodes are UTF-8 byte offsets, thus we work on bytes.
+    """
+    source_lines: list[bytes] = source.encode('utf-8').splitlines(keepends=True)
+
+    source_segments: list[bytes] = []
+
+    for top_level_statement in top_level_statements:
+        decorator_list = getattr(top_level_statement, 'decorator_list', [])
+        if decorator_list:
+            start_lineno = min(decorator.lineno for decorator in decorator_list)
+            start_col_offset = 0
+        else:
+            start_lineno = top_level_statement.lineno
+            start_col_offset = top_level_statement.col_offset
+
+        end_lineno = top_level_statement.end_lineno
+        end_col_offset = top_level_statement.end_col_offset
+
+        if start_lineno == end_lineno:
+            source_segment = source_lines[start_lineno - 1][start_col_offset:end_col_offset]
+        else:
+            source_segment = b''.join((
+                source_lines[start_lineno - 1][start_col_offset:],
+                *source_lines[start_lineno:end_lineno - 1],
+                source_lines[end_lineno - 1][:end_col_offset]
+            ))
+
+        source_segments.append(source_segment)
+
+    return source_segments
+
+
+def get_future_compiler_flags(top_level_statement: ast.stmt) -> int:
+    compiler_flags = 0
+
+    if isinstance(top_level_statement, ast.ImportFrom) and top_level_statement.module == '__future__':
+        for alias in top_level_statement.names:
+            feature = getattr(__future__, alias.name, None)
+            if isinstance(feature, __future__._Feature):
+                compiler_flags |= feature.compiler_flag
+
+    return compiler_flags
+
+
+class TopLevelStatementAnalysis:
+    __slots__ = (
+        'top_level_statement',
+        'source_segment',
+        'module_node',
+        'compiler_flags',
+        'function_name_to_parameter_name_list_dict',
+        'class_name_to_method_name_to_parameter_name_list_dict',
+        'import_tuple_set',
+        'import_from_tuple_set',
+        'namespace_trie_node',
+        'typing_constraints_checkpoint',
+        'undo_log'
+    )
+
+    def __init__(
+        self,
+        top_level_statement: ast.stmt,
+        source_segment: bytes,
+        compiler_flags: int,
+        typing_constraints_checkpoint: int
+    ):
+        self.top_level_statement = top_level_statement
+        self.source_segment = source_segment
+        # A module node containing only the top-level statement
+        self.module_node = ast.Module(body=[top_level_statement], type_ignores=[])
+        self.compiler_flags = compiler_flags
+        self.function_name_to_parameter_name_list_dict: dict[str, list[str]] = {}
+        self.class_name_to_method_name_to_parameter_name_list_dict: dict[str, dict[str, list[str]]] = {}
+        self.import_tuple_set: set[tuple[str, str]] = set()
+        self.import_from_tuple_set: set[tuple[str, str, str]] = set()
+        self.namespace_trie_node = None
+        self.typing_constraints_checkpoint = typing_constraints_checkpoint
+        # Changes made to the module's namespace and the document's mappings
+        self.undo_log: UndoLog = []
+
+
+class DocumentAnalysis:
+    # Distinguishes the runtime modules of documents with the same module name
+    document_ids: typing.ClassVar[typing.Iterator[int]] = itertools.count()
+
+    def __init__(
+        self,
+        module_name: str,
+        inference_session: InferenceSession,
+        static_only: bool = False
+    ):
+        # The module name in type inference results
+        self.module_name = module_name
+        self.document_id = next(DocumentAnalysis.document_ids)
+        self.version = 0
+        self.inference_session = inference_session
+        # Never execute the document's code, see `bind_top_level_statement_statically`
+        self.static_only = static_only
+        self.module: typing.Optional[types.ModuleType] = None
+        # Stage name -> seconds spent in it during the last update
+        self.stage_durations: dict[str, float] = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all analysis state, including the runtime module.
+        Each version of the runtime module is registered in `sys.modules` under a unique name,
+        so that neither other documents nor previous versions of this document can be picked up by name,
+        and the previous version is removed from `sys.modules`.
+        """
+        self.unregister_module()
+
+        self.version += 1
+        self.runtime_module_name = f'{self.module_name}__document_{self.document_id}__version_{self.version}'
+        self.pseudo_file_name = f'<{self.runtime_module_name}>'
+        self.module = types.ModuleType(self.runtime_module_name)
+
+        self.top_level_statement_analyses: list[TopLevelStatementAnalysis] = []
+
+        self.typing_constraints: TypingConstraints = TypingConstraints()
+
+        # Initialize dummy definition nodes with builtins
+        self.global_names_to_definition_nodes: dict[str, ast.AST] = {}
+
+        for name, runtime_term in self.inference_session.builtins_names_to_runtime_terms.items():
+            dummy_definition_node = ast.AST()
+            setattr(dummy_definition_node, 'id', name)
+
+            self.global_names_to_definition_nodes[name] = dummy_definition_node
+            self.typing_constraints.update_runtime_terms(dummy_definition_node, {runtime_term})
+
+        self.top_level_class_definitions_to_runtime_classes: dict[ast.ClassDef, RuntimeClass] = {}
+        self.unwrapped_runtime_functions_to_named_function_definitions: dict[UnwrappedRuntimeFunction, NamedFunctionDefinition] = {}
+        self.function_definitions_to_parameters_name_parameter_mappings_and_return_values: dict[
+            ast.AST,
+            tuple[typing.Sequence[ast.AST], typing.Mapping[str, ast.AST], ast.AST]
+        ] = {}
+
+        # Types in imported modules
+        self.imported_modules_to_types: dict[types.ModuleType, set[type]] = {}
+
+        # Class query database and the runtime classes it was last updated with
+        self.runtime_classes: typing.Optional[frozenset[RuntimeClass]] = None
+        self.class_query_database: ClassQueryDatabase = ClassQueryDatabase(self.inference_session.static_class_query_database)
+
+        # Typing slots to their node sets and type inference results
+        self.typing_slots_to_node_sets_and_type_inference_results: dict[
+            tuple[str, str, str, str],
+            tuple[frozenset[ast.AST], list[str]]
+        ] = {}
+
+    def unregister_module(self):
+        if self.module is not None:
+            if sys.modules.get(self.runtime_module_name) is self.module:
+                del sys.modules[self.runtime_module_name]
+
+            linecache.cache.pop(self.pseudo_file_name, None)
+
+    def close(self):
+        self.unregister_module()
+
+    @contextlib.contextmanager
+    def measure_stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_durations[stage] = self.stage_durations.get(stage, 0.0) + time.perf_counter() - start
+
+    def update(
+        self,
+        python_file_contents: str,
+        is_cancelled: typing.Optional[typing.Callable[[], bool]] = None
+    ):
+        self.stage_durations = {}
+
+        try:
+            with self.measure_stage('document_parse'):
+                module_node = ast.parse(python_file_contents, self.pseudo_file_name)
+        except Exception:
+            logging.exception('Failed to parse module `%s`', self.module_name)
+            return {}
+
+        top_level_statements = module_node.body
+        source_segments = get_top_level_statement_source_segments(python_file_contents, top_level_statements)
+
+        # Find the first changed top-level statement
+        number_of_unchanged_top_level_statements = 0
+        for top_level_statement_analysis, source_segment in zip(self.top_level_statement_analyses, source_segments):
+            if top_level_statement_analysis.source_segment != source_segment:
+                break
+            number_of_unchanged_top_level_statements += 1
+
+        logging.info(
+            'Reusing the analyses of %s of %s top-level statements in module %s',
+            number_of_unchanged_top_level_statements,
+            len(top_level_statements),
+            self.module_name
+        )
+
+        # Make the source available to `linecache` (and thus tracebacks and `inspect`)
+        linecache.cache[self.pseudo_file_name] = (
+            len(python_file_contents),
+            None,
+            python_file_contents.splitlines(keepends=True),
+            self.pseudo_file_name
+        )
+
+        # Like `importlib.import_module`, register the module in `sys.modules` while its code is executed
+        # (e.g., `dataclasses` and `typing` look up `sys.modules[cls.__module__]`)
+        sys.modules[self.runtime_module_name] = self.module
+
+        try:
+            while len(self.top_level_statement_analyses) > number_of_unchanged_top_level_statements:
+                self.roll_back_last_top_level_statement()
+
+            for top_level_statement, source_segment in zip(
+                top_level_statements[number_of_unchanged_top_level_statements:],
+                source_segments[number_of_unchanged_top_level_statements:]
+            ):
+                if is_cancelled is not None and is_cancelled():
+                    # The analyses of the top-level statements analyzed so far stay valid
+                    raise TypeInferenceCancelled
+
+                self.analyze_top_level_statement(top_level_statement, source_segment)
+
+            return self.infer_types(is_cancelled)
+        except TypeInferenceCancelled:
+            raise
+        except BaseException:
+            # The analysis state may be inconsistent
+            self.reset()
+            raise
+
+    def roll_back_last_top_level_statement(self):
+        top_level_statement_analysis = self.top_level_statement_analyses.pop()
+
+        undo(top_level_statement_analysis.undo_log)
+        self.typing_constraints.rollback(top_level_statement_analysis.typing_constraints_checkpoint)
+
+    def analyze_top_level_statement(self, top_level_statement: ast.stmt, source_segment: bytes):
+        if self.top_level_statement_analyses:
+            compiler_flags = self.top_level_statement_analyses[-1].compiler_flags
+        else:
+            compiler_flags = 0
+        compiler_flags |= get_future_compiler_flags(top_level_statement)
+
+        top_level_statement_analysis = TopLevelStatementAnalysis(
+            top_level_statement,
+            source_segment,
+            compiler_flags,
+            self.typing_constraints.checkpoint()
+        )
+        self.top_level_statement_analyses.append(top_level_statement_analysis)
+
+        module_node = top_level_statement_analysis.module_node
+        undo_log = top_level_statement_analysis.undo_log
+
+        # Static analysis
+        with self.measure_stage('static_import_analysis'):
+            (
+                top_level_statement_analysis.function_name_to_parameter_name_list_dict,
+                top_level_statement_analysis.class_name_to_method_name_to_parameter_name_list_dict,
+                top_level_statement_analysis.import_tuple_set,
+                top_level_statement_analysis.import_from_tuple_set
+            ) = analyze_ast_module(module_node, self.module_name)
+
+        # Execute the top-level statement in the module's namespace (or only bind the names it defines in static-only mode).
+        # Like in an interactive interpreter, a failing top-level statement does not prevent the following ones from being executed.
+        module_dict_before_execution = self.module.__dict__.copy()
+
+        try:
+            with self.measure_stage('module_import'):
+                if self.static_only:
+                    bind_top_level_statement_statically(top_level_statement, self.module, self.pseudo_file_name)
+                else:
+                    code = compile(module_node, self.pseudo_file_name, 'exec', flags=compiler_flags, dont_inherit=True)
+                    exec(code, self.module.__dict__)
+        except Exception:
+            logging.exception('Failed to execute top-level statement at line %s in module %s', top_level_statement.lineno, self.module_name)
+
+        with self.measure_stage('runtime_term_mapping'):
+            number_of_undo_log_entries_before_execution = len(undo_log)
+            record_changes_in_undo_log(self.module.__dict__, module_dict_before_execution, undo_log)
+
+            # A module containing only the names bound by the top-level statement
+            bound_names_module = types.ModuleType(self.runtime_module_name)
+            for _, name, _ in undo_log[number_of_undo_log_entries_before_execution:]:
+                if name in self.module.__dict__:
+                    bound_names_module.__dict__[name] = self.module.__dict__[name]
+
+            # Get information from the top-level statement
+            (
+                top_level_class_definitions_to_runtime_classes,
+                unwrapped_runtime_functions_to_named_function_definitions
+            ) = get_definitions_to_runtime_terms_mappings(
+                [self.runtime_module_name],
+                [bound_names_module],
+                [module_node]
+            )
+
+            for top_level_class_definition, runtime_class in top_level_class_definitions_to_runtime_classes.items():
+                set_item_with_undo_log(self.top_level_class_definitions_to_runtime_classes, top_level_class_definition, runtime_class, undo_log)
+
+            for unwrapped_runtime_function, named_function_definition in unwrapped_runtime_functions_to_named_function_definitions.items():
+                set_item_with_undo_log(self.unwrapped_runtime_functions_to_named_function_definitions, unwrapped_runtime_function, named_function_definition, undo_log)
+
+            for function_definition, parameters_name_parameter_mapping_and_return_value in get_function_definitions_to_parameters_name_parameter_mappings_and_return_values(
+                [module_node]
+            ).items():
+                set_item_with_undo_log(self.function_definitions_to_parameters_name_parameter_mappings_and_return_values, function_definition, parameters_name_parameter_mapping_and_return_value, undo_log)
+
+            top_level_statement_analysis.namespace_trie_node = get_ast_node_namespace_trie_for_top_level_statement(
+                self.module_name,
+                module_node,
+                top_level_statement,
+                self.function_definitions_to_parameters_name_parameter_mappings_and_return_values
+            )
+
+            # Initialize dummy definition nodes with imports
+            imported_names_to_runtime_objects = get_module_names_to_imported_names_to_runtime_objects(
+                {self.module_name: top_level_statement_analysis.import_tuple_set},
+                {self.module_name: top_level_statement_analysis.import_from_tuple_set},
+                {self.module_name: self.module}
+            ).get(self.module_name, {})
+
+            for imported_name, runtime_object in imported_names_to_runtime_objects.items():
+                unwrapped_runtime_object = unwrap(runtime_object)
+                runtime_term: typing.Optional[RuntimeTerm] = None
+
+                if isinstance(unwrapped_runtime_object, Module):
+                    runtime_term = unwrapped_runtime_object
+                elif isinstance(unwrapped_runtime_object, RuntimeClass):
+                    runtime_term = unwrapped_runtime_object
+                elif isinstance(unwrapped_runtime_object, UnwrappedRuntimeFunction):
+                    processed_unwrapped_runtime_object = runtime_term_of_unwrapped_runtime_function(unwrapped_runtime_object)
+
+                    runtime_term = self.unwrapped_runtime_functions_to_named_function_definitions.get(
+                        processed_unwrapped_runtime_object,
+                        processed_unwrapped_runtime_object
+                    )
+
+                if runtime_term is not None:
+                    dummy_definition_node = ast.AST()
+                    setattr(dummy_definition_node, 'id', imported_name)
+
+                    set_item_with_undo_log(self.global_names_to_definition_nodes, imported_name, dummy_definition_node, undo_log)
+                    self.typing_constraints.update_runtime_terms(dummy_definition_node, {runtime_term})
+                else:
+                    logging.error(
+                        'Cannot match imported name %s in module %s with unwrapped runtime object %s to a runtime term!',
+                        imported_name, self.module_name, unwrapped_runtime_object
+                    )
+
+        with self.measure_stage('use_define_mapping'):
+            # `get_use_define_mapping` updates the global names to definition nodes in place
+            global_names_to_definition_nodes_before_use_define_mapping = self.global_names_to_definition_nodes.copy()
+
+            use_define_mapping = get_use_define_mapping(
+                module_node,
+                self.global_names_to_definition_nodes
+            )
+
+            record_changes_in_undo_log(self.global_names_to_definition_nodes, global_names_to_definition_nodes_before_use_define_mapping, undo_log)
+
+        with self.measure_stage('constraint_generation'):
+            node_to_definition_node_mapping = {
+                node: definition_node
+                for definition_node, nodes in use_define_mapping.itersets()
+                for node in nodes
+            }
+
+            for node, definition_node in node_to_definition_node_mapping.items():
+                self.typing_constraints.set_equivalent(definition_node, node)
+
+            handle_local_syntax_directed_typing_constraints(
+                module_node,
+                self.top_level_class_definitions_to_runtime_classes,
+                self.unwrapped_runtime_functions_to_named_function_definitions,
+                self.function_definitions_to_parameters_name_parameter_mappings_and_return_values,
+                node_to_definition_node_mapping,
+                self.typing_constraints.get_runtime_terms,
+                self.typing_constraints.update_runtime_terms,
+                self.typing_constraints.update_bag_of_attributes,
+                self.typing_constraints.add_subset,
+                self.typing_constraints.add_relation,
+                self.inference_session.client
+            )
+
+    def get_runtime_classes(self) -> frozenset[RuntimeClass]:
+        runtime_classes: set[RuntimeClass] = set(get_types_in_module(self.module))
+
+        def get_types_in_imported_module(imported_module: types.ModuleType) -> set[type]:
+            if imported_module not in self.imported_modules_to_types:
+                self.imported_modules_to_types[imported_module] = get_types_in_module(imported_module)
+            return self.imported_modules_to_types[imported_module]
+
+        for top_level_statement_analysis in self.top_level_statement_analyses:
+            for imported_module_name, imported_module_name_alias in top_level_statement_analysis.import_tuple_set:
+                if imported_module_name in sys.modules:
+                    imported_module = sys.modules[imported_module_name]
+                    if isinstance(imported_module, types.ModuleType):
+                        runtime_classes.update(get_types_in_imported_module(imported_module))
+
+            for import_from_module_name, imported_name, imported_name_alias in top_level_statement_analysis.import_from_tuple_set:
+                if import_from_module_name in sys.modules:
+                    import_from_module = sys.modules[import_from_module_name]
+                    if isinstance(import_from_module, types.ModuleType):
+                        value = getattr(import_from_module, imported_name, None)
+                        if isinstance(value, type):
+                            runtime_classes.add(value)
+
+        return frozenset(runtime_classes)
+
+    def infer_types(self, is_cancelled: typing.Optional[typing.Callable[[], bool]] = None):
+        # Generate query dict
+        function_name_to_parameter_name_list_dict: dict[str, list[str]] = {}
+        class_name_to_method_name_to_parameter_name_list_dict: dict[str, dict[str, list[str]]] = {}
+
+        for top_level_statement_analysis in self.top_level_statement_analyses:
+            function_name_to_parameter_name_list_dict.update(top_level_statement_analysis.function_name_to_parameter_name_list_dict)
+            class_name_to_method_name_to_parameter_name_list_dict.update(top_level_statement_analysis.class_name_to_method_name_to_parameter_name_list_dict)
+
+        query_dict: QueryDict = generate_query_dict(
+            {self.module_name: self.pseudo_file_name},
+            {self.module_name: function_name_to_parameter_name_list_dict},
+            {self.module_name: class_name_to_method_name_to_parameter_name_list_dict}
+        )
+
+        with self.measure_stage('class_database_build'):
+            # Update the class query database if the runtime classes changed
+            # Only the classes added or removed since the last update are changed
+            runtime_classes = self.get_runtime_classes()
+
+            if runtime_classes != self.runtime_classes:
+                if is_cancelled is not None and is_cancelled():
+                    raise TypeInferenceCancelled
+
+                self.class_query_database.set_runtime_classes(runtime_classes)
+                self.runtime_classes = runtime_classes
+
+                # Persist the attribute sets of the runtime classes seen for the first time
+                flush_runtime_class_attribute_set_cache()
+
+                # All type inference results may change
+                self.typing_slots_to_node_sets_and_type_inference_results.clear()
+
+            (
+                class_attribute_matrix,
+                idfs,
+                average_num_attributes_in_classes
+            ) = self.class_query_database.get_query_database()
+
+        with self.measure_stage('type_inference'):
+            # Changed nodes are only cleared once all typing slots are inferred again, in case the update is cancelled
+            affected_nodes = self.typing_constraints.get_nodes_affected_by_changes()
+
+            # Perform type inference
+
+            class_inference_failed_fallback: TypeshedClass = TypeshedClass('typing', 'Any')
+
+            module_level_namespace_trie_nodes = [
+                top_level_statement_analysis.namespace_trie_node
+                for top_level_statement_analysis in self.top_level_statement_analyses
+            ]
+
+            output_dict: dict[
+                str, # module_name
+                dict[
+                    str, # class_name_or_global
+                    dict[
+                        str, # function_name
+                        dict[
+                            str, # parameter_name_or_return
+                            list[
+                                str # type_inference_result
+                            ]
+                        ]
+                    ]
+                ]
+            ] = {}
+
+            typing_slots_to_node_sets_and_type_inference_results: dict[
+                tuple[str, str, str, str],
+                tuple[frozenset[ast.AST], list[str]]
+            ] = {}
+
+            # Typing slots, their node sets and type inference result lists, and whether previous type inference results can be reused
+            typing_slots_node_sets_type_inference_result_lists_and_reusables: list[
+                tuple[tuple[str, str, str, str], frozenset[ast.AST], list[str], bool]
+            ] = []
+
+            for (
+                module_name_,
+                class_name_or_global_,
+                function_name_,
+                parameter_name_or_return_
+            ) in get_typing_slots_in_query_dict(query_dict):
+                if class_name_or_global_ == 'global':
+                    components = [function_name_, parameter_name_or_return_]
+                else:
+                    components = [class_name_or_global_, function_name_, parameter_name_or_return_]
+
+                node_set = search_ast_node_namespace_tries_of_top_level_statements(module_level_namespace_trie_nodes, components)
+
+                type_inference_result_list = output_dict.setdefault(module_name_, {}).setdefault(class_name_or_global_, {}).setdefault(function_name_, {}).setdefault(parameter_name_or_return_, [])
+
+                # Do not infer parameter types for self and cls in methods of classes.
+                # Do not infer return types for __init__ and __new__ of classes.
+                if (
+                    (class_name_or_global_ != 'global' and parameter_name_or_return_ in ('self', 'cls'))
+                    or (class_name_or_global_ != 'global' and function_name_ in ('__init__', '__new__') and parameter_name_or_return_ == 'return')
+                ):
+                    continue
+
+                typing_slot = (module_name_, class_name_or_global_, function_name_, parameter_name_or_return_)
+
+                # Reuse the previous type inference result if the typing slot is not affected by changes
+                previous_node_set_and_type_inference_results = self.typing_slots_to_node_sets_and_type_inference_results.get(typing_slot)
+
+                reusable = (
+                    previous_node_set_and_type_inference_results is not None
+                    and previous_node_set_and_type_inference_results[0] == node_set
+                    and affected_nodes.isdisjoint(node_set)
+                )
+
+                typing_slots_node_sets_type_inference_result_lists_and_reusables.append((typing_slot, node_set, type_inference_result_list, reusable))
+
+            if is_cancelled is not None and is_cancelled():
+                raise TypeInferenceCancelled
+
+            # Get type inference function
+            # Classes are inferred for the node sets of all typing slots that are not reused in bulk
+
+            type_inference_function = get_type_inference_function(
+                self.typing_constraints.get_runtime_terms,
+                self.typing_constraints.get_bag_of_attributes,
+                self.typing_constraints.get_subset_nodes,
+                self.typing_constraints.get_relations,
+                self.inference_session.client,
+                class_attribute_matrix,
+                idfs,
+                average_num_attributes_in_classes,
+                node_sets_to_infer_classes_for_in_bulk=[
+                    node_set
+                    for _, node_set, _, reusable in typing_slots_node_sets_type_inference_result_lists_and_reusables
+                    if not reusable
+                ]
+            )
+
+            for typing_slot, node_set, type_inference_result_list, reusable in typing_slots_node_sets_type_inference_result_lists_and_reusables:
+                if reusable:
+                    type_inference_result_list.extend(self.typing_slots_to_node_sets_and_type_inference_results[typing_slot][1])
+                else:
+                    if is_cancelled is not None and is_cancelled():
+                        raise TypeInferenceCancelled
+
+                    type_inference_result = type_inference_function(node_set, class_inference_failed_fallback=class_inference_failed_fallback)
+
+                    if type_inference_result != class_inference_failed_fallback:
+                        # Name classes defined in the document after the module name, not the runtime module name
+                        type_inference_result_list.append(str(type_inference_result).replace(self.runtime_module_name, self.module_name))
+
+                typing_slots_to_node_sets_and_type_inference_results[typing_slot] = (node_set, list(type_inference_result_list))
+
+            self.typing_slots_to_node_sets_and_type_inference_results = typing_slots_to_node_sets_and_type_inference_results
+            self.typing_constraints.clear_changed_nodes()
+
+            return output_dict
@@ -2,13 +2,28 @@ from dis import Bytecode
 from enum import Enum, auto
 from functools import lru_cache
 from types import CodeType, FunctionType
-from typing import Generator
+from typing import Generator, Optional
 
 from get_unwrapped_constructor import get_unwrapped_constructor
 from ignored_attributes import IGNORED_ATTRIBUTES
+from runtime_class_attribute_set_cache import RuntimeClassAttributeSetCache
 from type_definitions import RuntimeClass
 
 
+# Attribute sets of classes in modules loaded from files, persisted across processes and runs, if set
+runtime_class_attribute_set_cache: Optional[RuntimeClassAttributeSetCache] = None
+
+
+def set_runtime_class_attribute_set_cache(cache: Optional[RuntimeClassAttributeSetCache]):
+    global runtime_class_attribute_set_cache
+    runtime_class_attribute_set_cache = cache
+
+
+def flush_runtime_class_attribute_set_cache():
+    if runtime_class_attribute_set_cache is not None:
+        runtime_class_attribute_set_cache.flush()
+
+
 # looks for the following bytecode sequences
 # uses the state machine design pattern
 # LOAD_FAST                0 (self)
@@ -110,4 +125,17 @@ def get_non_dynamic_attributes_in_runtime_class(runtime_class: RuntimeClass) ->
 
 @lru_cache(maxsize=None)
 def get_attributes_in_runtime_class(runtime_class: RuntimeClass) -> set[str]:
-    return (get_dynamic_attributes_in_runtime_class(runtime_class) | get_non_dynamic_attributes_in_runtime_class(runtime_class)) - IGNORED_ATTRIBUTES
\ No newline at end of file
+    cache = runtime_class_attribute_set_cache
+    key = cache.get_key(runtime_class) if cache is not None else None
+
+    if key is not None:
+        attributes_in_runtime_class = cache.get(key)
+        if attributes_in_runtime_class is not None:
+            return attributes_in_runtime_class
+
+    attributes_in_runtime_class = (get_dynamic_attributes_in_runtime_class(runtime_class) | get_non_dynamic_attributes_in_runtime_class(runtime_class)) - IGNORED_ATTRIBUTES
+
+    if key is not None:
+        cache.put(key, attributes_in_runtime_class)
+
+    return attributes_in_runtime_class
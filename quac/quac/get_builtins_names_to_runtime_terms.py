@@ -0,0 +1,27 @@
+import builtins
+
+from type_definitions import *
+from unwrap import unwrap
+
+
+def get_builtins_names_to_runtime_terms() -> dict[str, RuntimeTerm]:
+    """
+    Map the public names in `builtins` and the built-in constants to their runtime terms.
+    These are bound to dummy definition nodes before computing the use-define mapping of each module.
+    """
+    builtins_names_to_runtime_terms: dict[str, RuntimeTerm] = {}
+
+    for key, value in builtins.__dict__.items():
+        name = key
+        unwrapped_value = unwrap(value)
+        if not name.startswith('_'):
+            if isinstance(unwrapped_value, RuntimeClass):
+                builtins_names_to_runtime_terms[name] = unwrapped_value
+            elif isinstance(unwrapped_value, UnwrappedRuntimeFunction):
+                builtins_names_to_runtime_terms[name] = runtime_term_of_unwrapped_runtime_function(unwrapped_value)
+
+    for value in (True, False, Ellipsis, None, NotImplemented):
+        name = str(value)
+        builtins_names_to_runtime_terms[name] = Instance(type(value))
+
+    return builtins_names_to_runtime_terms
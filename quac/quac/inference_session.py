@@ -0,0 +1,41 @@
+import typing
+
+from get_attributes_in_runtime_class import set_runtime_class_attribute_set_cache
+from get_builtins_names_to_runtime_terms import get_builtins_names_to_runtime_terms
+from runtime_class_attribute_set_cache import RuntimeClassAttributeSetCache, get_runtime_class_attribute_set_cache_path
+from static_class_query_database import StaticClassQueryDatabase, get_static_class_query_database
+from type_definitions import RuntimeTerm
+from typeshed_client_ex.client import Client
+
+
+class InferenceSession:
+    """
+    Long-lived state that does not depend on the code under analysis.
+    Create it once and pass it to every `type_inference` call,
+    so that each call only pays for analyzing the code it is given.
+    With a `cache_directory`, the static part of the class query database is saved there once per Python build (and contents of the stubs)
+    and memory-mapped by later sessions instead of being built again,
+    and the attribute sets of classes in installed modules are cached there for this process and later ones.
+    """
+    __slots__ = (
+        'client',
+        'static_class_query_database',
+        'builtins_names_to_runtime_terms'
+    )
+
+    def __init__(self, cache_directory: typing.Optional[str] = None):
+        # Attribute sets of runtime classes are looked up in this process (there is only one cache per process)
+        if cache_directory is not None:
+            set_runtime_class_attribute_set_cache(RuntimeClassAttributeSetCache(get_runtime_class_attribute_set_cache_path(cache_directory)))
+
+        # Keeps its caches of parsed stubs, name lookups and class definitions across calls
+        self.client: Client = Client()
+
+        # The static part of the class query database
+        self.static_class_query_database: StaticClassQueryDatabase = get_static_class_query_database(
+            self.client,
+            cache_directory
+        )
+
+        # The runtime terms bound to the dummy definition nodes of builtins
+        self.builtins_names_to_runtime_terms: dict[str, RuntimeTerm] = get_builtins_names_to_runtime_terms()
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import typing
+
+from type_definitions import RuntimeClass
+
+# Bump when how the attributes of runtime classes are collected or keyed changes, so that cached attribute sets are not reused
+RUNTIME_CLASS_ATTRIBUTE_SET_CACHE_FORMAT_VERSION = 2
+
+# Attribute sets are written in batches of at most this many
+MAX_PENDING_ROWS = 1024
+
+
+def get_runtime_class_attribute_set_cache_path(cache_directory: str) -> str:
+    # One per Python version, as the attributes classes inherit from builtin classes differ between versions
+    return os.path.join(
+        cache_directory,
+        f'runtime_class_attribute_sets-{sys.implementation.cache_tag}-{RUNTIME_CLASS_ATTRIBUTE_SET_CACHE_FORMAT_VERSION}.sqlite3'
+    )
+
+
+def get_object_by_qualname(module: object, qualname: str) -> object:
+    value = module
+    try:
+        for name in qualname.split('.'):
+            value = getattr(value, name)
+    except Exception:
+        # e.g., a module __getattr__ that raises something other than AttributeError
+        return None
+    return value
+
+
+class RuntimeClassAttributeSetCache:
+    """
+    A persistent cache (an SQLite database, shared by processes) of the attribute sets of classes in modules loaded from files,
+    keyed by (module name, class version, qualified name).
+    The version of a module is the `__version__` of its top-level package (if any) and the modification time of its file.
+    Attribute sets include attributes inherited from, and set in the constructors of, the bases of a class,
+    so the class version holds the versions of the modules of all classes in its MRO (but the modules built into the
+    interpreter, which are covered by the per-Python-version path), and cached attribute sets are not used after any of
+    them is upgraded or edited. The key cannot tell edits that keep the modification time, or changes to modules the
+    class does not inherit from, e.g., of monkey patching.
+    Classes in modules without a file (e.g., the code under analysis), classes inheriting from such classes, and classes
+    that cannot be found by their qualified name in their module (e.g., classes defined in functions) are not cached.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection: typing.Optional[sqlite3.Connection] = None
+        # The connection must not be used in processes forked after it was opened
+        self.connection_pid: typing.Optional[int] = None
+        # Module name -> (module, module version), as of when the module was first looked up in this process
+        self.module_name_to_module_and_module_version: dict[str, tuple[object, typing.Optional[str]]] = {}
+        # Attribute sets put but not yet written, written in one transaction by `flush`
+        self.pending_rows: list[tuple[str, str, str, str]] = []
+
+    def get_connection(self) -> typing.Optional[sqlite3.Connection]:
+        if self.connection_pid != os.getpid():
+            self.connection = None
+            self.connection_pid = os.getpid()
+            self.pending_rows = []
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                connection = sqlite3.connect(self.path, timeout=10)
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('PRAGMA synchronous=NORMAL')
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS attribute_sets ('
+                    'module_name TEXT, class_version TEXT, qualname TEXT, attributes TEXT, '
+                    'PRIMARY KEY (module_name, class_version, qualname))'
+                )
+                self.connection = connection
+            except (OSError, sqlite3.Error) as e:
+                logging.warning('Cannot open the runtime class attribute set cache %s: %s', self.path, e)
+        return self.connection
+
+    def get_module_version(self, module_name: str) -> typing.Optional[str]:
+        module = sys.modules.get(module_name)
+        if module is None:
+            return None
+
+        module_and_module_version = self.module_name_to_module_and_module_version.get(module_name)
+        if module_and_module_version is not None and module_and_module_version[0] is module:
+            return module_and_module_version[1]
+
+        module_version = None
+        file = getattr(module, '__file__', None)
+        if isinstance(file, str):
+            try:
+                modification_time = os.stat(file).st_mtime_ns
+            except OSError:
+                pass
+            else:
+                package_version = getattr(sys.modules.get(module_name.partition('.')[0]), '__version__', None)
+                module_version = f'{package_version if isinstance(package_version, str) else ""}@{modification_time}'
+
+        self.module_name_to_module_and_module_version[module_name] = (module, module_version)
+        return module_version
+
+    def get_class_version(self, runtime_class: RuntimeClass) -> typing.Optional[str]:
+        mro = getattr(runtime_class, '__mro__', None)
+        if not isinstance(mro, tuple):
+            return None
+
+        module_name_to_module_version: dict[str, str] = {}
+        for class_in_mro in mro:
+            module_name = getattr(class_in_mro, '__module__', None)
+            if not isinstance(module_name, str):
+                return None
+            if module_name in module_name_to_module_version or (
+                class_in_mro is not runtime_class and module_name in sys.builtin_module_names
+            ):
+                continue
+
+            module_version = self.get_module_version(module_name)
+            if module_version is None:
+                return None
+            module_name_to_module_version[module_name] = module_version
+
+        return ' '.join(f'{module_name}={module_version}' for module_name, module_version in module_name_to_module_version.items())
+
+    def get_key(self, runtime_class: RuntimeClass) -> typing.Optional[tuple[str, str, str]]:
+        module_name = getattr(runtime_class, '__module__', None)
+        qualname = getattr(runtime_class, '__qualname__', None)
+        if not isinstance(module_name, str) or not isinstance(qualname, str):
+            return None
+
+        class_version = self.get_class_version(runtime_class)
+        if class_version is None or get_object_by_qualname(sys.modules[module_name], qualname) is not runtime_class:
+            return None
+
+        return module_name, class_version, qualname
+
+    def get(self, key: tuple[str, str, str]) -> typing.Optional[set[str]]:
+        connection = self.get_connection()
+        if connection is None:
+            return None
+
+        try:
+            row = connection.execute(
+                'SELECT attributes FROM attribute_sets WHERE module_name = ? AND class_version = ? AND qualname = ?',
+                key
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.warning('Cannot read from the runtime class attribute set cache %s: %s', self.path, e)
+            return None
+
+        if row is None:
+            return None
+        # Many classes share attributes
+        return set(map(sys.intern, json.loads(row[0])))
+
+    def put(self, key: tuple[str, str, str], attribute_set: typing.AbstractSet[str]):
+        # Attributes found in constructors, e.g., by setattr(self, ...), may be constants other than strings
+        if not all(isinstance(attribute, str) for attribute in attribute_set):
+            return
+
+        if self.get_connection() is None:
+            return
+
+        self.pending_rows.append((*key, json.dumps(sorted(attribute_set))))
+        if len(self.pending_rows) >= MAX_PENDING_ROWS:
+            self.flush()
+
+    def flush(self):
+        connection = self.get_connection()
+        if connection is None or not self.pending_rows:
+            return
+
+        pending_rows, self.pending_rows = self.pending_rows, []
+        try:
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO attribute_sets VALUES (?, ?, ?, ?)', pending_rows)
+        except sqlite3.Error as e:
+            logging.warning('Cannot write to the runtime class attribute set cache %s: %s', self.path, e)
@@ -0,0 +1,307 @@
+import collections.abc
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import numbers
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import types
+import typing
+
+import numpy as np
+
+from get_attributes_in_runtime_class import get_attributes_in_runtime_class
+from get_attributes_in_typeshed_class_definition import get_attributes_in_typeshed_class_definition
+from ignored_attributes import IGNORED_ATTRIBUTES
+import typeshed_client_ex.client
+from typeshed_client_ex.client import Client
+from typeshed_client_ex.type_definitions import TypeshedClass, from_runtime_class
+
+# Bump when how saved databases are laid out changes
+# Changes to the stubs and to the code collecting the attributes are detected (see `get_static_class_query_database_input_paths`)
+STATIC_CLASS_QUERY_DATABASE_FORMAT_VERSION = 2
+
+# The modules collecting the attributes of the static classes, besides this one and typeshed_client_ex
+STATIC_CLASS_QUERY_DATABASE_COLLECTION_MODULE_NAMES = (
+    'get_attributes_in_runtime_class',
+    'get_attributes_in_typeshed_class_definition',
+    'get_unwrapped_constructor',
+    'ignored_attributes',
+    'unwrap'
+)
+
+
+def get_static_typeshed_class_to_attribute_set_dict(
+        typeshed_client: Client
+) -> dict[TypeshedClass, set[str]]:
+    """
+    Get the attribute sets of the classes that are always in the class query database,
+    independent of the runtime classes in the modules under analysis.
+    """
+    typeshed_class_to_attribute_set_dict: dict[TypeshedClass, set[str]] = {}
+
+    # Special handling for classes in `_typeshed` (Typeshed only)
+    for typeshed_class in (
+            TypeshedClass('_typeshed', 'SupportsItemAccess'),
+            TypeshedClass('_typeshed', 'SupportsGetItem'),
+            TypeshedClass('_typeshed', 'HasFileno'),
+            TypeshedClass('_typeshed', 'SupportsRead'),
+            TypeshedClass('_typeshed', 'SupportsReadline'),
+            TypeshedClass('_typeshed', 'SupportsNoArgReadline'),
+            TypeshedClass('_typeshed', 'SupportsWrite'),
+            TypeshedClass('_typeshed', 'SupportsAdd'),
+            TypeshedClass('_typeshed', 'SupportsRAdd'),
+            TypeshedClass('_typeshed', 'SupportsSub'),
+            TypeshedClass('_typeshed', 'SupportsRSub'),
+            TypeshedClass('_typeshed', 'SupportsDivMod'),
+            TypeshedClass('_typeshed', 'SupportsRDivMod'),
+            TypeshedClass('_typeshed', 'SupportsTrunc'),
+    ):
+        typeshed_class_definition = typeshed_client.get_class_definition(typeshed_class)
+        attributes_in_typeshed_class = get_attributes_in_typeshed_class_definition(typeshed_class_definition) - IGNORED_ATTRIBUTES
+        typeshed_class_to_attribute_set_dict[typeshed_class] = attributes_in_typeshed_class
+
+    # Special handling for byte sequences
+    bytestring_typeshed_class = TypeshedClass('typing', 'ByteString')
+    bytestring_attributes = get_attributes_in_runtime_class(bytes) | get_attributes_in_runtime_class(bytearray)
+    typeshed_class_to_attribute_set_dict[bytestring_typeshed_class] = bytestring_attributes
+
+    # Special handling for built-in types and abstract base types
+    for runtime_class in (
+            object,
+            int,
+            float,
+            complex,
+            list,
+            str,
+            set,
+            frozenset,
+            dict,
+            tuple,
+            range,
+            slice,
+            type,
+            types.CellType,
+            types.TracebackType,
+            types.FrameType,
+            types.CodeType,
+            typing.SupportsIndex,
+            typing.SupportsBytes,
+            typing.SupportsComplex,
+            typing.SupportsFloat,
+            typing.SupportsInt,
+            typing.SupportsRound,
+            typing.SupportsAbs,
+            typing.TextIO,
+            typing.IO,
+            collections.abc.Iterable,
+            collections.abc.Collection,
+            collections.abc.Iterator,
+            collections.abc.Reversible,
+            collections.abc.Generator,
+            collections.abc.AsyncIterable,
+            collections.abc.AsyncIterator,
+            collections.abc.AsyncGenerator,
+            collections.abc.Awaitable,
+            collections.abc.Coroutine,
+            collections.abc.Sequence,
+            collections.abc.MutableSequence,
+            collections.abc.Mapping,
+            collections.abc.MutableMapping,
+            collections.abc.Set,
+            collections.abc.MutableSet,
+            collections.abc.Callable,
+            numbers.Complex,
+            numbers.Real,
+            numbers.Rational,
+            numbers.Integral,
+            contextlib.AbstractContextManager,
+            contextlib.AbstractAsyncContextManager
+    ):
+        attributes_in_runtime_class = get_attributes_in_runtime_class(runtime_class)
+        typeshed_class = from_runtime_class(runtime_class)
+        typeshed_class_to_attribute_set_dict[typeshed_class] = attributes_in_runtime_class
+
+    return typeshed_class_to_attribute_set_dict
+
+
+class StaticClassQueryDatabase(typing.NamedTuple):
+    """
+    The part of the class query database that does not depend on the modules under analysis,
+    with attributes interned to integer ids like in ClassAttributeMatrix.
+    The attribute ids of class `typeshed_class_list[i]` are `attribute_ids[row_offsets[i]:row_offsets[i + 1]]`, sorted.
+    """
+    typeshed_class_list: list[TypeshedClass]
+    attribute_list: list[str]
+    attribute_ids: np.ndarray
+    row_offsets: np.ndarray
+
+    def get_typeshed_class_to_attribute_set_dict(self) -> dict[TypeshedClass, set[str]]:
+        attribute_list = self.attribute_list
+        return {
+            typeshed_class: {attribute_list[attribute_id] for attribute_id in self.attribute_ids[row_start:row_end]}
+            for typeshed_class, row_start, row_end in zip(self.typeshed_class_list, self.row_offsets[:-1].tolist(), self.row_offsets[1:].tolist())
+        }
+
+
+def build_static_class_query_database(typeshed_client: Client) -> StaticClassQueryDatabase:
+    typeshed_class_to_attribute_set_dict = get_static_typeshed_class_to_attribute_set_dict(typeshed_client)
+
+    attribute_to_attribute_id: dict[str, int] = {}
+    attribute_id_list: list[int] = []
+    row_offset_list: list[int] = [0]
+
+    for attribute_set in typeshed_class_to_attribute_set_dict.values():
+        # Sorted within rows, so that rows can be used as they are
+        attribute_id_list.extend(sorted(
+            attribute_to_attribute_id.setdefault(attribute, len(attribute_to_attribute_id))
+            for attribute in attribute_set
+        ))
+        row_offset_list.append(len(attribute_id_list))
+
+    return StaticClassQueryDatabase(
+        list(typeshed_class_to_attribute_set_dict),
+        list(attribute_to_attribute_id),
+        np.array(attribute_id_list, dtype=np.int32),
+        np.array(row_offset_list, dtype=np.int64)
+    )
+
+
+def get_static_class_query_database_input_paths() -> list[str]:
+    """
+    The files a static class query database is built from: the bundled typeshed stubs (`Client` never queries others),
+    and the source files of the code collecting the attributes (including IGNORED_ATTRIBUTES).
+    """
+    typeshed_client_ex_directory = os.path.dirname(os.path.abspath(typeshed_client_ex.client.__file__))
+
+    paths = []
+    for directory, directory_names, file_names in os.walk(typeshed_client_ex_directory):
+        directory_names[:] = sorted(directory_name for directory_name in directory_names if directory_name != '__pycache__')
+        paths.extend(
+            os.path.join(directory, file_name)
+            for file_name in sorted(file_names)
+            if file_name.endswith(('.py', '.pyi')) or file_name == 'VERSIONS'
+        )
+
+    paths.append(os.path.abspath(__file__))
+    for module_name in STATIC_CLASS_QUERY_DATABASE_COLLECTION_MODULE_NAMES:
+        paths.append(os.path.abspath(sys.modules[module_name].__file__))
+
+    return paths
+
+
+def get_files_digest(paths: typing.Iterable[str]) -> str:
+    hash_ = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        with open(path, 'rb') as fp:
+            contents = fp.read()
+        hash_.update(f'{len(contents)}:'.encode('utf-8'))
+        hash_.update(contents)
+    return hash_.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def get_static_class_query_database_directory_name() -> str:
+    # One per Python build, as the attributes of builtin classes differ between builds,
+    # and per contents of the stubs and the collection code, so that editing them never serves a stale database
+    python_build = hashlib.blake2b(sys.version.encode('utf-8'), digest_size=4).hexdigest()
+    return (
+        f'static_class_query_database-{platform.python_implementation().lower()}-{platform.python_version()}-{python_build}'
+        f'-{get_files_digest(get_static_class_query_database_input_paths())}-{STATIC_CLASS_QUERY_DATABASE_FORMAT_VERSION}'
+    )
+
+
+def get_static_class_query_database_directory(cache_directory: str) -> str:
+    return os.path.join(cache_directory, get_static_class_query_database_directory_name())
+
+
+def save_static_class_query_database(
+    static_class_query_database: StaticClassQueryDatabase,
+    directory: str
+):
+    """
+    Save to `directory` atomically (processes loading it concurrently never see a partially written database).
+    The arrays are saved as .npy files, so that they can be memory-mapped when loaded.
+    """
+    parent_directory = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent_directory, exist_ok=True)
+
+    temporary_directory = tempfile.mkdtemp(dir=parent_directory)
+    try:
+        with open(os.path.join(temporary_directory, 'metadata.json'), 'w') as fp:
+            json.dump(
+                {
+                    'python_version': sys.version,
+                    'typeshed_class_list': [
+                        [typeshed_class.module_name, typeshed_class.class_name]
+                        for typeshed_class in static_class_query_database.typeshed_class_list
+                    ],
+                    'attribute_list': static_class_query_database.attribute_list
+                },
+                fp
+            )
+        np.save(os.path.join(temporary_directory, 'attribute_ids.npy'), static_class_query_database.attribute_ids)
+        np.save(os.path.join(temporary_directory, 'row_offsets.npy'), static_class_query_database.row_offsets)
+
+        os.rename(temporary_directory, directory)
+    except OSError:
+        # e.g., another process saved it first
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        raise
+
+
+def load_static_class_query_database(directory: str) -> typing.Optional[StaticClassQueryDatabase]:
+    """
+    Load a database saved by `save_static_class_query_database`, with its arrays memory-mapped (read-only).
+    Returns None if there is none, or if it was saved by another Python build (which the directory name should rule out).
+    """
+    try:
+        with open(os.path.join(directory, 'metadata.json'), 'r') as fp:
+            metadata = json.load(fp)
+
+        if metadata['python_version'] != sys.version:
+            return None
+
+        return StaticClassQueryDatabase(
+            [TypeshedClass(module_name, class_name) for module_name, class_name in metadata['typeshed_class_list']],
+            metadata['attribute_list'],
+            np.load(os.path.join(directory, 'attribute_ids.npy'), mmap_mode='r'),
+            np.load(os.path.join(directory, 'row_offsets.npy'), mmap_mode='r')
+        )
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_static_class_query_database(
+    typeshed_client: Client,
+    cache_directory: typing.Optional[str] = None
+) -> StaticClassQueryDatabase:
+    """
+    Load the static class query database saved in `cache_directory`, or build it (and save it there for next time).
+    Without a `cache_directory`, it is always built.
+    """
+    if cache_directory is None:
+        return build_static_class_query_database(typeshed_client)
+
+    directory = get_static_class_query_database_directory(cache_directory)
+
+    static_class_query_database = load_static_class_query_database(directory)
+    if static_class_query_database is not None:
+        return static_class_query_database
+
+    static_class_query_database = build_static_class_query_database(typeshed_client)
+
+    # Never replaces a saved database, which could be in use by other processes (and Python builds)
+    try:
+        save_static_class_query_database(static_class_query_database, directory)
+    except OSError as e:
+        # Fine if another process saved it in the meantime
+        if not os.path.isdir(directory):
+            logging.warning('Cannot save the static class query database to %s: %s', directory, e)
+
+    return load_static_class_query_database(directory) or static_class_query_database
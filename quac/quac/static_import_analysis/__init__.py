@@ -7,6 +7,35 @@ from .get_functions_and_classes_in_ast_module import get_functions_and_classes_i
 from .get_imports_and_import_froms_in_ast_module import get_imports_and_import_froms_in_ast_module
 
 
+def analyze_ast_module(
+    ast_module: ast.Module,
+    module_name: str,
+    is_package: bool = False
+) -> tuple[
+    dict[str, list[str]],
+    dict[str, dict[str, list[str]]],
+    set[tuple[str, str]],
+    set[tuple[str, str, str]]
+]:
+    (
+        function_name_to_parameter_name_list_dict,
+        class_name_to_method_name_to_parameter_name_list_dict
+    ) = get_functions_and_classes_in_ast_module(ast_module)
+
+    import_tuple_set, import_from_tuple_set = get_imports_and_import_froms_in_ast_module(
+        ast_module,
+        module_name,
+        is_package
+    )
+
+    return (
+        function_name_to_parameter_name_list_dict,
+        class_name_to_method_name_to_parameter_name_list_dict,
+        import_tuple_set,
+        import_from_tuple_set
+    )
+
+
 # Returns:
 # module_name_to_file_path_dict: dict[str, str]
 # module_name_to_function_name_to_parameter_name_list_dict: dict[str, dict[str, list[str]]]
@@ -48,21 +77,16 @@ def do_static_import_analysis(
                 invalid_module_name_set.add(module_name)
                 continue
 
+            is_package = file_path.endswith('__init__.py')
             (
                 function_name_to_parameter_name_list_dict,
-                class_name_to_method_name_to_parameter_name_list_dict
-            ) = get_functions_and_classes_in_ast_module(ast_module)
+                class_name_to_method_name_to_parameter_name_list_dict,
+                import_tuple_set,
+                import_from_tuple_set
+            ) = analyze_ast_module(ast_module, module_name, is_package)
 
             module_name_to_function_name_to_parameter_name_list_dict[module_name] = function_name_to_parameter_name_list_dict
             module_name_to_class_name_to_method_name_to_parameter_name_list_dict[module_name] = class_name_to_method_name_to_parameter_name_list_dict
-
-            is_package = file_path.endswith('__init__.py')
-            import_tuple_set, import_from_tuple_set = get_imports_and_import_froms_in_ast_module(
-                ast_module,
-                module_name,
-                is_package
-            )
-
             module_name_to_import_tuple_set_dict[module_name] = import_tuple_set
             module_name_to_import_from_tuple_set_dict[module_name] = import_from_tuple_set
 
@@ -0,0 +1,167 @@
+import ast
+import contextlib
+import io
+import sys
+import types
+
+from bind_top_level_statement_statically import bind_top_level_statement_statically
+from document_analysis import DocumentAnalysis
+from inference_session import InferenceSession
+
+
+if __name__ == '__main__':
+    code = '''
+import os.path
+import collections as c
+import module_that_is_not_imported
+from collections import OrderedDict as OD, namedtuple
+from json import *
+
+try:
+    import logging
+except ImportError:
+    logging = None
+
+raise SystemExit
+
+while True:
+    pass
+
+def side_effect():
+    raise SystemExit
+
+def f(a, /, b=side_effect(), *args, c: side_effect() = side_effect(), **kwargs) -> side_effect():
+    side_effect()
+
+@side_effect
+def g():
+    pass
+
+class Meta(type):
+    def __new__(mcs, name, bases, namespace):
+        raise SystemExit
+
+class Base(metaclass=Meta):
+    __slots__ = ('x', 'y')
+    z: int = side_effect()
+
+    def __init_subclass__(cls):
+        side_effect()
+
+class Derived(Base, c.abc.Sized, unresolvable.Base):
+    @staticmethod
+    def h(x):
+        side_effect()
+
+    class Nested:
+        pass
+'''
+
+    module = types.ModuleType('test_module')
+    module_node = ast.parse(code)
+
+    for top_level_statement in module_node.body:
+        bind_top_level_statement_statically(top_level_statement, module, '<test_module>')
+
+    import collections
+    import collections.abc
+    import json
+    import os
+
+    assert module.os is os
+    assert module.c is collections
+    assert 'module_that_is_not_imported' not in module.__dict__
+    assert 'module_that_is_not_imported' not in sys.modules
+    assert module.OD is collections.OrderedDict
+    assert module.namedtuple is collections.namedtuple
+    assert module.loads is json.loads
+    assert 'logging' in module.__dict__
+
+    # Skeletons keep names and parameters
+    assert module.f.__name__ == 'f' and module.f.__module__ == 'test_module'
+    assert module.f.__code__.co_varnames[:5] == ('a', 'b', 'c', 'args', 'kwargs')
+    assert module.f(1) is None
+    assert module.g.__name__ == 'g'
+
+    assert module.Base.__module__ == 'test_module'
+    assert isinstance(module.Base.__dict__['x'], types.MemberDescriptorType)
+    assert module.Base.z is ...
+    assert module.Derived.__bases__ == (module.Base, collections.abc.Sized)
+    assert isinstance(module.Derived.__dict__['h'], staticmethod)
+    assert module.Derived.Nested.__qualname__ == 'Derived.Nested'
+    # Methods do not keep their bodies
+    assert 'side_effect' not in module.Derived.h.__code__.co_names
+    assert module.Derived.h(1) is None
+
+    # Static-only analysis never executes the document's code
+    document_analysis = DocumentAnalysis('temp', InferenceSession(), static_only=True)
+    output_dict = document_analysis.update('import os\nos._exit(1)\n\ndef f(x):\n    return x + 1\n')
+    assert output_dict['temp']['global']['f']['return']
+    document_analysis.close()
+
+    # Instance attributes set in constructors are found as when executing the document
+    duck_code = '''
+class Duck:
+    def __init__(self):
+        self.feathers = 1
+        self.webbed_feet = 2
+
+def f(d):
+    return d.feathers + d.webbed_feet
+'''
+    inference_session = InferenceSession()
+    for static_only in (False, True):
+        document_analysis = DocumentAnalysis('temp', inference_session, static_only=static_only)
+        output_dict = document_analysis.update(duck_code)
+        assert output_dict['temp']['global']['f']['d'] == ['temp.Duck']
+        document_analysis.close()
+
+    # Methods called while creating classes (by metaclasses and `__init_subclass__` of bases) run nothing
+    third_party = types.ModuleType('third_party')
+    exec('''
+class Meta(type):
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+        for value in namespace.values():
+            if callable(value):
+                value(cls)
+
+class Base:
+    def __init_subclass__(cls):
+        cls.setup()
+''', third_party.__dict__)
+    sys.modules['third_party'] = third_party
+
+    hook_code = '''
+import enum
+from third_party import Meta, Base
+
+class Color(enum.Enum):
+    RED = 1
+
+    def __init__(self, value):
+        print('Color.__init__')
+        self.hue = value
+
+class WithMeta(metaclass=Meta):
+    def f(self):
+        print('WithMeta.f')
+
+class WithInitSubclass(Base):
+    @classmethod
+    def setup(cls):
+        print('WithInitSubclass.setup')
+'''
+    hook_module = types.ModuleType('hook_module')
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        for top_level_statement in ast.parse(hook_code).body:
+            bind_top_level_statement_statically(top_level_statement, hook_module, '<hook_module>')
+    assert stdout.getvalue() == ''
+    import enum
+    assert issubclass(hook_module.Color, enum.Enum) and issubclass(hook_module.WithInitSubclass, third_party.Base)
+
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        document_analysis = DocumentAnalysis('temp', InferenceSession(), static_only=True)
+        document_analysis.update(hook_code)
+        document_analysis.close()
+    assert stdout.getvalue() == ''
@@ -0,0 +1,178 @@
+import math
+
+import numpy as np
+
+from class_query import ClassQueryDatabase, initialize_class_query_database, query, query_top_k, query_top_k_in_bulk
+from get_attributes_in_runtime_class import get_attributes_in_runtime_class
+from inference_session import InferenceSession
+from typeshed_client_ex.type_definitions import TypeshedClass, from_runtime_class
+
+
+class Duck:
+    def __init__(self):
+        self.feathers = 1
+
+    def quack(self):
+        pass
+
+    def waddle(self):
+        pass
+
+
+class Robot:
+    def __init__(self):
+        self.battery = 1
+
+    def quack(self):
+        pass
+
+    def beep(self):
+        pass
+
+
+class Decoy(Duck):
+    pass
+
+
+def get_bm25_score(attribute_set, class_attribute_set, document_frequencies, num_classes, average_num_attributes_in_classes):
+    k_1 = 1.5
+    b = 0.75
+
+    score = 0.
+    for attribute in attribute_set & class_attribute_set:
+        idf = math.log((num_classes - document_frequencies[attribute] + 0.5) / (document_frequencies[attribute] + 0.5) + 1)
+        score += idf * (k_1 + 1) / (1 + k_1 * (1 - b + b * len(class_attribute_set) / average_num_attributes_in_classes))
+    return score
+
+
+def get_class_to_score(attribute_set, class_attribute_matrix, idfs, average_num_attributes_in_classes):
+    return dict(zip(*query(attribute_set, class_attribute_matrix, idfs, average_num_attributes_in_classes)))
+
+
+if __name__ == '__main__':
+    Duck.__module__ = Robot.__module__ = Decoy.__module__ = 'test_module'
+
+    inference_session = InferenceSession()
+
+    (
+        class_attribute_matrix,
+        idfs,
+        average_num_attributes_in_classes
+    ) = initialize_class_query_database(
+        {Duck, Robot},
+        inference_session.client,
+        inference_session.static_class_query_database
+    )
+
+    class_list = list(class_attribute_matrix.class_ndarray)
+    assert from_runtime_class(Duck) in class_list and from_runtime_class(Robot) in class_list
+
+    # Rows hold the (interned) attribute sets of the classes
+    matrix = class_attribute_matrix.matrix
+    assert matrix.shape == (len(class_list), len(class_attribute_matrix.attribute_list))
+    static_typeshed_class_to_attribute_set_dict = inference_session.static_class_query_database.get_typeshed_class_to_attribute_set_dict()
+    assert class_list[:len(static_typeshed_class_to_attribute_set_dict)] == list(static_typeshed_class_to_attribute_set_dict)
+    assert matrix.nnz == sum(len(attribute_set) for attribute_set in static_typeshed_class_to_attribute_set_dict.values()) \
+        + len(get_attributes_in_runtime_class(Duck)) + len(get_attributes_in_runtime_class(Robot))
+
+    class_to_attribute_set = {
+        typeshed_class: {class_attribute_matrix.attribute_list[attribute_id] for attribute_id in matrix[i].indices}
+        for i, typeshed_class in enumerate(class_list)
+    }
+    assert class_to_attribute_set[from_runtime_class(Duck)] == get_attributes_in_runtime_class(Duck)
+    assert {'feathers', 'quack', 'waddle'} <= class_to_attribute_set[from_runtime_class(Duck)]
+
+    document_frequencies = {
+        attribute: sum(attribute in attribute_set for attribute_set in class_to_attribute_set.values())
+        for attribute in class_attribute_matrix.attribute_list
+    }
+    assert np.isclose(average_num_attributes_in_classes, np.mean([len(attribute_set) for attribute_set in class_to_attribute_set.values()]))
+
+    # Scores are BM25 scores, highest first
+    for attribute_set in ({'quack', 'waddle'}, {'quack'}, {'battery', 'beep', 'unknown_attribute'}, {'append', '__len__'}):
+        class_ndarray, similarity_ndarray = query(attribute_set, class_attribute_matrix, idfs, average_num_attributes_in_classes)
+
+        assert all(similarity_ndarray[:-1] >= similarity_ndarray[1:])
+        # Only classes sharing an attribute with the query
+        assert set(class_ndarray) == {typeshed_class for typeshed_class, class_attribute_set in class_to_attribute_set.items() if attribute_set & class_attribute_set}
+        for typeshed_class, similarity in zip(class_ndarray, similarity_ndarray):
+            assert np.isclose(similarity, get_bm25_score(
+                attribute_set,
+                class_to_attribute_set[typeshed_class],
+                document_frequencies,
+                len(class_list),
+                average_num_attributes_in_classes
+            ))
+
+        # The top k are a prefix of the full ranking
+        for k in (0, 1, 2, 5, len(class_list)):
+            for threshold in (0., 0.5):
+                top_k_class_ndarray, top_k_similarity_ndarray = query_top_k(attribute_set, class_attribute_matrix, idfs, average_num_attributes_in_classes, k, threshold)
+                above_threshold = similarity_ndarray > threshold
+                assert list(top_k_class_ndarray) == list(class_ndarray[above_threshold][:k])
+                assert np.array_equal(top_k_similarity_ndarray, similarity_ndarray[above_threshold][:k])
+
+    assert query({'quack', 'waddle'}, class_attribute_matrix, idfs, average_num_attributes_in_classes)[0][0] == from_runtime_class(Duck)
+    assert query({'battery', 'beep'}, class_attribute_matrix, idfs, average_num_attributes_in_classes)[0][0] == from_runtime_class(Robot)
+
+    # No class has any of the attributes
+    class_ndarray, similarity_ndarray = query({'unknown_attribute'}, class_attribute_matrix, idfs, average_num_attributes_in_classes)
+    assert len(class_ndarray) == 0 and len(similarity_ndarray) == 0
+    class_ndarray, similarity_ndarray = query(set(), class_attribute_matrix, idfs, average_num_attributes_in_classes)
+    assert len(class_ndarray) == 0 and len(similarity_ndarray) == 0
+
+    # Querying in bulk gives the same results as querying one by one
+    attribute_sets = [{'quack', 'waddle'}, {'unknown_attribute'}, {'quack'}, set(), {'battery', 'beep', 'unknown_attribute'}, {'append', '__len__'}]
+    for k in (None, 0, 1, 3):
+        for threshold in (0., 0.5):
+            for (bulk_class_ndarray, bulk_similarity_ndarray), attribute_set in zip(
+                query_top_k_in_bulk(attribute_sets, class_attribute_matrix, idfs, average_num_attributes_in_classes, k, threshold),
+                attribute_sets,
+                strict=True
+            ):
+                class_ndarray, similarity_ndarray = query_top_k(attribute_set, class_attribute_matrix, idfs, average_num_attributes_in_classes, k, threshold)
+                assert list(bulk_class_ndarray) == list(class_ndarray)
+                assert np.array_equal(bulk_similarity_ndarray, similarity_ndarray)
+    assert query_top_k_in_bulk([], class_attribute_matrix, idfs, average_num_attributes_in_classes) == []
+
+    # Updating a class query database class by class gives the same database as initializing it
+    class_query_database = ClassQueryDatabase(inference_session.static_class_query_database)
+    for runtime_classes in ({Duck}, {Duck, Robot}, {Robot}, set(), {Robot, Decoy}, {Robot, Duck, Decoy}):
+        class_query_database.set_runtime_classes(runtime_classes)
+        (
+            updated_class_attribute_matrix,
+            updated_idfs,
+            updated_average_num_attributes_in_classes
+        ) = class_query_database.get_query_database()
+        (
+            initialized_class_attribute_matrix,
+            initialized_idfs,
+            initialized_average_num_attributes_in_classes
+        ) = initialize_class_query_database(runtime_classes, inference_session.client, inference_session.static_class_query_database)
+
+        assert set(updated_class_attribute_matrix.class_ndarray) == set(initialized_class_attribute_matrix.class_ndarray)
+        assert np.isclose(updated_average_num_attributes_in_classes, initialized_average_num_attributes_in_classes)
+        for attribute, attribute_id in initialized_class_attribute_matrix.attribute_to_attribute_id.items():
+            assert np.isclose(updated_idfs[updated_class_attribute_matrix.attribute_to_attribute_id[attribute]], initialized_idfs[attribute_id])
+        for attribute_set in ({'quack', 'waddle'}, {'battery', 'beep'}, {'append', '__len__'}):
+            updated_class_to_score = get_class_to_score(attribute_set, updated_class_attribute_matrix, updated_idfs, updated_average_num_attributes_in_classes)
+            initialized_class_to_score = get_class_to_score(attribute_set, initialized_class_attribute_matrix, initialized_idfs, initialized_average_num_attributes_in_classes)
+            assert updated_class_to_score.keys() == initialized_class_to_score.keys()
+            assert all(np.isclose(updated_class_to_score[typeshed_class], score) for typeshed_class, score in initialized_class_to_score.items())
+
+    # Classes with the attribute set of a base class are left out
+    assert from_runtime_class(Decoy) not in class_query_database and from_runtime_class(Duck) in class_query_database
+
+    # Document frequencies and the total number of attributes follow added and removed classes
+    quack_attribute_id = class_query_database.attribute_to_attribute_id['quack']
+    document_frequency = class_query_database.document_frequencies[quack_attribute_id]
+    total_num_attributes_in_classes = class_query_database.total_num_attributes_in_classes
+    class_query_database.add_class(TypeshedClass('test_module', 'Penguin'), {'quack', 'fly'})
+    assert class_query_database.document_frequencies[quack_attribute_id] == document_frequency + 1
+    assert class_query_database.document_frequencies[class_query_database.attribute_to_attribute_id['fly']] == 1
+    assert class_query_database.total_num_attributes_in_classes == total_num_attributes_in_classes + 2
+    assert query({'fly'}, *class_query_database.get_query_database())[0][0] == TypeshedClass('test_module', 'Penguin')
+    class_query_database.remove_class(TypeshedClass('test_module', 'Penguin'))
+    assert class_query_database.document_frequencies[quack_attribute_id] == document_frequency
+    assert class_query_database.total_num_attributes_in_classes == total_num_attributes_in_classes
+    assert len(query({'fly'}, *class_query_database.get_query_database())[0]) == 0
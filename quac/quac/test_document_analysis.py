@@ -0,0 +1,103 @@
+"""
+To generate an HTML coverage report for document_analysis.py under test:
+
+- Run Coverage: coverage run --source=document_analysis,typing_constraints test_document_analysis.py
+- Generate an HTML report: coverage html
+"""
+
+import sys
+
+from document_analysis import DocumentAnalysis, TypeInferenceCancelled, get_top_level_statement_source_segments
+from inference_session import InferenceSession
+
+
+def analyze_from_scratch(inference_session, code):
+    document_analysis = DocumentAnalysis('test_document', inference_session)
+    try:
+        return document_analysis.update(code)
+    finally:
+        document_analysis.close()
+
+
+if __name__ == '__main__':
+    import ast
+
+    code = 'x = 1\n\n@staticmethod\ndef f(a): return a + 1\ny = "é"; z = 2\n'
+    assert get_top_level_statement_source_segments(code, ast.parse(code).body) == [
+        b'x = 1',
+        b'@staticmethod\ndef f(a): return a + 1',
+        'y = "é"'.encode('utf-8'),
+        b'z = 2'
+    ]
+
+    inference_session = InferenceSession()
+
+    versions = [
+        'def add(x, y):\n    return x + y\n',
+        'def add(x, y):\n    return x + y\n\ndef fib(n):\n    if n < 2:\n        return n\n    return fib(n - 1) + fib(n - 2)\n',
+        'def add(x, y):\n    return x + y\n\ndef fib(n):\n    if n < 2:\n        return n\n    return fib(n - 1) + fib(n - 2)\n\nprint(add("a", "b"))\n',
+        # A failing top-level statement does not prevent the following ones from being analyzed
+        'raise ValueError\n\ndef add(x, y):\n    return x + y\n\ndef fib(n):\n    if n < 2:\n        return n\n    return fib(n - 1) + fib(n - 2)\n',
+        'def add(x, y):\n    return x.upper() + y\n\ndef fib(n):\n    if n < 2:\n        return n\n    return fib(n - 1) + fib(n - 2)\n',
+        # Syntax errors
+        'def add(x, y):\n    return x.upper() + y\n\ndef fib(n',
+        'def add(x, y):\n    return x + y\n'
+    ]
+
+    document_analysis = DocumentAnalysis('test_document', inference_session)
+
+    for version in versions:
+        assert document_analysis.update(version) == analyze_from_scratch(inference_session, version)
+
+    # Changing the last top-level statement keeps the analyses of the preceding ones
+    document_analysis.update(versions[2])
+    first_top_level_statement_analysis = document_analysis.top_level_statement_analyses[0]
+    document_analysis.update(versions[1])
+    assert document_analysis.top_level_statement_analyses[0] is first_top_level_statement_analysis
+
+    document_analysis.close()
+
+    # Documents with the same module name do not see each other's runtime objects
+    first_document_analysis = DocumentAnalysis('temp', inference_session)
+    second_document_analysis = DocumentAnalysis('temp', inference_session)
+
+    first_output_dict = first_document_analysis.update('class A:\n    def f(self): return 1\n\ndef g(a):\n    return a.f()\n')
+    second_document_analysis.update('class A:\n    def f(self): return "a"\n')
+    assert first_document_analysis.update('class A:\n    def f(self): return 1\n\ndef g(a):\n    return a.f()\n') == first_output_dict
+    assert first_output_dict['temp']['global']['g']['a'] == ['temp.A']
+
+    assert first_document_analysis.runtime_module_name != second_document_analysis.runtime_module_name
+    assert sys.modules[first_document_analysis.runtime_module_name] is first_document_analysis.module
+    assert first_document_analysis.module.A is not second_document_analysis.module.A
+
+    # Resetting replaces the runtime module and removes the previous one from sys.modules
+    previous_runtime_module_name = first_document_analysis.runtime_module_name
+    first_document_analysis.reset()
+    assert previous_runtime_module_name not in sys.modules
+    assert first_document_analysis.update('class A:\n    def f(self): return 1\n\ndef g(a):\n    return a.f()\n') == first_output_dict
+
+    first_document_analysis.close()
+    second_document_analysis.close()
+    assert not any(module_name.startswith('temp__document_') for module_name in sys.modules)
+
+    # A cancelled update leaves a consistent state behind
+    document_analysis = DocumentAnalysis('test_document', inference_session)
+    document_analysis.update(versions[0])
+
+    for number_of_checks_before_cancellation in range(4):
+        number_of_checks = 0
+
+        def is_cancelled():
+            global number_of_checks
+            number_of_checks += 1
+            return number_of_checks > number_of_checks_before_cancellation
+
+        try:
+            document_analysis.update(versions[2], is_cancelled)
+        except TypeInferenceCancelled:
+            pass
+
+        assert document_analysis.update(versions[2]) == analyze_from_scratch(inference_session, versions[2])
+        document_analysis.update(versions[0])
+
+    document_analysis.close()
@@ -0,0 +1,86 @@
+import importlib
+import json.decoder
+import os
+import sys
+import tempfile
+import types
+
+from get_attributes_in_runtime_class import get_attributes_in_runtime_class, set_runtime_class_attribute_set_cache
+from runtime_class_attribute_set_cache import RuntimeClassAttributeSetCache, get_runtime_class_attribute_set_cache_path
+
+
+if __name__ == '__main__':
+    def f():
+        class LocalClass:
+            pass
+
+        return LocalClass
+
+    module_without_file = types.ModuleType('module_without_file')
+    exec('class ClassInModuleWithoutFile:\n    pass\n', module_without_file.__dict__)
+
+    with tempfile.TemporaryDirectory() as cache_directory:
+        path = get_runtime_class_attribute_set_cache_path(cache_directory)
+        cache = RuntimeClassAttributeSetCache(path)
+
+        # Keyed by module name, class version and qualified name
+        key = cache.get_key(json.decoder.JSONDecoder)
+        assert key is not None and key[0] == 'json.decoder' and key[2] == 'JSONDecoder'
+        assert str(os.stat(json.decoder.__file__).st_mtime_ns) in key[1]
+
+        # Not cached
+        assert cache.get_key(f()) is None
+        assert cache.get_key(module_without_file.ClassInModuleWithoutFile) is None
+        assert cache.get_key(types.new_class('Derived', (module_without_file.ClassInModuleWithoutFile,))) is None
+
+        # The class version holds the versions of the modules of its bases
+        with open(os.path.join(cache_directory, 'base_module.py'), 'w') as fp:
+            fp.write('class Base:\n    def __init__(self):\n        self.x = 1\n')
+        with open(os.path.join(cache_directory, 'derived_module.py'), 'w') as fp:
+            fp.write('from base_module import Base\n\nclass Derived(Base):\n    pass\n')
+        sys.path.insert(0, cache_directory)
+        try:
+            derived_module = importlib.import_module('derived_module')
+            derived_key = cache.get_key(derived_module.Derived)
+            assert derived_key[0] == 'derived_module' and 'base_module=' in derived_key[1]
+
+            # Upgrading the base invalidates the attribute sets of derived classes
+            base_module_path = sys.modules['base_module'].__file__
+            modification_time = os.stat(base_module_path).st_mtime_ns + 1
+            os.utime(base_module_path, ns=(modification_time, modification_time))
+            assert RuntimeClassAttributeSetCache(path).get_key(derived_module.Derived) != derived_key
+        finally:
+            sys.path.remove(cache_directory)
+            sys.modules.pop('derived_module', None)
+            sys.modules.pop('base_module', None)
+
+        assert cache.get(key) is None
+        cache.put(key, {'decode', 'raw_decode'})
+        cache.flush()
+        assert cache.get(key) == {'decode', 'raw_decode'}
+
+        # Visible to other processes (and later runs)
+        assert RuntimeClassAttributeSetCache(path).get(key) == {'decode', 'raw_decode'}
+
+        # Attribute sets with attributes other than strings are not cached
+        other_key = cache.get_key(json.decoder.JSONDecodeError)
+        cache.put(other_key, {'msg', 1})
+        cache.flush()
+        assert cache.get(other_key) is None
+
+        # Attribute sets are computed once and then read from the cache
+        get_attributes_in_runtime_class.cache_clear()
+        set_runtime_class_attribute_set_cache(cache)
+        try:
+            attribute_set = get_attributes_in_runtime_class(json.decoder.JSONDecodeError)
+            cache.flush()
+            assert cache.get(other_key) == attribute_set
+            assert {'msg', 'lineno', 'colno'} <= attribute_set
+
+            cache.put(other_key, {'cached'})
+            cache.flush()
+            get_attributes_in_runtime_class.cache_clear()
+            assert get_attributes_in_runtime_class(json.decoder.JSONDecodeError) == {'cached'}
+        finally:
+            set_runtime_class_attribute_set_cache(None)
+            get_attributes_in_runtime_class.cache_clear()
@@ -0,0 +1,71 @@
+import json
+import os
+import platform
+import tempfile
+
+import numpy as np
+
+from class_query import ClassQueryDatabase
+from static_class_query_database import build_static_class_query_database, get_files_digest, get_static_class_query_database_input_paths, get_static_class_query_database, get_static_class_query_database_directory, load_static_class_query_database
+from typeshed_client_ex.client import Client
+from typeshed_client_ex.type_definitions import TypeshedClass
+
+
+if __name__ == '__main__':
+    client = Client()
+
+    static_class_query_database = build_static_class_query_database(client)
+    typeshed_class_to_attribute_set_dict = static_class_query_database.get_typeshed_class_to_attribute_set_dict()
+    assert TypeshedClass('builtins', 'list') in typeshed_class_to_attribute_set_dict
+    assert {'append', '__len__'} <= typeshed_class_to_attribute_set_dict[TypeshedClass('builtins', 'list')]
+
+    with tempfile.TemporaryDirectory() as cache_directory:
+        # One per Python build and contents of the stubs and the collection code
+        directory = get_static_class_query_database_directory(cache_directory)
+        assert platform.python_version() in directory
+        assert get_files_digest(get_static_class_query_database_input_paths()) in directory
+        assert any(path.endswith(os.path.join('stdlib', 'builtins.pyi')) for path in get_static_class_query_database_input_paths())
+        assert any(path.endswith('ignored_attributes.py') for path in get_static_class_query_database_input_paths())
+        assert load_static_class_query_database(directory) is None
+
+        # Built and saved the first time, loaded (memory-mapped) afterwards
+        saved_static_class_query_database = get_static_class_query_database(client, cache_directory)
+        assert os.path.isdir(directory)
+
+        loaded_static_class_query_database = get_static_class_query_database(client, cache_directory)
+        assert isinstance(loaded_static_class_query_database.attribute_ids, np.memmap)
+        assert loaded_static_class_query_database.typeshed_class_list == static_class_query_database.typeshed_class_list
+        assert loaded_static_class_query_database.get_typeshed_class_to_attribute_set_dict() == typeshed_class_to_attribute_set_dict
+        assert np.array_equal(loaded_static_class_query_database.row_offsets, saved_static_class_query_database.row_offsets)
+
+        # Class query databases use the rows as they are
+        class_query_database = ClassQueryDatabase(loaded_static_class_query_database)
+        attribute_ids = class_query_database.typeshed_class_to_attribute_ids[TypeshedClass('builtins', 'list')]
+        assert np.shares_memory(attribute_ids, loaded_static_class_query_database.attribute_ids)
+        assert np.all(attribute_ids[:-1] < attribute_ids[1:])
+        assert np.array_equal(
+            class_query_database.document_frequencies[:len(class_query_database.attribute_list)],
+            ClassQueryDatabase(static_class_query_database).document_frequencies[:len(class_query_database.attribute_list)]
+        )
+
+        # Saved by another Python build
+        metadata_path = os.path.join(directory, 'metadata.json')
+        with open(metadata_path, 'r') as fp:
+            metadata = json.load(fp)
+        metadata['python_version'] = 'another version'
+        with open(metadata_path, 'w') as fp:
+            json.dump(metadata, fp)
+        assert load_static_class_query_database(directory) is None
+        assert get_static_class_query_database(client, cache_directory).get_typeshed_class_to_attribute_set_dict() == typeshed_class_to_attribute_set_dict
+        # which is built anew, but kept
+        with open(metadata_path, 'r') as fp:
+            assert json.load(fp)['python_version'] == 'another version'
+
+        # Digests change with the contents of the files
+        path = os.path.join(cache_directory, 'stub.pyi')
+        with open(path, 'w') as fp:
+            fp.write('class A: ...\n')
+        digest = get_files_digest([path])
+        with open(path, 'w') as fp:
+            fp.write('class B: ...\n')
+        assert get_files_digest([path]) != digest
@@ -0,0 +1,45 @@
+from type_inference_cache import TypeInferenceCache, normalize_source
+
+
+if __name__ == '__main__':
+    assert normalize_source('x = 1  \r\ny = 2\r\n\n\n') == 'x = 1\ny = 2'
+
+    cache = TypeInferenceCache(max_entries=2, max_bytes=1024)
+
+    key = cache.get_key('def f(x):\n    return x\n', 1)
+    assert key == cache.get_key('def f(x):  \r\n    return x', 1)
+    assert key != cache.get_key('def f(x):\n    return x\n', 2)
+    assert key != cache.get_key('def f(y):\n    return y\n', 1)
+
+    assert cache.get(key) is None
+
+    output_dict = {'temp': {'global': {'f': {'x': ['builtins.int'], 'return': []}}}}
+    cache.put(key, output_dict)
+
+    cached_output_dict = cache.get(key)
+    assert cached_output_dict == output_dict
+
+    # Mutating a cached result does not change the cache
+    cached_output_dict['temp'].clear()
+    assert cache.get(key) == output_dict
+
+    # Bounded number of entries
+    cache.put(b'second', {})
+    cache.get(key)
+    cache.put(b'third', {})
+    assert cache.get(b'second') is None
+    assert cache.get(key) == output_dict
+
+    # Bounded memory
+    cache.put(b'large', {'x': 'x' * 600})
+    cache.put(b'larger', {'x': 'x' * 600})
+    assert cache.get(b'large') is None
+    cache.put(b'too large', {'x': 'x' * 2000})
+    assert cache.get(b'too large') is None
+
+    statistics = cache.get_statistics()
+    assert statistics['hits'] == 4
+    assert statistics['misses'] == 4
+    assert statistics['evictions'] == 4
+    assert statistics['entries'] == 1
+    assert statistics['bytes'] <= 1024
@@ -4,9 +4,8 @@ import logging
 import typing
 
 import numpy as np
-import pandas as pd
 
-from class_query import query
+from class_query import ClassAttributeMatrix, query_top_k, query_top_k_in_bulk
 from get_attributes_in_runtime_class import get_attributes_in_runtime_class
 from get_number_of_type_variables import get_number_of_type_variables
 from get_relation_sets_of_type_parameters import get_relation_sets_of_type_parameters
@@ -120,9 +119,14 @@ def get_type_inference_function(
         ]
     ],
     client: Client,
-    class_attribute_matrix: pd.DataFrame,
-    idfs: pd.Series,
-    average_num_attributes_in_classes: float
+    class_attribute_matrix: ClassAttributeMatrix,
+    idfs: np.ndarray,
+    average_num_attributes_in_classes: float,
+    # Only the top class is used for type inference; None keeps all possible classes, e.g., for class inference logs
+    max_num_possible_classes: typing.Optional[int] = 1,
+    # Node sets that will be inferred (e.g., of all typing slots in a module), whose class inference is done in bulk up front,
+    # together with that of the node sets of the type parameters of their top classes, one sparse matrix product per nesting level
+    node_sets_to_infer_classes_for_in_bulk: typing.Optional[typing.Iterable[frozenset[ast.AST]]] = None
 ):
     class_inference_cache: dict[
         frozenset[ast.AST],
@@ -134,6 +138,87 @@ def get_type_inference_function(
     
     type_inference_cache: dict[frozenset[ast.AST], TypeshedTypeAnnotation] = {}
 
+    type_parameter_node_sets_cache: dict[
+        tuple[TypeshedClass, frozenset[ast.AST]],
+        list[frozenset[ast.AST]]
+    ] = {}
+
+    def get_aggregates_for_augmented_node_set(
+        augmented_node_set: frozenset[ast.AST],
+        indent: str
+    ) -> tuple[
+        bool,  # whether runtime class can be instance-of types.NoneType
+        typing.Optional[RuntimeClass],  # the single runtime class covering all attributes, if any
+        set[str]  # aggregate attribute set
+    ]:
+        # Determine whether it can be None.
+        aggregate_runtime_term_set = set().union(
+            *(get_runtime_terms_callback(node) for node in augmented_node_set)
+        )
+
+        aggregate_can_be_none: bool = False
+        aggregate_non_none_runtime_classes: set[RuntimeClass] = set()
+
+        for runtime_term in aggregate_runtime_term_set:
+            if isinstance(runtime_term, Instance):
+                instance_class = runtime_term.class_
+                if instance_class is type(None):
+                    aggregate_can_be_none = True
+                elif instance_class is not type(NotImplemented):
+                    aggregate_non_none_runtime_classes.add(instance_class)
+
+        logging.info(
+            '%sAggregate non-None runtime classes for %s: %s',
+            indent,
+            augmented_node_set, aggregate_non_none_runtime_classes
+        )
+
+        logging.info(
+            '%sCan %s be None? %s',
+            indent,
+            augmented_node_set, aggregate_can_be_none
+        )
+
+        # Initialize aggregate attribute set.
+
+        aggregate_attribute_set = set().union(
+            *(get_bag_of_attributes_callback(node) for node in augmented_node_set)
+        )
+
+        logging.info(
+            '%sAggregate attribute set for %s: %s',
+            indent,
+            augmented_node_set, aggregate_attribute_set
+        )
+
+        if (
+            len(aggregate_non_none_runtime_classes) == 1
+            and aggregate_attribute_set.issubset(
+                get_attributes_in_runtime_class(
+                    single_runtime_class_covering_all_attributes := next(iter(aggregate_non_none_runtime_classes))
+                )
+            )
+        ):
+            logging.info(
+                '%sSingle runtime class covering all attributes for %s: %s',
+                indent,
+                augmented_node_set,
+                single_runtime_class_covering_all_attributes
+            )
+
+            return aggregate_can_be_none, single_runtime_class_covering_all_attributes, aggregate_attribute_set
+
+        return aggregate_can_be_none, None, aggregate_attribute_set
+
+    def get_confidence_and_possible_class_list(
+        possible_class_ndarray: np.ndarray,
+        cosine_similarity_ndarray: np.ndarray
+    ) -> list[tuple[float, TypeshedClass]]:
+        return [
+            (float(cosine_similarity), possible_class)
+            for possible_class, cosine_similarity in zip(possible_class_ndarray, cosine_similarity_ndarray)
+        ]
+
     def infer_classes_for_augmented_node_set(
         augmented_node_set: frozenset[ast.AST],
         indent_level: int = 0,
@@ -163,106 +248,151 @@ def get_type_inference_function(
                 augmented_node_set
             )
 
-            # Determine whether it can be None.
-            aggregate_runtime_term_set = set().union(
-                *(get_runtime_terms_callback(node) for node in augmented_node_set)
-            )
-
-            aggregate_can_be_none: bool = False
-            aggregate_non_none_runtime_classes: set[RuntimeClass] = set()
-
-            for runtime_term in aggregate_runtime_term_set:
-                if isinstance(runtime_term, Instance):
-                    instance_class = runtime_term.class_
-                    if instance_class is type(None):
-                        aggregate_can_be_none = True
-                    elif instance_class is not type(NotImplemented):
-                        aggregate_non_none_runtime_classes.add(instance_class)
-
-            logging.info(
-                '%sAggregate non-None runtime classes for %s: %s',
-                indent,
-                augmented_node_set, aggregate_non_none_runtime_classes
-            )
-
-            logging.info(
-                '%sCan %s be None? %s',
-                indent,
-                augmented_node_set, aggregate_can_be_none
-            )
-
-            # Initialize aggregate attribute set.
-
-            aggregate_attribute_set = set().union(
-                *(get_bag_of_attributes_callback(node) for node in augmented_node_set)
-            )
-
-            logging.info(
-                '%sAggregate attribute set for %s: %s',
-                indent,
-                augmented_node_set, aggregate_attribute_set
-            )
+            (
+                aggregate_can_be_none,
+                single_runtime_class_covering_all_attributes,
+                aggregate_attribute_set
+            ) = get_aggregates_for_augmented_node_set(augmented_node_set, indent)
 
             # Query possible classes.
 
-            confidence_and_possible_class_list: list[tuple[float, TypeshedClass]] = []
-
-            if (
-                len(aggregate_non_none_runtime_classes) == 1
-                and aggregate_attribute_set.issubset(
-                    get_attributes_in_runtime_class(
-                        single_runtime_class_covering_all_attributes := next(iter(aggregate_non_none_runtime_classes))
+            if single_runtime_class_covering_all_attributes is not None:
+                confidence_and_possible_class_list = [(1, from_runtime_class(single_runtime_class_covering_all_attributes))]
+            else:
+                confidence_and_possible_class_list = get_confidence_and_possible_class_list(
+                    *query_top_k(
+                        aggregate_attribute_set,
+                        class_attribute_matrix,
+                        idfs,
+                        average_num_attributes_in_classes,
+                        max_num_possible_classes,
+                        cosine_similarity_threshold
                     )
                 )
-            ):
-                confidence_and_possible_class_list.append(
-                    (1, from_runtime_class(single_runtime_class_covering_all_attributes))
-                )
 
                 logging.info(
-                    '%sSingle runtime class covering all attributes for %s: %s',
+                    '%sPossible types queried for %s based on attributes: %s',
                     indent,
                     augmented_node_set,
-                    single_runtime_class_covering_all_attributes
-                )
-            else:
-                (
-                    possible_class_ndarray,
-                    cosine_similarity_ndarray
-                ) = query(
-                    aggregate_attribute_set,
-                    class_attribute_matrix,
-                    idfs,
-                    average_num_attributes_in_classes
+                    confidence_and_possible_class_list
                 )
 
-                nonzero_cosine_similarity_indices = (cosine_similarity_ndarray > cosine_similarity_threshold)
+            return_value = confidence_and_possible_class_list, aggregate_can_be_none
 
-                selected_possible_class_ndarray = possible_class_ndarray[nonzero_cosine_similarity_indices]
-                selected_cosine_similarity_ndarray = cosine_similarity_ndarray[nonzero_cosine_similarity_indices]
+            class_inference_cache[augmented_node_set] = return_value
 
-                argsort = np.argsort(selected_cosine_similarity_ndarray)
+            return return_value
 
-                for i in argsort[-1::-1]:
-                    possible_class = selected_possible_class_ndarray[i]
-                    cosine_similarity = float(selected_cosine_similarity_ndarray[i])
+    def infer_classes_for_augmented_node_sets_in_bulk(
+        augmented_node_sets: typing.Iterable[frozenset[ast.AST]],
+        cosine_similarity_threshold: float = 1e-1
+    ):
+        """
+        Perform class inference for many augmented node sets at once, scoring all their attribute sets in one sparse matrix product,
+        and fill the class inference cache with the results.
+        """
+        nonlocal class_inference_cache
 
-                    confidence_and_possible_class_list.append(
-                        (cosine_similarity, possible_class)
-                    )
+        queried_augmented_node_sets_and_can_be_nones: list[tuple[frozenset[ast.AST], bool]] = []
+        aggregate_attribute_sets: list[set[str]] = []
 
-                logging.info(
-                    '%sPossible types queried for %s based on attributes: %s',
-                    indent,
+        for augmented_node_set in dict.fromkeys(augmented_node_sets):
+            if augmented_node_set in class_inference_cache:
+                continue
+
+            (
+                aggregate_can_be_none,
+                single_runtime_class_covering_all_attributes,
+                aggregate_attribute_set
+            ) = get_aggregates_for_augmented_node_set(augmented_node_set, '')
+
+            if single_runtime_class_covering_all_attributes is not None:
+                class_inference_cache[augmented_node_set] = (
+                    [(1, from_runtime_class(single_runtime_class_covering_all_attributes))],
+                    aggregate_can_be_none
+                )
+            else:
+                queried_augmented_node_sets_and_can_be_nones.append((augmented_node_set, aggregate_can_be_none))
+                aggregate_attribute_sets.append(aggregate_attribute_set)
+
+        logging.info('Querying possible classes for %s augmented node sets in bulk.', len(aggregate_attribute_sets))
+
+        for (augmented_node_set, aggregate_can_be_none), (possible_class_ndarray, cosine_similarity_ndarray) in zip(
+            queried_augmented_node_sets_and_can_be_nones,
+            query_top_k_in_bulk(
+                aggregate_attribute_sets,
+                class_attribute_matrix,
+                idfs,
+                average_num_attributes_in_classes,
+                max_num_possible_classes,
+                cosine_similarity_threshold
+            )
+        ):
+            class_inference_cache[augmented_node_set] = (
+                get_confidence_and_possible_class_list(possible_class_ndarray, cosine_similarity_ndarray),
+                aggregate_can_be_none
+            )
+
+    def get_augmented_node_set(node_set: frozenset[ast.AST]) -> frozenset[ast.AST]:
+        return frozenset().union(
+            *(get_subset_nodes_callback(node) for node in node_set)
+        )
+
+    def get_type_parameter_node_sets(
+        top_class_prediction: TypeshedClass,
+        augmented_node_set: frozenset[ast.AST]
+    ) -> list[frozenset[ast.AST]]:
+        # The node sets whose types are the type parameters of the top class prediction
+        key = top_class_prediction, augmented_node_set
+
+        if key not in type_parameter_node_sets_cache:
+            type_parameter_node_sets_cache[key] = [
+                frozenset(
+                    get_all_nodes_related_by_relation_set(
+                        augmented_node_set,
+                        relation_set,
+                        get_relations_callback
+                    )
+                )
+                for relation_set in query_relation_sets_of_type_parameters(
+                    top_class_prediction,
                     augmented_node_set,
-                    confidence_and_possible_class_list
+                    get_relations_callback,
+                    client
                 )
+            ]
 
-            return_value = confidence_and_possible_class_list, aggregate_can_be_none
+        return type_parameter_node_sets_cache[key]
 
-            class_inference_cache[augmented_node_set] = return_value
+    def infer_classes_for_node_sets_in_bulk(
+        node_sets: typing.Iterable[frozenset[ast.AST]],
+        depth_limit: int = 3,
+        cosine_similarity_threshold: float = 1e-1
+    ):
+        """
+        Perform class inference in bulk for the node sets, then for the node sets of the type parameters of their top classes,
+        and so on, one round per nesting level up to the depth limit of `infer_type_for_node_set`,
+        so that it only hits the class inference cache.
+        """
+        node_set_dict = dict.fromkeys(node_sets)
 
-            return return_value
+        for _ in range(depth_limit + 1):
+            if not node_set_dict:
+                break
+
+            augmented_node_set_dict = dict.fromkeys(map(get_augmented_node_set, node_set_dict))
+
+            infer_classes_for_augmented_node_sets_in_bulk(augmented_node_set_dict, cosine_similarity_threshold)
+
+            # Node sets of the type parameters of the top classes, inferred in the next round
+            node_set_dict = {}
+
+            for augmented_node_set in augmented_node_set_dict:
+                confidence_and_possible_class_list, _ = class_inference_cache[augmented_node_set]
+                # Otherwise, the fallback (typing.Any) has no type parameters
+                if confidence_and_possible_class_list:
+                    _, top_class_prediction = confidence_and_possible_class_list[0]
+                    node_set_dict.update(dict.fromkeys(get_type_parameter_node_sets(top_class_prediction, augmented_node_set)))
 
     def infer_type_for_node_set(
         node_set: frozenset[ast.AST],
@@ -308,9 +438,7 @@ def get_type_inference_function(
                 )
 
                 # Part 0: Augment node set.
-                augmented_node_set = frozenset().union(
-                    *(get_subset_nodes_callback(node) for node in node_set)
-                )
+                augmented_node_set = get_augmented_node_set(node_set)
 
                 logging.info(
                     '%sAugmented node set to %s.',
@@ -361,20 +489,12 @@ def get_type_inference_function(
 
                 type_parameter_type_prediction_list = []
 
-                for relation_set in query_relation_sets_of_type_parameters(
+                for type_parameter_node_set in get_type_parameter_node_sets(
                     top_class_prediction,
-                    augmented_node_set,
-                    get_relations_callback,
-                    client
+                    augmented_node_set
                 ):
-                    related_nodes = get_all_nodes_related_by_relation_set(
-                        augmented_node_set,
-                        relation_set,
-                        get_relations_callback
-                    )
-
                     type_parameter_type_prediction = infer_type_for_node_set(
-                        frozenset(related_nodes),
+                        type_parameter_node_set,
                         depth + 1,
                         cosine_similarity_threshold,
                         depth_limit,
@@ -395,4 +515,7 @@ def get_type_inference_function(
 
             return return_value
 
+    if node_sets_to_infer_classes_for_in_bulk is not None:
+        infer_classes_for_node_sets_in_bulk(node_sets_to_infer_classes_for_in_bulk)
+
     return infer_type_for_node_set
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import threading
+import typing
+
+from collections import OrderedDict
+
+
+def normalize_source(python_file_contents: str) -> str:
+    """
+    Normalize line endings and drop trailing whitespace on each line and at the end of the code,
+    as editors add and remove them freely and they do not change inferred types.
+    """
+    lines = python_file_contents.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).rstrip('\n')
+
+
+class TypeInferenceCache:
+    """
+    A thread-safe LRU cache of `type_inference` results, bounded both in number of entries and in memory.
+    Keys are content hashes of the normalized code and a version of any other data the results depend on.
+    Results are stored as JSON strings, so that callers cannot mutate cached results, and their sizes are known.
+    """
+    __slots__ = (
+        'max_entries',
+        'max_bytes',
+        'keys_to_serialized_output_dicts',
+        'total_bytes',
+        'hits',
+        'misses',
+        'evictions',
+        'lock'
+    )
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # Least recently used first
+        self.keys_to_serialized_output_dicts: OrderedDict[bytes, str] = OrderedDict()
+        self.total_bytes: int = 0
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_key(python_file_contents: str, version: typing.Hashable = None) -> bytes:
+        hash_ = hashlib.blake2b(normalize_source(python_file_contents).encode('utf-8'), digest_size=16)
+        hash_.update(b'\0')
+        hash_.update(repr(version).encode('utf-8'))
+        return hash_.digest()
+
+    def get(self, key: bytes) -> typing.Optional[dict]:
+        with self.lock:
+            serialized_output_dict = self.keys_to_serialized_output_dicts.get(key)
+            if serialized_output_dict is None:
+                self.misses += 1
+                return None
+
+            self.keys_to_serialized_output_dicts.move_to_end(key)
+            self.hits += 1
+
+        return json.loads(serialized_output_dict)
+
+    def put(self, key: bytes, output_dict: dict):
+        serialized_output_dict = json.dumps(output_dict)
+        size = len(serialized_output_dict)
+
+        # Do not let a single huge result evict everything else
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            previous_serialized_output_dict = self.keys_to_serialized_output_dicts.pop(key, None)
+            if previous_serialized_output_dict is not None:
+                self.total_bytes -= len(previous_serialized_output_dict)
+
+            self.keys_to_serialized_output_dicts[key] = serialized_output_dict
+            self.total_bytes += size
+
+            while (
+                len(self.keys_to_serialized_output_dicts) > self.max_entries
+                or self.total_bytes > self.max_bytes
+            ):
+                _, evicted_serialized_output_dict = self.keys_to_serialized_output_dicts.popitem(last=False)
+                self.total_bytes -= len(evicted_serialized_output_dict)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.keys_to_serialized_output_dicts.clear()
+            self.total_bytes = 0
+
+    def get_statistics(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.keys_to_serialized_output_dicts),
+                'bytes': self.total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,159 @@
+import ast
+import typing
+
+from collections import Counter
+
+import networkx as nx
+
+from relations import RelationType
+from type_definitions import RuntimeTerm
+
+
+class TypingConstraints:
+    """
+    The typing constraints collected for AST nodes:
+    runtime terms, bags of attributes, subset relations and other relations.
+
+    All changes are recorded in an undo journal,
+    so that the constraints added after a checkpoint can be rolled back.
+    The nodes whose constraints changed are also recorded,
+    so that the nodes whose inferred types may have changed can be found.
+    """
+    __slots__ = (
+        'node_runtime_terms',
+        'node_bags_of_attributes',
+        'node_subset_graph',
+        'node_relations',
+        'node_relation_predecessors',
+        'journal',
+        'changed_nodes'
+    )
+
+    def __init__(self):
+        self.node_runtime_terms: dict[ast.AST, set[RuntimeTerm]] = {}
+        self.node_bags_of_attributes: dict[ast.AST, set[str]] = {}
+        self.node_subset_graph: nx.DiGraph = nx.DiGraph()
+        self.node_relations: dict[
+            ast.AST,
+            dict[
+                RelationType,
+                dict[
+                    typing.Optional[object],
+                    set[ast.AST]
+                ]
+            ]
+        ] = {}
+
+        # For each node, the nodes with relations to it (and how many)
+        self.node_relation_predecessors: dict[ast.AST, Counter[ast.AST]] = {}
+
+        self.journal: list[tuple] = []
+        self.changed_nodes: set[ast.AST] = set()
+
+    def get_runtime_terms(self, node: ast.AST) -> set[RuntimeTerm]:
+        return self.node_runtime_terms.get(node, set())
+
+    def update_runtime_terms(self, node: ast.AST, runtime_terms: typing.Iterable[RuntimeTerm]):
+        node_runtime_terms = self.node_runtime_terms.setdefault(node, set())
+        new_runtime_terms = set(runtime_terms) - node_runtime_terms
+        if new_runtime_terms:
+            node_runtime_terms.update(new_runtime_terms)
+            self.journal.append(('runtime_terms', node, new_runtime_terms))
+            self.changed_nodes.add(node)
+
+    def get_bag_of_attributes(self, node: ast.AST) -> set[str]:
+        return self.node_bags_of_attributes.get(node, set())
+
+    def update_bag_of_attributes(self, node: ast.AST, attributes: typing.Iterable[str]):
+        node_bag_of_attributes = self.node_bags_of_attributes.setdefault(node, set())
+        new_attributes = set(attributes) - node_bag_of_attributes
+        if new_attributes:
+            node_bag_of_attributes.update(new_attributes)
+            self.journal.append(('bag_of_attributes', node, new_attributes))
+            self.changed_nodes.add(node)
+
+    def add_subset(self, superset: ast.AST, subset: ast.AST):
+        if not self.node_subset_graph.has_edge(superset, subset):
+            self.node_subset_graph.add_edge(superset, subset)
+            self.journal.append(('subset', superset, subset))
+            self.changed_nodes.add(superset)
+
+    def set_equivalent(self, first: ast.AST, second: ast.AST):
+        self.add_subset(first, second)
+        self.add_subset(second, first)
+
+    def get_subset_nodes(self, node: ast.AST) -> frozenset[ast.AST]:
+        if node in self.node_subset_graph:
+            # Get all nodes reachable from the start node using DFS
+            return frozenset(nx.dfs_preorder_nodes(self.node_subset_graph, node))
+        else:
+            return frozenset((node,))
+
+    def add_relation(self, first: ast.AST, second: ast.AST, relation_type: RelationType, parameter: typing.Optional[object]):
+        related_nodes = self.node_relations.setdefault(first, {}).setdefault(relation_type, {}).setdefault(parameter, set())
+        if second not in related_nodes:
+            related_nodes.add(second)
+            self.node_relation_predecessors.setdefault(second, Counter())[first] += 1
+            self.journal.append(('relation', first, second, relation_type, parameter))
+            self.changed_nodes.add(first)
+
+    def get_relations(self, node: ast.AST):
+        return self.node_relations.get(node, {})
+
+    def checkpoint(self) -> int:
+        return len(self.journal)
+
+    def rollback(self, checkpoint: int):
+        """
+        Undo all changes made after `checkpoint`, in reverse order.
+        """
+        while len(self.journal) > checkpoint:
+            entry = self.journal.pop()
+            kind, node = entry[0], entry[1]
+
+            if kind == 'runtime_terms':
+                self.node_runtime_terms[node].difference_update(entry[2])
+            elif kind == 'bag_of_attributes':
+                self.node_bags_of_attributes[node].difference_update(entry[2])
+            elif kind == 'subset':
+                subset = entry[2]
+                self.node_subset_graph.remove_edge(node, subset)
+                # Isolated nodes are equivalent to nodes not in the graph
+                for node_ in (node, subset):
+                    if node_ in self.node_subset_graph and not self.node_subset_graph.degree(node_):
+                        self.node_subset_graph.remove_node(node_)
+            elif kind == 'relation':
+                second, relation_type, parameter = entry[2], entry[3], entry[4]
+                self.node_relations[node][relation_type][parameter].discard(second)
+                predecessors = self.node_relation_predecessors[second]
+                predecessors[node] -= 1
+                if not predecessors[node]:
+                    del predecessors[node]
+
+            self.changed_nodes.add(node)
+
+    def get_nodes_affected_by_changes(self) -> set[ast.AST]:
+        """
+        Get the nodes from which a changed node can be reached through subset relations or other relations,
+        i.e., the nodes whose inferred types may have changed since `clear_changed_nodes` was last called.
+        """
+        affected_nodes: set[ast.AST] = set(self.changed_nodes)
+        stack: list[ast.AST] = list(self.changed_nodes)
+
+        while stack:
+            node = stack.pop()
+
+            predecessors: list[ast.AST] = []
+            if node in self.node_subset_graph:
+                predecessors.extend(self.node_subset_graph.predecessors(node))
+            predecessors.extend(self.node_relation_predecessors.get(node, ()))
+
+            for predecessor in predecessors:
+                if predecessor not in affected_nodes:
+                    affected_nodes.add(predecessor)
+                    stack.append(predecessor)
+
+        return affected_nodes
+
+    def clear_changed_nodes(self):
+        self.changed_nodes.clear()
@@ -1,13 +1,25 @@
-from flask import Flask, jsonify, render_template, url_for, request
+from flask import Flask, Response, jsonify, render_template, url_for, request, stream_with_context
 from flask_cors import CORS
 
 import sys
 sys.path.insert(0, 'quac/quac')
-from main import type_inference
+from type_inference_cache import TypeInferenceCache
+from parameter_metadata_store import ParameterMetadataStore, ParameterMetadataOverlay
+from candidate_index import CandidateIndex
+from stage_metrics import StageMetrics
+from inference_worker_pool import InferenceWorkerPool, InferenceWorkerPoolFull
+from document_analysis import TypeInferenceCancelled
 
 import json
 import ast
+import logging
+import os
 import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future
 
 
 app = Flask(__name__)
@@ -16,6 +28,41 @@ cors = CORS(app, origins='*')
 
 K = 3      # how many suggestions to display??
 
+MAX_DOCUMENTS = 64      # how many open documents to keep state for (per worker, for the analysis state)
+NUM_WORKERS = int(os.environ.get('QUAC_NUM_WORKERS', os.cpu_count() or 1))
+MAX_PENDING_PER_WORKER = 4      # further requests for a busy worker get a 503
+# never execute the user's code -- only the AST, typeshed stubs and already imported modules are used.
+# requests can override it with 'static_only'
+STATIC_ONLY = os.environ.get('QUAC_STATIC_ONLY', '0') == '1'
+# DEBUG logs the code received, the parsed globals and the quac predictions of every request
+LOG_LEVEL = os.environ.get('QUAC_LOG_LEVEL', 'WARNING')
+# where workers save data that is expensive to compute and the same across restarts (e.g., the static class query database)
+CACHE_DIR = os.environ.get('QUAC_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'quac'))
+
+logging.basicConfig(level=LOG_LEVEL)
+
+# latency of each stage (in the server and in the workers) and peak memory, served at /metrics
+stage_metrics = StageMetrics()
+
+# type inference runs in worker processes, created once at server start (before flask starts any threads).
+# each worker keeps its own warm session (typeshed client caches, static class query database, builtins bindings)
+# and the incremental analysis state of the documents dispatched to it, and runs the analyzed code in its own sys.modules
+# (not in the workers that replace crashed ones, which import the main module -- this one, if run as a script -- again as __mp_main__)
+if __name__ != '__mp_main__':
+    inference_worker_pool = InferenceWorkerPool(NUM_WORKERS, MAX_PENDING_PER_WORKER, MAX_DOCUMENTS, stage_metrics, CACHE_DIR)
+
+# document id -> state of that document, least recently used first:
+# - 'params_overlay': signatures of the functions defined in the document, layered over the shared params DB
+documents = OrderedDict()
+documents_lock = threading.Lock()           # flask serves requests from multiple threads
+
+# identical contexts (e.g., hitting Tab again) are answered without running type inference
+type_inference_cache = TypeInferenceCache(max_entries=256, max_bytes=16 * 1024 * 1024)
+
+PARAMS_DB_PATH = 'params_db.json'
+# loaded once and indexed by function name, reloaded when the file changes. shared and never written to
+parameter_metadata_store = ParameterMetadataStore(PARAMS_DB_PATH)
+
 
 @app.route("/")
 def index():
@@ -47,13 +94,28 @@ def parse_global_imports(code):
     return global_imports
 
 
-def parse_global_variables(code):
-    tree = ast.parse(code)
+def get_callee_name(call):
+    # the (dotted) name of the called function, straight from the Call node
+    if isinstance(call.func, ast.Name):
+        return call.func.id
+    return ast.unparse(call.func)
+
+
+def parse_global_imports_and_variables(tree):
+    # one walk for both imports and module-level assignments
+    global_imports = {}
     global_variables = {}
 
     for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == '*':
+                    continue
+                module = alias.name.split('.')[-1]  # [TODO] torchvision.transforms -- should store as torchvision.transforms or transforms?
+                global_imports[module] = alias.asname or module
+
         # Check for assignment statements (ast.Assign)
-        if isinstance(node, ast.Assign):
+        elif isinstance(node, ast.Assign):
             # Global variables are those assigned at the module level
             for target in node.targets:
                 if isinstance(target, ast.Name):  # Ensure it's a variable
@@ -68,7 +130,7 @@ def parse_global_variables(code):
                         value = var_value.id
                         var_type = "variable"  # Just refer to another variable
                     elif isinstance(var_value, ast.Call):  # Function call (e.g., list, dict)
-                        value = f"Function call: {ast.dump(var_value)}"
+                        value = get_callee_name(var_value)  # add, fib, np.zeros
                         var_type = "call"
                     else:
                         value = "Unknown"
@@ -77,10 +139,32 @@ def parse_global_variables(code):
                     # Add to the globals_info dictionary
                     global_variables[var_name] = {'type': var_type, 'value': value}
 
-    return global_variables
+    return global_imports, global_variables
+
 
+def parse_code_context(code_context):
+    # the whole buffer is parsed once -- the last line is the (usually incomplete) call the user needs help with
+    code_context_wo_last_line, _, last_line = code_context.rpartition('\n')
+    module, func = get_module_and_function(last_line)
+
+    try:
+        module_node = ast.parse(code_context_wo_last_line)
+    except SyntaxError:
+        # the user is in the middle of typing -- imports can still be found line by line
+        global_imports, global_variables = parse_global_imports(code_context_wo_last_line), {}
+    else:
+        global_imports, global_variables = parse_global_imports_and_variables(module_node)
 
-def parse_quac_output(quac_dict, params_db):
+    return {
+        "global_imports": global_imports,
+        "global_variables": global_variables,
+        "module": module,
+        "func": func,
+        "code_context_wo_last_line": code_context_wo_last_line
+    }
+
+
+def parse_quac_output(quac_dict, local_functions):
     fn_name_to_return_types = {}
     temp_preds = quac_dict.get("temp", {})
     global_fn_types = temp_preds.get("global", {})
@@ -91,8 +175,8 @@ def parse_quac_output(quac_dict, params_db):
             return_types = return_types[0]
         fn_name_to_return_types[fname] = return_types
 
-        # support for local advanced intellisense -- add global functions to database
-        params_db[fname] = {fname: []}
+        # support for local advanced intellisense -- collect the signatures of global functions
+        local_functions[fname] = []
         for param_name,param_type in v.items():
             if param_name == "return":
                 continue
@@ -100,7 +184,7 @@ def parse_quac_output(quac_dict, params_db):
             if len(param_type) == 1:
                 param_type = param_type[0]
             
-            params_db[fname][fname].append({
+            local_functions[fname].append({
                 "name": param_name,
                 "type": param_type
             })
@@ -108,26 +192,36 @@ def parse_quac_output(quac_dict, params_db):
     return fn_name_to_return_types
 
 
+def get_assigned_type(global_variable, global_functions):
+    if global_variable['type'] == 'call':  # function call e.g., a = sum(...)
+        return global_functions.get(global_variable['value'], "Unknown")
+    return global_variable['type']
+
+
 def resolve_nonliteral_variables(global_variables, global_functions):
-    resolved_global_variables = {}
-    for var_name,v in global_variables.items():
-        if v['type'] == 'variable':  # variable assignment, for e.g., a = b; b = z so on
+    # variable assignments (a = b; b = z so on) form chains -- each chain is followed once, and every variable on it
+    # is resolved to the type at its end, so that later chains stop as soon as they reach a resolved variable.
+    # chains ending at an undefined name (e.g., an import) or in a cycle (a = b; b = a) are "Unknown"
+    resolved_types = {}
+    for var_name in global_variables:
+        chain = []
+        on_chain = set()
+        rhs_var = var_name
+        while rhs_var not in resolved_types and rhs_var not in on_chain and rhs_var in global_variables:
+            v = global_variables[rhs_var]
+            if v['type'] != 'variable':
+                resolved_types[rhs_var] = get_assigned_type(v, global_functions)
+                break
+            chain.append(rhs_var)
+            on_chain.add(rhs_var)
             rhs_var = v['value']
-            while global_variables[rhs_var]['type'] == 'variable':
-                rhs_var = global_variables[rhs_var]['value']
-            rhs_var_value = global_variables[rhs_var]
-            resolved_global_variables[var_name] = rhs_var_value['type']
 
-        elif v['type'] == 'call': # function call e.g., a = sum(...)
-            rhs_fn = v['value']   # "Function call: Call(func=Name(id='add', ctx=Load()), args=[Constant(value=3), Constant(value=4)], keywords=[])"
-            rhs_fn = rhs_fn.split('id=')[-1].split("'")[1]  # add, fib
-            fn_type = global_functions.get(rhs_fn, "Unknown")
-            resolved_global_variables[var_name] = fn_type
+        resolved_type = resolved_types.get(rhs_var, "Unknown")
+        for chained_var_name in chain:
+            resolved_types[chained_var_name] = resolved_type
 
-        else:
-            resolved_global_variables[var_name] = v['type']
-
-    return resolved_global_variables
+    # in assignment order, make_suggestions takes the last ones
+    return {var_name: resolved_types[var_name] for var_name in global_variables}
 
 
 def get_module_and_function(code_context):
@@ -148,51 +242,73 @@ def get_module_and_function(code_context):
     return module, func
 
 
-def get_parameters_metadata(module, func, global_imports, params_db):
-    if module is not None:
-        for imported,alias in global_imports.items():
-            if alias == module:
-                return params_db[imported][func]
-    
-    for k,v in params_db.items():
-        if func in v:
-            return v[func]
-    
-    return None
+def create_document(document_id, transient=False):
+    return {
+        'id': document_id,
+        'params_overlay': ParameterMetadataOverlay(parameter_metadata_store),
+        # transient documents (of batches) are analyzed apart from the open documents, and closed after use
+        'transient': transient
+    }
+
+
+def get_document(document_id):
+    with documents_lock:
+        document = documents.get(document_id)
+        if document is None:
+            document = create_document(document_id)
+            documents[document_id] = document
+            if len(documents) > MAX_DOCUMENTS:
+                evicted_document_id, _ = documents.popitem(last=False)
+                inference_worker_pool.forget_document(evicted_document_id)
+        else:
+            documents.move_to_end(document_id)
+        return document
 
 
-@app.route("/suggest", methods=['GET', 'POST'])
-def get_suggestion():
-    if request.method == 'POST':
-        data = request.json  # Parses the body as JSON
-        code_context = data.get('code_context', '')
-        print('code received!\n', code_context)
-
-        global_imports = parse_global_imports(code_context)
-        with open('params_db.json', 'r') as fp:
-            params_db = json.load(fp)
-        module, func = get_module_and_function(code_context)
-        
-        code_context_wo_last_line = '\n'.join(code_context.split('\n')[:-1])
-        global_variables = parse_global_variables(code_context_wo_last_line)
-
-        print('Global imports:\n', global_imports)
-        print('Global variables:\n', global_variables)
-        # run type inference -- quac is decent for global functions. drop the last (malformed) line (since it might give compile error with Quac)
-        quac_output_dict = type_inference(code_context_wo_last_line)
-        print("****** Quac predictions: \n", quac_output_dict)
-        global_functions = parse_quac_output(quac_output_dict, params_db)
-
-        print('global vars:', global_variables)
-        resolved_global_variables = resolve_nonliteral_variables(global_variables, global_functions)
-        print('resolved_global_vars:', resolved_global_variables)
-        
-        # candidates = global_functions | resolved_global_variables  # merge two dicts
-        print('candidates:\n', global_functions | resolved_global_variables)
+def submit_type_inference(code, document, static_only, sequence_number, blocking=False):
+    # a future of the quac output dict
+    cache_key = type_inference_cache.get_key(code, (parameter_metadata_store.version, static_only))
+    quac_output_dict = type_inference_cache.get(cache_key)
+    if quac_output_dict is not None:
+        future = Future()
+        future.set_result(quac_output_dict)
+        return future
+
+    # raises InferenceWorkerPoolFull if the document's worker is busy (unless blocking), and the future raises
+    # TypeInferenceCancelled once a request with a higher sequence number arrives for the document
+    start = time.perf_counter()
+    future = inference_worker_pool.submit(document['id'], code, static_only, sequence_number, blocking, document['transient'])
+
+    def on_done(future_):
+        if future_.exception() is None:
+            stage_metrics.observe('type_inference_round_trip', time.perf_counter() - start)
+            type_inference_cache.put(cache_key, future_.result())
+
+    future.add_done_callback(on_done)
+    return future
+
+
+@app.route("/cache_stats")
+def get_cache_stats():
+    return jsonify(type_inference_cache.get_statistics())
+
+
+@app.route("/metrics")
+def get_metrics():
+    # Prometheus text format
+    lines = [stage_metrics.render()]
+    for statistic, value in type_inference_cache.get_statistics().items():
+        lines.append(f'# TYPE quac_type_inference_cache_{statistic} gauge\n')
+        lines.append(f'quac_type_inference_cache_{statistic} {value}\n')
+    return Response(''.join(lines), mimetype='text/plain; version=0.0.4')
+
+
+def make_suggestions(param_metadata, resolved_global_variables, global_functions):
+    with stage_metrics.measure('ranking'):
         suggestions = []
-        param_metadata = get_parameters_metadata(module, func, global_imports, params_db)
 
         if not param_metadata is None:
+            candidate_index = CandidateIndex(resolved_global_variables, global_functions)
             for param in param_metadata:
                 name = param.get("name", "")
                 typeParam = param.get("type", "")
@@ -200,8 +316,8 @@ def get_suggestion():
                 description = param.get("description", "")
 
                 # take max K from each of variables and functions
-                suggestionsList = list(filter(lambda k: resolved_global_variables[k] in typeParam, resolved_global_variables.keys()))[-K:]
-                suggestionsList += list(filter(lambda k: global_functions[k] in typeParam, global_functions.keys()))[-K:]
+                suggestionsList = candidate_index.get_candidates('variables', typeParam, K)
+                suggestionsList += candidate_index.get_candidates('functions', typeParam, K)
                 suggestions.append({
                     "name": name,
                     "type": typeParam,
@@ -210,6 +326,104 @@ def get_suggestion():
                     "suggestions": suggestionsList
                 })
 
+        return suggestions
+
+
+def parse_suggestion_request(data, document=None):
+    # document: instead of the open document named by the request's document_id (e.g., for batches)
+    code_context = data.get('code_context', '')
+    logging.debug('code received!\n%s', code_context)
+
+    parameter_metadata_store.reload_if_changed()
+    with stage_metrics.measure('buffer_parse'):
+        parsed_code_context = parse_code_context(code_context)
+
+    logging.debug('Global imports:\n%s', parsed_code_context["global_imports"])
+    logging.debug('Global variables:\n%s', parsed_code_context["global_variables"])
+
+    return {
+        "document": document if document is not None else get_document(data.get('document_id', 'default')),
+        "static_only": bool(data.get('static_only', STATIC_ONLY)),
+        # increases with every request for the document -- older requests still running get cancelled
+        "sequence_number": data.get('sequence_number'),
+        **parsed_code_context
+    }
+
+
+def get_lexical_suggestions(suggestion_request):
+    # no type inference -- parameters from the params DB (and the local functions the last type inference found),
+    # candidates from the literal types of global variables
+    resolved_global_variables = resolve_nonliteral_variables(suggestion_request["global_variables"], {})
+    param_metadata = suggestion_request["document"]["params_overlay"].lookup(
+        suggestion_request["module"], suggestion_request["func"], suggestion_request["global_imports"]
+    )
+    return make_suggestions(param_metadata, resolved_global_variables, {})
+
+
+def submit_refined_type_inference(suggestion_request, blocking=False):
+    # run type inference -- quac is decent for global functions. drop the last (malformed) line (since it might give compile error with Quac)
+    return submit_type_inference(
+        suggestion_request["code_context_wo_last_line"],
+        suggestion_request["document"],
+        suggestion_request["static_only"],
+        suggestion_request["sequence_number"],
+        blocking
+    )
+
+
+def get_refined_suggestions(suggestion_request):
+    return make_refined_suggestions(suggestion_request, submit_refined_type_inference(suggestion_request).result())
+
+
+def make_refined_suggestions(suggestion_request, quac_output_dict):
+    document = suggestion_request["document"]
+    global_variables = suggestion_request["global_variables"]
+
+    logging.debug("****** Quac predictions: \n%s", quac_output_dict)
+    local_functions = {}
+    global_functions = parse_quac_output(quac_output_dict, local_functions)
+    params_overlay = document['params_overlay']
+    params_overlay.set_local_functions(local_functions)
+
+    logging.debug('global vars: %s', global_variables)
+    resolved_global_variables = resolve_nonliteral_variables(global_variables, global_functions)
+    logging.debug('resolved_global_vars: %s', resolved_global_variables)
+
+    # candidates = global_functions | resolved_global_variables  # merge two dicts
+    logging.debug('candidates:\n%s', global_functions | resolved_global_variables)
+    param_metadata = params_overlay.lookup(suggestion_request["module"], suggestion_request["func"], suggestion_request["global_imports"])
+
+    return make_suggestions(param_metadata, resolved_global_variables, global_functions)
+
+
+def busy_response():
+    response = jsonify({"message": "busy, try again", "suggestions": []})
+    response.status_code = 503
+    response.headers.add('Retry-After', '1')
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+
+def superseded_response():
+    response = jsonify({"message": "superseded", "suggestions": []})
+    response.status_code = 409
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+
+@app.route("/suggest", methods=['GET', 'POST'])
+def get_suggestion():
+    if request.method == 'POST':
+        data = request.json  # Parses the body as JSON
+        suggestion_request = parse_suggestion_request(data)
+
+        try:
+            suggestions = get_refined_suggestions(suggestion_request)
+        except InferenceWorkerPoolFull:
+            return busy_response()
+        except TypeInferenceCancelled:
+            return superseded_response()
+
         output_dict = {
             "message": "OK",
             "suggestions": suggestions
@@ -220,6 +434,114 @@ def get_suggestion():
         return response
 
 
+@app.route("/suggest_stream", methods=['POST'])
+def get_suggestion_stream():
+    # newline-delimited JSON, one line per phase:
+    # "lexical" right away, without type inference, then "refined" once quac has run
+    data = request.json  # Parses the body as JSON
+    suggestion_request = parse_suggestion_request(data)
+
+    def generate():
+        yield json.dumps({
+            "phase": "lexical",
+            "message": "OK",
+            "suggestions": get_lexical_suggestions(suggestion_request)
+        }) + '\n'
+
+        try:
+            yield json.dumps({
+                "phase": "refined",
+                "message": "OK",
+                "suggestions": get_refined_suggestions(suggestion_request)
+            }) + '\n'
+        except InferenceWorkerPoolFull:
+            # keep the lexical suggestions
+            yield json.dumps({
+                "phase": "refined",
+                "message": "busy, try again",
+                "suggestions": None
+            }) + '\n'
+        except TypeInferenceCancelled:
+            yield json.dumps({
+                "phase": "refined",
+                "message": "superseded",
+                "suggestions": None
+            }) + '\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+
+
+def get_batch_result(index, suggestion_request, future):
+    try:
+        suggestions = make_refined_suggestions(suggestion_request, future.result())
+    except TypeInferenceCancelled:
+        return {"index": index, "message": "superseded", "suggestions": None}
+    except Exception as exception:
+        logging.exception('Batch request %s failed', index)
+        return {"index": index, "message": f"error: {exception}", "suggestions": None}
+    return {"index": index, "message": "OK", "suggestions": suggestions}
+
+
+def suggest_batch(suggestion_request_datas):
+    """
+    Refined suggestions for many requests (each like the body of /suggest), yielded in order as
+    {"index": ..., "message": ..., "suggestions": ...}.
+    Type inference for later requests runs on the other workers while earlier ones are still running.
+    A busy worker is waited for instead of failing the request.
+    Requests with the same document_id are versions of one document, analyzed incrementally in order
+    (sequence numbers are ignored, so that replaying a recorded session does not supersede its own requests).
+    Requests without a document_id are separate documents. The documents of a batch are private to it:
+    they neither share nor evict the analyses of open documents, and are closed once the batch is done.
+    """
+    batch_id = uuid.uuid4().hex
+    batch_documents = {}
+    in_flight = deque()
+
+    try:
+        for index, data in enumerate(suggestion_request_datas):
+            suggestion_request = None
+            try:
+                document_id = f'batch_{batch_id}/{data.get("document_id", index)}'
+                document = batch_documents.get(document_id)
+                if document is None:
+                    document = batch_documents[document_id] = create_document(document_id, transient=True)
+
+                suggestion_request = parse_suggestion_request({**data, 'sequence_number': None}, document)
+                future = submit_refined_type_inference(suggestion_request, blocking=True)
+            except Exception as exception:
+                future = Future()
+                future.set_exception(exception)
+            in_flight.append((index, suggestion_request, future))
+
+            while in_flight and in_flight[0][2].done():
+                yield get_batch_result(*in_flight.popleft())
+
+        while in_flight:
+            yield get_batch_result(*in_flight.popleft())
+    finally:
+        inference_worker_pool.close_transient_documents(batch_documents)
+
+
+@app.route("/suggest_batch", methods=['POST'])
+def get_suggestion_batch():
+    # a JSON body {"requests": [...]}, or newline-delimited JSON (application/x-ndjson) with one request per line.
+    # with ?stream=1, results are sent as newline-delimited JSON as soon as they (and all before them) are ready
+    if request.mimetype == 'application/x-ndjson':
+        suggestion_request_datas = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+    else:
+        suggestion_request_datas = request.json.get('requests', [])
+
+    if request.args.get('stream') == '1':
+        results = (json.dumps(result) + '\n' for result in suggest_batch(suggestion_request_datas))
+        response = Response(stream_with_context(results), mimetype='application/x-ndjson')
+    else:
+        response = jsonify({"message": "OK", "results": list(suggest_batch(suggestion_request_datas))})
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
 
 if __name__=="__main__":
     app.run(debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,91 @@
+import bisect
+import contextlib
+import resource
+import threading
+import time
+
+
+# upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def get_peak_memory_bytes():
+    # peak resident set size of this process (ru_maxrss is in kilobytes on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageMetrics:
+    """
+    Latency histograms per stage (e.g., 'buffer_parse', 'type_inference') and peak memory per process,
+    rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # stage -> [count in each bucket (not cumulative), count in +Inf], sum of seconds, count
+        self.stage_to_bucket_counts = {}
+        self.stage_to_sum = {}
+        self.stage_to_count = {}
+        # process (e.g., 'server', 'worker_0') -> peak resident set size in bytes
+        self.process_to_peak_memory_bytes = {}
+
+    def observe(self, stage, seconds):
+        bucket_index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            bucket_counts = self.stage_to_bucket_counts.get(stage)
+            if bucket_counts is None:
+                bucket_counts = self.stage_to_bucket_counts[stage] = [0] * (len(self.buckets) + 1)
+                self.stage_to_sum[stage] = 0.0
+                self.stage_to_count[stage] = 0
+            bucket_counts[bucket_index] += 1
+            self.stage_to_sum[stage] += seconds
+            self.stage_to_count[stage] += 1
+
+    def observe_stage_durations(self, stage_durations):
+        for stage, seconds in stage_durations.items():
+            self.observe(stage, seconds)
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def get_snapshot(self):
+        # stage -> (bucket counts (not cumulative, the last one for +Inf), sum of seconds, count)
+        with self.lock:
+            return {
+                stage: (list(bucket_counts), self.stage_to_sum[stage], self.stage_to_count[stage])
+                for stage, bucket_counts in self.stage_to_bucket_counts.items()
+            }
+
+    def set_peak_memory(self, process, peak_memory_bytes):
+        with self.lock:
+            self.process_to_peak_memory_bytes[process] = peak_memory_bytes
+
+    def render(self):
+        self.set_peak_memory('server', get_peak_memory_bytes())
+
+        lines = [
+            '# HELP quac_stage_duration_seconds Time spent in each stage of serving a suggestion request.',
+            '# TYPE quac_stage_duration_seconds histogram'
+        ]
+        with self.lock:
+            for stage in sorted(self.stage_to_bucket_counts):
+                cumulative_count = 0
+                for upper_bound, bucket_count in zip(self.buckets + (float('inf'),), self.stage_to_bucket_counts[stage]):
+                    cumulative_count += bucket_count
+                    le = '+Inf' if upper_bound == float('inf') else repr(upper_bound)
+                    lines.append(f'quac_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative_count}')
+                lines.append(f'quac_stage_duration_seconds_sum{{stage="{stage}"}} {self.stage_to_sum[stage]!r}')
+                lines.append(f'quac_stage_duration_seconds_count{{stage="{stage}"}} {self.stage_to_count[stage]}')
+
+            lines.append('# HELP quac_peak_memory_bytes Peak resident set size of each process.')
+            lines.append('# TYPE quac_peak_memory_bytes gauge')
+            for process in sorted(self.process_to_peak_memory_bytes):
+                lines.append(f'quac_peak_memory_bytes{{process="{process}"}} {self.process_to_peak_memory_bytes[process]}')
+
+        return '\n'.join(lines) + '\n'
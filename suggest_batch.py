@@ -0,0 +1,39 @@
+"""
+Refined suggestions for many code contexts at once, as JSON lines on stdout (one per code context, in order).
+Run from the repository root, e.g.:
+
+    python suggest_batch.py demo/example*.py > suggestions.jsonl
+    python suggest_batch.py recorded_requests.jsonl > suggestions.jsonl
+
+A .jsonl file has one request per line, like the body of /suggest. Any other file is one code context.
+"""
+
+import argparse
+import json
+
+
+def read_suggestion_request_datas(paths):
+    for path in paths:
+        with open(path, 'r') as fp:
+            if path.endswith('.jsonl'):
+                for line in fp:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                # the last line is the call to suggest parameters for
+                yield {'code_context': fp.read().rstrip('\n'), 'document_id': path}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='+', help='.py files (one code context each) or .jsonl files (one request per line)')
+    args = parser.parse_args()
+
+    # starts the worker pool
+    from server import inference_worker_pool, suggest_batch
+
+    try:
+        for result in suggest_batch(read_suggestion_request_datas(args.paths)):
+            print(json.dumps(result), flush=True)
+    finally:
+        inference_worker_pool.shutdown()
@@ -0,0 +1,26 @@
+from candidate_index import CandidateIndex
+
+
+if __name__ == '__main__':
+    candidate_index = CandidateIndex(
+        {'a': 'int', 'b': 'str', 'c': 'bool', 'd': 'float', 'e': 'int'},
+        {'f': ['int', 'float'], 'g': 'int', 'h': 'str', 'i': ['float', 'int']}
+    )
+
+    # Later definitions first, returned in definition order
+    assert candidate_index.get_candidates('variables', 'int', 2) == ['c', 'e']
+    assert candidate_index.get_candidates('variables', 'int', 3) == ['a', 'c', 'e']
+    assert candidate_index.get_candidates('variables', 'str', 3) == ['b']
+
+    # A description of several types, and a list of types
+    assert candidate_index.get_candidates('variables', 'int or float', 3) == ['c', 'd', 'e']
+    assert candidate_index.get_candidates('variables', ['str', 'Figure'], 3) == ['b']
+
+    # A function with several compatible return types is a candidate once
+    assert candidate_index.get_candidates('functions', 'int or float', 3) == ['f', 'g', 'i']
+    assert candidate_index.get_candidates('functions', 'int or float', 2) == ['g', 'i']
+    assert candidate_index.get_candidates('functions', ['float', 'int'], 4) == ['f', 'g', 'i']
+    assert candidate_index.get_candidates('functions', 'str', 3) == ['h']
+
+    assert candidate_index.get_candidates('functions', 'Figure', 3) == []
+    assert candidate_index.get_candidates('variables', 'int', 0) == []
@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+
+from parameter_metadata_store import ParameterMetadataOverlay, ParameterMetadataStore
+
+
+if __name__ == '__main__':
+    linspace_parameters = [{'name': 'start', 'type': 'int'}, {'name': 'stop', 'type': 'int'}]
+    torch_linspace_parameters = [{'name': 'start', 'type': 'float'}]
+    figure_parameters = [{'name': 'num', 'type': 'int'}]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'params_db.json')
+        with open(path, 'w') as fp:
+            json.dump({'numpy': {'linspace': linspace_parameters}, 'torch': {'linspace': torch_linspace_parameters}}, fp)
+
+        store = ParameterMetadataStore(path)
+
+        # Reverse index, in file order
+        assert store.get_signatures('linspace') == [('numpy', linspace_parameters), ('torch', torch_linspace_parameters)]
+        assert store.get_signatures('figure') == []
+        assert store.get_parameters('torch', 'linspace') == torch_linspace_parameters
+
+        # By module, by alias of an imported module, or the first library with the function
+        assert store.lookup('torch', 'linspace', {}) == torch_linspace_parameters
+        assert store.lookup('np', 'linspace', {'numpy': 'np'}) == linspace_parameters
+        assert store.lookup('th', 'linspace', {'torch': 'th'}) == torch_linspace_parameters
+        assert store.lookup(None, 'linspace', {}) == linspace_parameters
+        assert store.lookup('plt', 'figure', {'matplotlib.pyplot': 'plt'}) is None
+
+        # Not reloaded while unchanged
+        metadata = store.metadata
+        store.reload_if_changed()
+        assert store.metadata is metadata
+
+        # Reloaded (as a new snapshot) when the file changes
+        with open(path, 'w') as fp:
+            json.dump({'matplotlib.pyplot': {'figure': figure_parameters}}, fp)
+        os.utime(path, ns=(metadata.version + 1, metadata.version + 1))
+        store.reload_if_changed()
+        assert store.metadata is not metadata and store.version == metadata.version + 1
+        assert store.lookup('plt', 'figure', {'matplotlib.pyplot': 'plt'}) == figure_parameters
+        assert store.get_signatures('linspace') == []
+        # The previous snapshot is unchanged
+        assert metadata.function_to_libraries_and_parameters['linspace'][0] == ('numpy', linspace_parameters)
+
+        # A file that cannot be loaded keeps the loaded snapshot
+        metadata = store.metadata
+        with open(path, 'w') as fp:
+            fp.write('{"matplotlib.pyplot": ')
+        os.utime(path, ns=(metadata.version + 1, metadata.version + 1))
+        store.reload_if_changed()
+        assert store.metadata is metadata
+
+        # Local functions shadow library functions when called without a module
+        overlay = ParameterMetadataOverlay(store)
+        overlay.set_local_functions({'figure': linspace_parameters})
+        assert overlay.lookup(None, 'figure', {}) == linspace_parameters
+        assert overlay.lookup('plt', 'figure', {'matplotlib.pyplot': 'plt'}) == figure_parameters
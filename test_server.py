@@ -0,0 +1,267 @@
+import ast
+import json
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+
+def check_resolve_nonliteral_variables(server):
+    _, global_variables = server.parse_global_imports_and_variables(ast.parse(
+        'import numpy as np\n'
+        'a = 1\n'
+        'b = a\n'
+        'c = b\n'
+        's = "x"\n'
+        't = s\n'
+        'n = f(1)\n'
+        'm = n\n'
+        'z = np.zeros(3)\n'
+        'u = undefined_name\n'
+        'v = u\n'
+        'p = q\n'
+        'q = p\n'
+        'a = 2.0\n'
+    ))
+
+    resolved_global_variables = server.resolve_nonliteral_variables(global_variables, {'f': 'int'})
+
+    # the type at the end of each chain of assignments, with the last assignment of each variable
+    assert resolved_global_variables == {
+        'a': 'float',
+        'b': 'float',
+        'c': 'float',
+        's': 'str',
+        't': 'str',
+        'n': 'int',
+        'm': 'int',
+        # calls to functions not defined in the document
+        'z': 'Unknown',
+        # chains ending at an undefined name or in a cycle
+        'u': 'Unknown',
+        'v': 'Unknown',
+        'p': 'Unknown',
+        'q': 'Unknown'
+    }
+    # in assignment order
+    assert list(resolved_global_variables) == list(global_variables)
+
+    assert server.resolve_nonliteral_variables({}, {}) == {}
+
+
+def check_suggest_batch_replays_session(server):
+    lines = [
+        'import numpy as np',
+        'a = 1',
+        'b = 2.0',
+        'def f(x):',
+        '    return x + a',
+        'c = f(b)',
+        'd = np.zeros(3)',
+        'np.linspace('
+    ]
+    # a recorded session: every version of one document, with increasing sequence numbers
+    session = [
+        {'document_id': 'session', 'sequence_number': sequence_number, 'code_context': '\n'.join(lines[:sequence_number])}
+        for sequence_number in range(1, len(lines) + 1)
+    ]
+
+    # an open document, with the same id and later sequence numbers
+    server.get_refined_suggestions(server.parse_suggestion_request(
+        {'document_id': 'session', 'sequence_number': 100, 'code_context': 'import numpy as np\nnp.linspace('}
+    ))
+    open_document_ids = list(server.documents)
+
+    results = list(server.suggest_batch(session))
+
+    # no version supersedes another
+    assert [result['index'] for result in results] == list(range(len(session)))
+    assert [result['message'] for result in results] == ['OK'] * len(session)
+    # and the batch leaves the open documents alone
+    assert list(server.documents) == open_document_ids
+
+
+def get_document_ids_in_worker():
+    # runs in a worker
+    from inference_worker_pool import worker_document_analyses
+    return {document_id for document_id, _ in worker_document_analyses}
+
+
+def get_document_ids_with_worker_indices(inference_worker_pool, num_document_ids):
+    # document ids, and the index of the worker each is routed to, covering every worker
+    document_ids_with_worker_indices = []
+    worker_indices = set()
+    number = 0
+    while len(document_ids_with_worker_indices) < num_document_ids or len(worker_indices) < inference_worker_pool.num_workers:
+        document_id = f'routed_{number}'
+        worker_index = inference_worker_pool.get_worker_index(document_id)
+        document_ids_with_worker_indices.append((document_id, worker_index))
+        worker_indices.add(worker_index)
+        number += 1
+    return document_ids_with_worker_indices
+
+
+def check_suggest_stream_phases(server):
+    client = server.app.test_client()
+
+    # lexical suggestions arrive while quac is still running
+    start_time = time.monotonic()
+    response = client.post(
+        '/suggest_stream',
+        json={'document_id': 'stream', 'code_context': 'import time\ntime.sleep(1)\nn = 1\nrange('},
+        buffered=False
+    )
+    assert response.mimetype == 'application/x-ndjson'
+    lines = iter(response.response)
+    lexical_phase = json.loads(next(lines))
+    assert time.monotonic() - start_time < 1
+    assert lexical_phase['phase'] == 'lexical' and lexical_phase['message'] == 'OK'
+    assert isinstance(lexical_phase['suggestions'], list)
+
+    refined_phase = json.loads(next(lines))
+    assert time.monotonic() - start_time >= 1
+    assert refined_phase['phase'] == 'refined' and refined_phase['message'] == 'OK'
+    assert isinstance(refined_phase['suggestions'], list)
+    assert next(lines, None) is None
+    response.close()
+
+    # a busy worker keeps the lexical suggestions
+    pending = server.inference_worker_pool.pending[server.inference_worker_pool.get_worker_index('stream')]
+    num_acquired = 0
+    while pending.acquire(blocking=False):
+        num_acquired += 1
+    try:
+        response = client.post('/suggest_stream', json={'document_id': 'stream', 'code_context': 'n = 2\nrange('})
+        phases = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    finally:
+        for _ in range(num_acquired):
+            pending.release()
+    assert [(phase['phase'], phase['message']) for phase in phases] == [('lexical', 'OK'), ('refined', 'busy, try again')]
+    assert isinstance(phases[0]['suggestions'], list) and phases[1]['suggestions'] is None
+
+
+def check_busy_worker_gets_503(server):
+    client = server.app.test_client()
+    worker_index = server.inference_worker_pool.get_worker_index('busy')
+
+    # all of the worker's pending slots taken
+    pending = server.inference_worker_pool.pending[worker_index]
+    num_acquired = 0
+    while pending.acquire(blocking=False):
+        num_acquired += 1
+    assert num_acquired == server.MAX_PENDING_PER_WORKER
+
+    try:
+        response = client.post('/suggest', json={'document_id': 'busy', 'code_context': 'busy = 1\nprint('})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert response.json['message'] == 'busy, try again'
+    finally:
+        for _ in range(num_acquired):
+            pending.release()
+
+    response = client.post('/suggest', json={'document_id': 'busy', 'code_context': 'busy = 1\nprint('})
+    assert response.status_code == 200
+
+
+def check_documents_stick_to_workers(server):
+    inference_worker_pool = server.inference_worker_pool
+    document_ids_with_worker_indices = get_document_ids_with_worker_indices(inference_worker_pool, 4)
+
+    # twice, and the second version of each document goes to the same worker as the first
+    for version in range(2):
+        for document_id, _ in document_ids_with_worker_indices:
+            inference_worker_pool.submit(document_id, f'x = {version}\n').result()
+
+    for worker_index, executor in enumerate(inference_worker_pool.executors):
+        routed_document_ids = {document_id for document_id, index in document_ids_with_worker_indices if index == worker_index}
+        document_ids_in_worker = executor.submit(get_document_ids_in_worker).result()
+        assert routed_document_ids <= document_ids_in_worker
+        assert not (document_ids_in_worker - routed_document_ids) & {document_id for document_id, _ in document_ids_with_worker_indices}
+
+
+def check_crashed_worker_is_replaced(server):
+    inference_worker_pool = server.inference_worker_pool
+    worker_index = inference_worker_pool.get_worker_index('crash')
+    executor = inference_worker_pool.executors[worker_index]
+
+    # the document's code runs in the worker
+    try:
+        inference_worker_pool.submit('crash', 'import os\nos._exit(1)\n').result()
+    except BrokenProcessPool:
+        pass
+    else:
+        assert False
+
+    # by a worker forked from the fork server, not from the (threaded) server process
+    replacement_executor = inference_worker_pool.executors[worker_index]
+    assert replacement_executor is not executor
+    assert replacement_executor.submit(os.getppid).result() != os.getpid()
+
+    output_dict = inference_worker_pool.submit('crash', 'def f(x):\n    return x + 1\n').result()
+    assert output_dict['temp']['global']['f']['x'] == ['builtins.int']
+
+    # the other workers are left alone
+    for index, other_executor in enumerate(inference_worker_pool.executors):
+        if index != worker_index:
+            assert other_executor.submit(os.getppid).result() == os.getpid()
+
+
+def check_superseded_requests_are_cancelled(server):
+    from document_analysis import TypeInferenceCancelled
+
+    inference_worker_pool = server.inference_worker_pool
+
+    # rejected before being dispatched to a worker
+    inference_worker_pool.submit('superseded', 'x = 1\n', sequence_number=5).result()
+    try:
+        inference_worker_pool.submit('superseded', 'x = 2\n', sequence_number=3)
+    except TypeInferenceCancelled:
+        pass
+    else:
+        assert False
+
+    # cancelled while running (before the next top-level statement), or before starting if still queued
+    running_future = inference_worker_pool.submit('superseded', 'import time\ntime.sleep(1)\nx = 3\n', sequence_number=6)
+    time.sleep(0.3)
+    queued_future = inference_worker_pool.submit('superseded', 'x = 4\n', sequence_number=7)
+    latest_future = inference_worker_pool.submit('superseded', 'def f(x):\n    return x + 1\n', sequence_number=8)
+    for future in (running_future, queued_future):
+        try:
+            future.result()
+        except TypeInferenceCancelled:
+            pass
+        else:
+            assert False
+    assert latest_future.result()['temp']['global']['f']['x'] == ['builtins.int']
+
+    # answered with 409, or a "superseded" refined phase after the lexical one
+    client = server.app.test_client()
+    response = client.post('/suggest', json={'document_id': 'superseded_endpoint', 'sequence_number': 10, 'code_context': 'a = 1\nprint('})
+    assert response.status_code == 200
+
+    response = client.post('/suggest', json={'document_id': 'superseded_endpoint', 'sequence_number': 5, 'code_context': 'a = 2\nprint('})
+    assert response.status_code == 409
+    assert response.json == {'message': 'superseded', 'suggestions': []}
+
+    response = client.post('/suggest_stream', json={'document_id': 'superseded_endpoint', 'sequence_number': 6, 'code_context': 'a = 3\nprint('})
+    phases = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(phase['phase'], phase['message']) for phase in phases] == [('lexical', 'OK'), ('refined', 'superseded')]
+    assert phases[1]['suggestions'] is None
+
+
+if __name__ == '__main__':
+    # two workers, to check how documents are routed to them, started when the server is imported
+    os.environ.setdefault('QUAC_NUM_WORKERS', '2')
+
+    import server
+
+    try:
+        check_resolve_nonliteral_variables(server)
+        check_suggest_batch_replays_session(server)
+        check_suggest_stream_phases(server)
+        check_superseded_requests_are_cancelled(server)
+        check_busy_worker_gets_503(server)
+        check_documents_stick_to_workers(server)
+        check_crashed_worker_is_replaced(server)
+    finally:
+        server.inference_worker_pool.shutdown()
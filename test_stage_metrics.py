@@ -0,0 +1,74 @@
+from load_test import StageSamples, estimate_quantile, get_report
+from stage_metrics import StageMetrics
+
+
+if __name__ == '__main__':
+    stage_metrics = StageMetrics(buckets=(0.1, 1.0, 10.0))
+
+    # A value equal to an upper bound is in that bucket, values above the largest upper bound are in +Inf
+    for seconds in (0.05, 0.1, 0.5, 1.0, 20.0):
+        stage_metrics.observe('type_inference', seconds)
+    stage_metrics.observe_stage_durations({'type_inference': 5.0, 'buffer_parse': 0.01})
+
+    snapshot_before = stage_metrics.get_snapshot()
+    assert snapshot_before == {
+        'type_inference': ([2, 2, 1, 1], 26.65, 6),
+        'buffer_parse': ([1, 0, 0, 0], 0.01, 1)
+    }
+
+    # Snapshots are copies
+    snapshot_before['type_inference'][0][0] = 100
+    assert stage_metrics.get_snapshot()['type_inference'][0] == [2, 2, 1, 1]
+    snapshot_before = stage_metrics.get_snapshot()
+
+    with stage_metrics.measure('ranking'):
+        pass
+    for seconds in (0.2, 0.3, 0.4, 0.6):
+        stage_metrics.observe('type_inference', seconds)
+    snapshot_after = stage_metrics.get_snapshot()
+    assert snapshot_after['type_inference'][0] == [2, 6, 1, 1]
+    assert snapshot_after['ranking'][0] == [1, 0, 0, 0]
+
+    # The report only covers what was observed between the two snapshots
+    report = get_report(StageSamples(), 1.0, stage_metrics.buckets, snapshot_before, snapshot_after)
+    assert set(report['server_stages']) == {'type_inference', 'ranking'}
+    type_inference_report = report['server_stages']['type_inference']
+    assert type_inference_report['observations'] == 4
+    assert abs(type_inference_report['mean_seconds'] - 0.375) < 1e-9
+    # All 4 observations are in (0.1, 1.0]: the median is interpolated halfway
+    assert abs(type_inference_report['p50_seconds'] - 0.55) < 1e-9
+    assert report['server_stages']['ranking']['observations'] == 1
+
+    assert estimate_quantile((0.1, 1.0), [0, 0, 0], 0.5) is None
+    assert estimate_quantile((0.1, 1.0), [0, 0, 3], 0.5) == 1.0
+
+    # Prometheus text format: cumulative buckets, stages in order, peak memory of the server and the workers
+    stage_metrics = StageMetrics(buckets=(0.1, 1.0))
+    stage_metrics.observe('type_inference', 0.5)
+    stage_metrics.observe('type_inference', 2.0)
+    stage_metrics.observe('buffer_parse', 0.1)
+    stage_metrics.set_peak_memory('worker_0', 1024)
+    lines = stage_metrics.render().splitlines()
+    assert lines[:2] == [
+        '# HELP quac_stage_duration_seconds Time spent in each stage of serving a suggestion request.',
+        '# TYPE quac_stage_duration_seconds histogram'
+    ]
+    assert lines[2:12] == [
+        'quac_stage_duration_seconds_bucket{stage="buffer_parse",le="0.1"} 1',
+        'quac_stage_duration_seconds_bucket{stage="buffer_parse",le="1.0"} 1',
+        'quac_stage_duration_seconds_bucket{stage="buffer_parse",le="+Inf"} 1',
+        'quac_stage_duration_seconds_sum{stage="buffer_parse"} 0.1',
+        'quac_stage_duration_seconds_count{stage="buffer_parse"} 1',
+        'quac_stage_duration_seconds_bucket{stage="type_inference",le="0.1"} 0',
+        'quac_stage_duration_seconds_bucket{stage="type_inference",le="1.0"} 1',
+        'quac_stage_duration_seconds_bucket{stage="type_inference",le="+Inf"} 2',
+        'quac_stage_duration_seconds_sum{stage="type_inference"} 2.5',
+        'quac_stage_duration_seconds_count{stage="type_inference"} 2'
+    ]
+    assert lines[12:14] == [
+        '# HELP quac_peak_memory_bytes Peak resident set size of each process.',
+        '# TYPE quac_peak_memory_bytes gauge'
+    ]
+    assert lines[14].startswith('quac_peak_memory_bytes{process="server"} ')
+    assert int(lines[14].rsplit(' ', 1)[1]) > 0
+    assert lines[15:] == ['quac_peak_memory_bytes{process="worker_0"} 1024']